@@ -0,0 +1,8 @@
+import os
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'paffmmo_project.settings')
+# Lectures de l'API servies par les vues asynchrones (rpgAtlas.async_views)
+os.environ.setdefault('API_ASYNC_VIEWS', 'True')
+
+application = get_asgi_application()
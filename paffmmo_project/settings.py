@@ -4,6 +4,7 @@ Django 6.0 Settings for PAFFMMO Project
 Configuration mise à jour pour Django 6.0 (janvier 2026)
 """
 import os
+import tempfile
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -41,9 +42,12 @@ INSTALLED_APPS = [
 # MIDDLEWARE
 # ============================================================================
 MIDDLEWARE = [
+    'rpgAtlas.middleware.QueryBudgetMiddleware',
+    'rpgAtlas.middleware.ReplicaRoutingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    # WhiteNoise avec un chemin asynchrone (ASGI)
+    'rpgAtlas.middleware.StaticFilesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -74,6 +78,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'paffmmo_project.wsgi.application'
+ASGI_APPLICATION = 'paffmmo_project.asgi.application'
 
 # ============================================================================
 # BASE DE DONNÉES
@@ -106,6 +111,32 @@ else:
         }
     }
 
+# ============================================================================
+# RÉPLICAS EN LECTURE
+# ============================================================================
+# Fichiers SQLite ou hôtes Oracle des réplicas, séparés par des virgules ;
+# les autres paramètres sont ceux de la base principale (voir rpgAtlas.routers)
+DATABASE_REPLICAS = []
+for _index, _replica in enumerate(
+    filter(None, (name.strip() for name in os.environ.get('DATABASE_REPLICAS', '').split(','))), start=1
+):
+    DATABASES[f'replica{_index}'] = {
+        **DATABASES['default'],
+        ('HOST' if DATABASE_ENGINE == 'oracle' else 'NAME'): (
+            _replica if DATABASE_ENGINE == 'oracle' else BASE_DIR / _replica
+        ),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{_index}')
+
+DATABASE_ROUTERS = ['rpgAtlas.routers.ReadReplicaRouter']
+# Durée (secondes) pendant laquelle un client lit sur la base principale après une écriture
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', '5'))
+# Retard de réplication toléré (secondes) avant d'écarter un réplica
+REPLICA_MAX_LAG = float(os.environ.get('REPLICA_MAX_LAG', '2'))
+# Intervalle (secondes) entre deux vérifications du retard, par processus
+REPLICA_CHECK_INTERVAL = float(os.environ.get('REPLICA_CHECK_INTERVAL', '5'))
+
 # ============================================================================
 # CORS & REST FRAMEWORK
 # ============================================================================
@@ -116,7 +147,7 @@ CORS_ALLOWED_ORIGINS = os.environ.get(
 ).split(',') if not DEBUG else []
 
 REST_FRAMEWORK = {
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'rpgAtlas.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
     'DEFAULT_FILTER_BACKENDS': [
         'rest_framework.filters.SearchFilter',
@@ -124,11 +155,113 @@ REST_FRAMEWORK = {
     ],
     # Django 6.0 - Ajout du renderer par défaut explicite
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'rpgAtlas.renderers.FastJSONRenderer',
         'rest_framework.renderers.BrowsableAPIRenderer',
     ],
 }
 
+# ============================================================================
+# RECHERCHE PLEIN TEXTE
+# ============================================================================
+# 'auto' : FTS5 sur SQLite, Oracle Text sur Oracle, index inversé Python sinon
+# Sinon, chemin pointé vers une classe (ex: 'rpgAtlas.search.InvertedIndexBackend')
+HERO_SEARCH_BACKEND = os.environ.get('HERO_SEARCH_BACKEND', 'auto')
+
+# ============================================================================
+# BUDGETS DE REQUÊTES SQL
+# ============================================================================
+# 'off', 'warn' (journalise dépassements et N+1) ou 'raise' (tests)
+QUERY_BUDGET_MODE = os.environ.get('QUERY_BUDGET_MODE', 'warn' if DEBUG else 'off')
+# Nombre d'exécutions d'une même forme de requête signalé comme N+1
+QUERY_DUPLICATE_THRESHOLD = 3
+# Budgets des vues hors ViewSet / ModelAdmin, par nom de route
+QUERY_BUDGETS = {
+    'index': 0,
+    'admin:dashboard': 2,
+    'admin:dashboard_data': 5,
+}
+
+# ============================================================================
+# FORMES DES REQUÊTES DE HÉROS
+# ============================================================================
+# Relevé des filtres et tris des listes de héros (commande advise_indexes),
+# désactivé par défaut : à activer le temps de collecter les formes
+QUERY_SHAPES_ENABLED = os.environ.get('QUERY_SHAPES_ENABLED', 'False').lower() in ('true', '1', 'yes')
+# Intervalle (secondes) entre deux reports des compteurs en base, par processus
+QUERY_SHAPES_FLUSH_INTERVAL = float(os.environ.get('QUERY_SHAPES_FLUSH_INTERVAL', '60'))
+
+# ============================================================================
+# CACHE DES RÉPONSES DE L'API
+# ============================================================================
+# Cache fichier partagé par les workers gunicorn d'un même hôte ; les entrées
+# sont indexées par les versions DataVersion, jamais périmées après écriture
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'api': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get(
+            'API_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'paffmmo-api-cache')
+        ),
+        'TIMEOUT': int(os.environ.get('API_CACHE_TIMEOUT', '600')),
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+        },
+    },
+    # Fiches personnage PDF rendues (voir rpgAtlas.charactersheet)
+    'sheets': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get(
+            'SHEET_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'paffmmo-sheet-cache')
+        ),
+        'TIMEOUT': 7 * 24 * 3600,
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+        },
+    },
+}
+# Alias du cache des réponses (None pour le désactiver)
+API_RESPONSE_CACHE = os.environ.get('API_RESPONSE_CACHE', 'api') or None
+
+# ============================================================================
+# CACHE DES FICHES DE HÉROS
+# ============================================================================
+# Nombre de fiches de héros rendues gardées par processus (0 pour désactiver)
+HERO_DETAIL_CACHE_SIZE = int(os.environ.get('HERO_DETAIL_CACHE_SIZE', '1024'))
+# Intervalle (secondes) de revalidation des fiches sur la base principale,
+# retard maximal d'un processus sur les écritures des autres
+HERO_DETAIL_CACHE_REVALIDATE = float(os.environ.get('HERO_DETAIL_CACHE_REVALIDATE', '1'))
+# Intervalle (secondes) de journalisation des compteurs du cache de chaque
+# processus (0 pour désactiver)
+HERO_DETAIL_CACHE_LOG_INTERVAL = float(os.environ.get('HERO_DETAIL_CACHE_LOG_INTERVAL', '300'))
+
+# ============================================================================
+# INSTANTANÉ ANALYTIQUE DES HÉROS
+# ============================================================================
+# Instantanés colonnaires (NumPy) lus par /api/analytics/, partagés par les
+# workers d'un même hôte (commande refresh_hero_snapshot)
+HERO_SNAPSHOT_DIR = os.environ.get(
+    'HERO_SNAPSHOT_DIR', os.path.join(tempfile.gettempdir(), 'paffmmo-snapshot')
+)
+# Intervalle (secondes) de détection d'une nouvelle génération, par processus
+HERO_SNAPSHOT_CHECK_INTERVAL = float(os.environ.get('HERO_SNAPSHOT_CHECK_INTERVAL', '10'))
+
+# ============================================================================
+# FICHES PERSONNAGE (PDF)
+# ============================================================================
+# Alias du cache des fiches rendues (None pour le désactiver)
+CHARACTER_SHEET_CACHE = os.environ.get('CHARACTER_SHEET_CACHE', 'sheets') or None
+# Processus de rendu des lots de fiches (0 : un par cœur)
+CHARACTER_SHEET_WORKERS = int(os.environ.get('CHARACTER_SHEET_WORKERS', '0'))
+
+# ============================================================================
+# API ASYNCHRONE (ASGI)
+# ============================================================================
+# Sert les lectures de l'API par les vues asynchrones (ORM asynchrone) ;
+# activé par défaut par paffmmo_project/asgi.py
+API_ASYNC_VIEWS = os.environ.get('API_ASYNC_VIEWS', 'False').lower() in ('true', '1', 'yes')
+
 # ============================================================================
 # VALIDATION DES MOTS DE PASSE
 # ============================================================================
@@ -1,24 +1,14 @@
-import csv
-import io
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-from django.http import HttpResponse, JsonResponse
+from django.http import JsonResponse
 from django.contrib import admin
+from django.core.cache import cache
+from django.db.models import OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.template.response import TemplateResponse
 from django.urls import path
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
-from reportlab.lib.utils import ImageReader
-from reportlab.graphics.shapes import Drawing, Rect, String, Group, Circle, Line, Polygon
-from reportlab.graphics import renderPDF
-from openpyxl import Workbook
-from .models import Hero, Region, Skill
-from django.core.serializers.json import DjangoJSONEncoder
-import json
+from . import exports, routers
+from .adminlist import ScalableAdminMixin
+from .models import Hero, HeroStatsRollup, Region, Skill
+from .search import get_search_backend
 
 
 class BaseAdmin(admin.ModelAdmin):
@@ -29,10 +19,23 @@ class BaseAdmin(admin.ModelAdmin):
 class RegionAdmin(BaseAdmin):
     list_display = ('name', 'environment_type', 'hero_count')
     search_fields = ('name',)
+    query_budget = {'changelist': 5, 'change': 5}
+
+    def get_queryset(self, request):
+        # Nombre de héros lu dans les agrégats plutôt que par jointure sur tous les héros
+        hero_counts = (
+            HeroStatsRollup.objects
+            .filter(region=OuterRef('pk'))
+            .values('region')
+            .annotate(total=Sum('hero_count'))
+            .values('total')
+        )
+        return super().get_queryset(request).annotate(heroes_count=Coalesce(Subquery(hero_counts), 0))
 
     def hero_count(self, obj):
-        return obj.heroes.count()
+        return obj.heroes_count
     hero_count.short_description = 'Nombre de Héros'
+    hero_count.admin_order_field = 'heroes_count'
 
 
 @admin.register(Skill)
@@ -40,368 +43,131 @@ class SkillAdmin(BaseAdmin):
     list_display = ('name', 'damage_type', 'mana_cost')
     list_filter = ('damage_type',)
     search_fields = ('name',)
+    query_budget = {'changelist': 5, 'change': 5}
 
 
-def export_to_csv(modeladmin, request, queryset):
-    meta = modeladmin.model._meta
-    field_names = [field.name for field in meta.fields if field.name != 'id']
-    field_names.extend(['region', 'skills'])
-
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename={meta}.csv'
-    writer = csv.writer(response)
-
-    writer.writerow(field_names)
-    for obj in queryset:
-        row = []
-        for field in meta.fields:
-            if field.name != 'id':
-                val = getattr(obj, field.name)
-                if hasattr(val, 'id'):
-                    val = str(val)
-                row.append(val)
-        row.append(str(obj.region) if obj.region else '')
-        row.append(', '.join([s.name for s in obj.skills.all()]))
-        writer.writerow(row)
-
-    return response
-
-
-export_to_csv.short_description = 'Exporter en CSV'
-
-
-def export_to_excel(modeladmin, request, queryset):
-    wb = Workbook()
-    ws = wb.active
-    ws.title = 'Héros'
-
-    headers = ['Surnom', 'Classe', 'Niveau', 'HP Actuel', 'XP', 'Or', 'Actif', 'Région', 'Compétences']
-    ws.append(headers)
-
-    for hero in queryset:
-        skills_list = ', '.join([s.name for s in hero.skills.all()])
-        ws.append([
-            hero.nickname,
-            hero.get_job_class_display(),
-            hero.level,
-            hero.hp_current,
-            hero.xp,
-            hero.gold,
-            'Oui' if hero.is_active else 'Non',
-            str(hero.region) if hero.region else '',
-            skills_list
-        ])
-
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename=heroes.xlsx'
-    wb.save(response)
-
-    return response
-
-
-export_to_excel.short_description = 'Exporter en Excel'
-
-
-def generate_character_sheet(modeladmin, request, queryset):
-    if queryset.count() != 1:
-        modeladmin.message_user(request, 'Selectionnez exactement un heros.', level='error')
-        return
-
-    hero = queryset.first()
-
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename=fiche_{hero.nickname}.pdf'
-
-    doc = SimpleDocTemplate(response, pagesize=letter, rightMargin=50, leftMargin=50, topMargin=50, bottomMargin=50)
-    styles = getSampleStyleSheet()
-    story = []
-
-    # Palette de couleurs
-    COLOR_HEADER = colors.HexColor('#1a1a2e')
-    COLOR_ACCENT = colors.HexColor('#f4c430')
-    COLOR_BG = colors.HexColor('#f5f5f5')
-    COLOR_TEXT = colors.HexColor('#333333')
-    COLOR_SKILL_PHY = colors.HexColor('#e74c3c')
-    COLOR_SKILL_MAG = colors.HexColor('#9b59b6')
-    COLOR_SKILL_HEAL = colors.HexColor('#27ae60')
-    COLOR_SKILL_MIX = colors.HexColor('#f39c12')
-
-    # === TITRE PRINCIPAL ===
-    title_style = ParagraphStyle(
-        'HeroTitle',
-        parent=styles['Heading1'],
-        fontSize=26,
-        textColor=COLOR_HEADER,
-        alignment=1,
-        spaceAfter=8,
-        fontName='Helvetica-Bold'
-    )
-    story.append(Paragraph('FICHE PERSONNAGE', title_style))
-
-    subtitle_style = ParagraphStyle(
-        'Subtitle',
-        fontSize=16,
-        textColor=COLOR_ACCENT,
-        alignment=1,
-        spaceAfter=20,
-        fontName='Helvetica'
-    )
-    story.append(Paragraph('PAFFMMO RPG ATLAS', subtitle_style))
-
-    # Ligne de separation
-    line_table = Table([['']], colWidths=[450])
-    line_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, -1), COLOR_ACCENT),
-        ('TOPPADDING', (0, 0), (-1, -1), 3),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
-    ]))
-    story.append(line_table)
-    story.append(Spacer(1, 15))
-
-    # === NOM ET NIVEAU ===
-    name_style = ParagraphStyle(
-        'HeroName',
-        fontSize=22,
-        textColor=COLOR_HEADER,
-        alignment=1,
-        spaceAfter=30,
-        fontName='Helvetica-Bold'
-    )
-    story.append(Paragraph(hero.nickname, name_style))
-
-    class_style = ParagraphStyle(
-        'ClassInfo',
-        fontSize=14,
-        textColor=COLOR_TEXT,
-        alignment=1,
-        spaceAfter=40,
-        fontName='Helvetica'
-    )
-    story.append(Paragraph(f'Niveau {hero.level} - {hero.get_job_class_display()}', class_style))
-    story.append(Spacer(1, 20))
-
-    # === TABLEAU DES STATS ===
-    stats_title = ParagraphStyle(
-        'StatsTitle',
-        fontSize=12,
-        textColor=COLOR_HEADER,
-        fontName='Helvetica-Bold',
-        spaceBefore=10,
-        spaceAfter=8
-    )
-    story.append(Paragraph('STATISTIQUES', stats_title))
-
-    # En-tetes du tableau
-    header_data = [['Attribut', 'Valeur', 'Attribut', 'Valeur']]
-    header_table = Table(header_data, colWidths=[120, 130, 120, 130])
-    header_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), COLOR_HEADER),
-        ('TEXTCOLOR', (0, 0), (-1, 0), COLOR_ACCENT),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 11),
-        ('TOPPADDING', (0, 0), (-1, 0), 8),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-    ]))
-    story.append(header_table)
-
-    # Donnees du tableau
-    stats_data = [
-        ['HP Actuel', f'{hero.hp_current}', 'HP Maximum', f'{hero.max_hp}'],
-        ['Experience (XP)', f'{hero.xp}', 'Niveau', f'{hero.level}'],
-        ['Or', f'{hero.gold}', 'Actif', 'Oui' if hero.is_active else 'Non'],
-        ['Region', hero.region.name if hero.region else 'Inconnue', 'Cree le', hero.created_at.strftime('%d/%m/%Y')],
-    ]
-    stats_table = Table(stats_data, colWidths=[120, 130, 120, 130])
-    stats_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, -1), COLOR_BG),
-        ('TEXTCOLOR', (0, 0), (-1, -1), COLOR_TEXT),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTNAME', (2, 0), (2, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 11),
-        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-        ('TOPPADDING', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
-        ('ROWBACKGROUNDS', (0, 0), (-1, -1), [COLOR_BG, colors.HexColor('#e8e8e8')]),
-    ]))
-    story.append(stats_table)
-    story.append(Spacer(1, 15))
-
-    # === BARRE DE HP ===
-    hp_pct = hero.hp_current / hero.max_hp
-    hp_color = colors.HexColor('#27ae60') if hp_pct > 0.5 else colors.HexColor('#f39c12') if hp_pct > 0.25 else colors.HexColor('#e74c3c')
-
-    hp_table = Table([['']], colWidths=[int(400 * hp_pct)])
-    hp_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, -1), hp_color),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-    ]))
-
-    hp_title = ParagraphStyle(
-        'HPTitle',
-        fontSize=12,
-        textColor=COLOR_HEADER,
-        fontName='Helvetica-Bold',
-        spaceBefore=10,
-        spaceAfter=5
-    )
-    story.append(Paragraph('BARRE DE VIE', hp_title))
-    story.append(hp_table)
-
-    hp_text_style = ParagraphStyle(
-        'HPText',
-        fontSize=11,
-        textColor=COLOR_TEXT,
-        alignment=1,
-        spaceAfter=15
-    )
-    story.append(Paragraph(f'{hero.hp_current} / {hero.max_hp} HP ({hp_pct*100:.1f}%)', hp_text_style))
-
-    # === COMPETENCES ===
-    if hero.skills.exists():
-        skill_title = ParagraphStyle(
-            'SkillTitle',
-            fontSize=12,
-            textColor=COLOR_HEADER,
-            fontName='Helvetica-Bold',
-            spaceBefore=15,
-            spaceAfter=10
-        )
-        story.append(Paragraph('COMPETENCES', skill_title))
-
-        for skill in hero.skills.all():
-            dmg_color = {
-                'physical': COLOR_SKILL_PHY,
-                'magical': COLOR_SKILL_MAG,
-                'healing': COLOR_SKILL_HEAL,
-                'mixed': COLOR_SKILL_MIX,
-            }.get(skill.damage_type, colors.grey)
-
-            skill_text = f'{skill.name} - {skill.get_damage_type_display()} ({skill.mana_cost} mana)'
-            skill_style = ParagraphStyle(
-                'SkillItem',
-                fontSize=11,
-                textColor=dmg_color,
-                spaceBefore=3,
-                spaceAfter=3,
-                fontName='Helvetica-Bold'
-            )
-            story.append(Paragraph(skill_text, skill_style))
-
-            sub_style = ParagraphStyle(
-                'SkillSub',
-                fontSize=10,
-                textColor=colors.grey,
-                spaceBefore=0,
-                spaceAfter=5,
-                fontName='Helvetica'
-            )
-            story.append(Paragraph(f'Type: {skill.get_damage_type_display()} | Cout en mana: {skill.mana_cost}', sub_style))
-
-        story.append(Spacer(1, 10))
-
-    # === BIOGRAPHIE ===
-    if hero.biography:
-        bio_title = ParagraphStyle(
-            'BioTitle',
-            fontSize=12,
-            textColor=COLOR_HEADER,
-            fontName='Helvetica-Bold',
-            spaceBefore=15,
-            spaceAfter=10
-        )
-        story.append(Paragraph('BIOGRAPHIE', bio_title))
-
-        bio_style = ParagraphStyle(
-            'BioText',
-            parent=styles['Normal'],
-            fontSize=10,
-            leading=14,
-            alignment=4,
-            spaceBefore=5,
-            textColor=COLOR_TEXT
-        )
-        story.append(Paragraph(hero.biography, bio_style))
-        story.append(Spacer(1, 15))
-
-    # === FOOTER ===
-    story.append(Spacer(1, 10))
-    line_table2 = Table([['']], colWidths=[450])
-    line_table2.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, -1), COLOR_ACCENT),
-        ('TOPPADDING', (0, 0), (-1, -1), 2),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
-    ]))
-    story.append(line_table2)
-
-    footer_style = ParagraphStyle(
-        'Footer',
-        parent=styles['Normal'],
-        fontSize=9,
-        textColor=colors.grey,
-        alignment=1,
-        spaceBefore=15,
-    )
-    story.append(Paragraph(f'Fiche genere le {hero.created_at.strftime("%d/%m/%Y a %H:%M")} - PAFFMMO RPG ATLAS', footer_style))
+# Actions d'export : backends importés au premier déclenchement (voir exports)
+export_to_csv = exports.admin_action('csv', 'export_to_csv')
+export_to_excel = exports.admin_action('excel', 'export_to_excel')
+generate_character_sheet = exports.admin_action('pdf', 'generate_character_sheet')
+generate_character_sheets_pdf = exports.admin_action('pdf_merged', 'generate_character_sheets_pdf')
 
-    doc.build(story)
-    return response
 
+# Durée de cache des données du dashboard (secondes)
+DASHBOARD_CACHE_TIMEOUT = 30
+DASHBOARD_CACHE_KEY = 'rpgatlas:dashboard'
 
-generate_character_sheet.short_description = 'Générer la fiche PDF'
 
+def get_dashboard_data():
+    """
+    Agrège côté base les données du dashboard (répartition des classes,
+    niveau moyen par région, totaux) à partir de HeroStatsRollup.
+    """
+    labels = dict(Hero.JobClass.choices)
 
-def dashboard_view(modeladmin, request, queryset=None):
-    heroes = Hero.objects.all()
+    totals = HeroStatsRollup.objects.aggregate(
+        hero_count=Sum('hero_count'),
+        level_sum=Sum('level_sum'),
+        total_gold=Sum('gold_sum'),
+    )
+    hero_count = totals['hero_count'] or 0
+
+    class_rows = (
+        HeroStatsRollup.objects
+        .values('job_class')
+        .annotate(count=Sum('hero_count'))
+        .filter(count__gt=0)
+        .order_by('-count')
+    )
+    region_rows = (
+        HeroStatsRollup.objects
+        .values('region__name')
+        .annotate(count=Sum('hero_count'), level_total=Sum('level_sum'))
+        .filter(count__gt=0)
+        .order_by('region__name')
+    )
 
-    job_classes = {}
-    for hero in heroes:
-        job_classes[hero.get_job_class_display()] = job_classes.get(hero.get_job_class_display(), 0) + 1
+    return {
+        'hero_count': hero_count,
+        'avg_level': (totals['level_sum'] or 0) / hero_count if hero_count else 0,
+        'total_gold': totals['total_gold'] or 0,
+        'class_distribution': [
+            {'job_class': row['job_class'], 'label': labels.get(row['job_class'], row['job_class']), 'count': row['count']}
+            for row in class_rows
+        ],
+        'region_levels': [
+            {'region': row['region__name'] or 'Sans région', 'count': row['count'], 'avg_level': row['level_total'] / row['count']}
+            for row in region_rows
+        ],
+    }
 
-    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 6))
 
-    ax1.pie(job_classes.values(), labels=job_classes.keys(), autopct='%1.1f%%', startangle=90)
-    ax1.set_title('Répartition des Classes')
+def get_cached_dashboard_data(request=None):
+    """Données du dashboard, mises en cache quelques secondes (agrégats lus sur un réplica)."""
+    with routers.replica_reads(request):
+        return cache.get_or_set(DASHBOARD_CACHE_KEY, get_dashboard_data, DASHBOARD_CACHE_TIMEOUT)
 
-    region_levels = {}
-    for hero in heroes:
-        region_name = str(hero.region) if hero.region else 'Sans région'
-        if region_name not in region_levels:
-            region_levels[region_name] = []
-        region_levels[region_name].append(hero.level)
 
-    avg_levels = {k: sum(v) / len(v) for k, v in region_levels.items()}
-    ax2.bar(avg_levels.keys(), avg_levels.values(), color='steelblue')
-    ax2.set_title('Moyenne des Niveaux par Région')
-    ax2.set_xlabel('Région')
-    ax2.set_ylabel('Niveau Moyen')
-    ax2.tick_params(axis='x', rotation=45)
+def dashboard_view(modeladmin, request, queryset=None):
+    return exports.get_backend('chart')(get_cached_dashboard_data(request))
 
-    plt.tight_layout()
-    response = HttpResponse(content_type='image/png')
-    plt.savefig(response, format='png')
-    plt.close()
 
-    return response
+dashboard_view.short_description = 'Graphiques'
 
 
-dashboard_view.short_description = 'Graphiques'
+# Paramètres des filtres de la liste des héros couverts par HeroStatsRollup
+ROLLUP_FILTER_PARAMS = {
+    'job_class__exact': 'job_class',
+    'region__id__exact': 'region_id',
+    'is_active__exact': 'is_active',
+}
 
 
 @admin.register(Hero)
-class HeroAdmin(BaseAdmin):
+class HeroAdmin(ScalableAdminMixin, BaseAdmin):
     list_display = ('nickname', 'job_class', 'level', 'hp_current', 'region', 'is_active', 'created_at')
     list_filter = ('job_class', 'is_active', 'region', 'created_at')
+    list_select_related = ('region',)
+    date_hierarchy = 'created_at'
+    # Les compteurs par filtre seraient autant de COUNT(*) sur toute la table
+    show_facets = admin.ShowFacets.NEVER
+    query_budget = {'changelist': 8, 'change': 7}
     search_fields = ('nickname', 'biography')
     filter_horizontal = ('skills',)
-    actions = [export_to_csv, export_to_excel, generate_character_sheet]
+    actions = [export_to_csv, export_to_excel, generate_character_sheet, generate_character_sheets_pdf]
+
+    def get_result_counts(self, request, changelist):
+        """
+        Nombres exacts lus dans HeroStatsRollup lorsque seuls les filtres
+        de classe, de région et de statut sont actifs (sans recherche).
+        """
+        if changelist.query:
+            return None
+        filters = {}
+        for param, values in changelist.get_filters_params().items():
+            if param not in ROLLUP_FILTER_PARAMS:
+                return None
+            value = values[-1] if isinstance(values, list) else values
+            if param == 'is_active__exact':
+                value = value in ('1', 'True', 'true')
+            elif param == 'region__id__exact':
+                try:
+                    value = int(value)
+                except ValueError:
+                    return None
+            filters[ROLLUP_FILTER_PARAMS[param]] = value
+
+        totals = HeroStatsRollup.objects.aggregate(
+            total=Sum('hero_count'),
+            matching=Sum('hero_count', filter=Q(**filters)) if filters else Sum('hero_count'),
+        )
+        return totals['matching'] or 0, totals['total'] or 0
 
-    def get_actions(self, request):
-        actions = super().get_actions(request)
-        return actions
+    def get_search_results(self, request, queryset, search_term):
+        """Recherche via l'index plein texte plutôt que des icontains."""
+        if not search_term:
+            return queryset, False
+        return get_search_backend().search(queryset, search_term.split()), False
 
     def changelist_view(self, request, extra_context=None):
         if extra_context is None:
@@ -413,53 +179,18 @@ class HeroAdmin(BaseAdmin):
         urls = super().get_urls()
         custom_urls = [
             path('dashboard/', self.admin_site.admin_view(self.dashboard_view), name='dashboard'),
+            path('dashboard/data/', self.admin_site.admin_view(self.dashboard_data_view), name='dashboard_data'),
         ]
         return custom_urls + urls
 
     def dashboard_view(self, request):
-        heroes = Hero.objects.all()
-
-        job_classes = {}
-        for hero in heroes:
-            display = hero.get_job_class_display()
-            job_classes[display] = job_classes.get(display, 0) + 1
-
-        region_levels = {}
-        for hero in heroes:
-            region_name = str(hero.region) if hero.region else 'Sans région'
-            if region_name not in region_levels:
-                region_levels[region_name] = []
-            region_levels[region_name].append(hero.level)
-
-        avg_levels = {k: sum(v) / len(v) for k, v in region_levels.items()}
-
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 6))
-
-        ax1.pie(job_classes.values(), labels=job_classes.keys(), autopct='%1.1f%%', startangle=90)
-        ax1.set_title('Répartition des Classes')
-
-        ax2.bar(avg_levels.keys(), avg_levels.values(), color='steelblue')
-        ax2.set_title('Moyenne des Niveaux par Région')
-        ax2.set_xlabel('Région')
-        ax2.set_ylabel('Niveau Moyen')
-        ax2.tick_params(axis='x', rotation=45)
-
-        plt.tight_layout()
-
-        import base64
-        from io import BytesIO
-        buffer = BytesIO()
-        plt.savefig(buffer, format='png', dpi=100)
-        buffer.seek(0)
-        image_base64 = base64.b64encode(buffer.read()).decode('utf-8')
-        plt.close()
-
         context = {
+            **self.admin_site.each_context(request),
             'title': 'Dashboard PAFFMMO',
-            'image_base64': image_base64,
-            'hero_count': heroes.count(),
-            'avg_level': sum([h.level for h in heroes]) / len(heroes) if heroes else 0,
-            'total_gold': sum([h.gold for h in heroes]),
+            'opts': self.model._meta,
         }
+        return TemplateResponse(request, 'admin/dashboard.html', context)
 
-        return TemplateResponse(request, 'admin/dashboard.html', context)
\ No newline at end of file
+    def dashboard_data_view(self, request):
+        """Données agrégées du dashboard, au format JSON."""
+        return JsonResponse(get_cached_dashboard_data(request))
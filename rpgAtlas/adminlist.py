@@ -0,0 +1,241 @@
+"""
+PAFFMMO - Listes de l'admin à grande échelle
+============================================
+ChangeList de l'admin pour les tables de plusieurs millions de lignes :
+
+- nombre de résultats exact lorsque le ModelAdmin sait le lire ailleurs
+  (get_result_counts, ex. agrégats HeroStatsRollup), sinon compté jusqu'à
+  count_limit seulement (« plus de N ») au lieu d'un COUNT(*) complet ;
+- navigation « précédent / suivant » par clé (keyset) sur le tri courant :
+  les pages profondes ne paient pas d'OFFSET ;
+- hiérarchie de dates lue dans l'index de la date (bornes, puis un EXISTS
+  par période dans une seule requête) au lieu d'un SELECT DISTINCT sur
+  toute la table (voir templatetags/atlas_admin).
+"""
+import base64
+import calendar
+import datetime
+import json
+
+from django.conf import settings
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import InvalidPage
+from django.db import models
+from django.db.models import Exists, F, OrderBy
+from django.utils import timezone
+
+from .pagination import CursorJSONEncoder, seek_filter
+
+
+# Paramètre d'URL du curseur de navigation par clé
+CURSOR_VAR = 'cursor'
+
+# Au-delà, le nombre de résultats affiché est « plus de COUNT_LIMIT »
+COUNT_LIMIT = 10000
+
+
+class ScalableChangeList(ChangeList):
+    """ChangeList à comptage borné et navigation par clé."""
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Changer de tri, de filtre ou de page repart du début de la liste
+        if not new_params or CURSOR_VAR not in new_params:
+            remove = [*(remove or []), CURSOR_VAR]
+        return super().get_query_string(new_params, remove)
+
+    def get_results(self, request):
+        self.keyset_ordering = self.get_keyset_ordering()
+        self.cursor = self.decode_cursor(request)
+
+        counts = self.model_admin.get_result_counts(request, self)
+        if counts is not None:
+            result_count, full_result_count = counts
+            self.count_is_estimate = False
+        else:
+            # COUNT(*) borné : au plus count_limit + 1 lignes parcourues
+            limit = self.model_admin.count_limit
+            result_count = self.queryset.order_by().values('pk')[:limit + 1].count()
+            self.count_is_estimate = result_count > limit
+            result_count = min(result_count, limit)
+            full_result_count = None
+
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        # Paginator.count est une cached_property : on la renseigne d'avance
+        paginator.count = result_count
+        can_show_all = not self.count_is_estimate and result_count <= self.list_max_show_all
+        multi_page = self.count_is_estimate or result_count > self.list_per_page or self.cursor is not None
+
+        self.has_next = self.has_previous = False
+        if self.cursor is not None:
+            result_list = self.get_keyset_page()
+        elif (self.show_all and can_show_all) or not multi_page:
+            result_list = self.queryset._clone()
+        else:
+            try:
+                page = paginator.page(self.page_num)
+            except InvalidPage:
+                raise IncorrectLookupParameters
+            result_list = page.object_list
+            self.has_next = page.has_next() or self.count_is_estimate
+
+        self.result_count = result_count
+        self.show_full_result_count = full_result_count is not None
+        self.show_admin_actions = not self.show_full_result_count or bool(full_result_count)
+        self.full_result_count = full_result_count
+        self.result_list = result_list
+        self.can_show_all = can_show_all
+        self.multi_page = multi_page
+        self.paginator = paginator
+
+    def get_keyset_ordering(self):
+        """
+        Tri courant sous forme de noms de champs (« -champ » si décroissant),
+        ou None si la navigation par clé est impossible : expression, champ
+        d'un modèle lié, colonne NULL, ou liste éditable (formset).
+        """
+        if self.list_editable:
+            return None
+        meta = self.model._meta
+        ordering = []
+        unique = False
+        for item in self.queryset.query.order_by:
+            if isinstance(item, str):
+                name, descending = item.lstrip('-'), item.startswith('-')
+            elif isinstance(item, OrderBy) and isinstance(item.expression, F):
+                name, descending = item.expression.name, item.descending
+            else:
+                return None
+            try:
+                field = meta.pk if name == 'pk' else meta.get_field(name)
+            except FieldDoesNotExist:
+                return None
+            if not field.concrete or field.null or field.is_relation:
+                return None
+            ordering.append(f'-{name}' if descending else name)
+            unique = unique or field.unique
+        # Clé strictement ordonnée : le tri doit finir par un champ unique
+        return ordering if unique else None
+
+    def decode_cursor(self, request):
+        token = request.GET.get(CURSOR_VAR)
+        if not token:
+            return None
+        if not self.keyset_ordering:
+            raise IncorrectLookupParameters
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(token.encode('ascii')).decode('utf-8'))
+            values = payload['v']
+            if len(values) != len(self.keyset_ordering):
+                raise ValueError
+            values = [self._field(name).to_python(value) for name, value in zip(self.keyset_ordering, values)]
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise IncorrectLookupParameters
+        return {'v': values, 'r': bool(payload.get('r'))}
+
+    def get_keyset_page(self):
+        """Page suivant (ou précédant) la clé du curseur, sans OFFSET."""
+        ordering = self.keyset_ordering
+        reverse = self.cursor['r']
+        if reverse:
+            ordering = [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+        rows = list(
+            self.queryset.order_by(*ordering)
+            .filter(seek_filter(ordering, self.cursor['v']))[:self.list_per_page + 1]
+        )
+        has_more = len(rows) > self.list_per_page
+        rows = rows[:self.list_per_page]
+        if reverse:
+            rows.reverse()
+        self.has_next = has_more if not reverse else True
+        self.has_previous = not reverse or has_more
+        return rows
+
+    def keyset_url(self, row, reverse=False):
+        """Lien vers la page suivant (reverse=False) ou précédant la ligne."""
+        values = [getattr(row, self._field(name).attname) for name in self.keyset_ordering]
+        payload = json.dumps({'v': values, 'r': int(reverse)}, cls=CursorJSONEncoder)
+        token = base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+        return self.get_query_string({CURSOR_VAR: token})
+
+    def _field(self, name):
+        meta = self.model._meta
+        name = name.lstrip('-')
+        return meta.pk if name == 'pk' else meta.get_field(name)
+
+
+class ScalableAdminMixin:
+    """
+    ModelAdmin à listes rapides sur de très grandes tables (ScalableChangeList).
+    Les sous-classes peuvent fournir des nombres exacts bon marché via
+    get_result_counts.
+    """
+    change_list_template = 'admin/scalable_change_list.html'
+    count_limit = COUNT_LIMIT
+
+    def get_changelist(self, request, **kwargs):
+        return ScalableChangeList
+
+    def get_result_counts(self, request, changelist):
+        """(nombre filtré, nombre total) sans COUNT(*), ou None pour un comptage borné."""
+        return None
+
+
+def date_bounds(queryset, field_name):
+    """Première et dernière dates du queryset, lues par deux recherches dans l'index."""
+    dates = queryset.order_by().values_list(field_name, flat=True).exclude(**{field_name: None})
+    first = dates.order_by(field_name).first()
+    if first is None:
+        return None, None
+    return first, dates.order_by(f'-{field_name}').first()
+
+
+def date_periods(queryset, field_name, kind, first=None, last=None, year=None, month=None):
+    """
+    Périodes ('year', 'month' ou 'day') contenant au moins une ligne,
+    sous forme de dates : un EXISTS par période candidate, en une requête,
+    chacun étant une recherche par plage dans l'index de la date.
+    """
+    if kind == 'year':
+        starts = [datetime.date(value, 1, 1) for value in range(first.year, last.year + 1)]
+    elif kind == 'month':
+        starts = [datetime.date(year, value, 1) for value in range(1, 13)]
+    else:
+        days = calendar.monthrange(year, month)[1]
+        starts = [datetime.date(year, month, value) for value in range(1, days + 1)]
+    if not starts:
+        return []
+
+    field = queryset.model._meta.get_field(field_name)
+    rows = queryset.order_by().values('pk')
+    probes = {}
+    for index, start in enumerate(starts):
+        end = _period_end(start, kind)
+        probes[f'p{index}'] = Exists(rows.filter(**{
+            f'{field_name}__gte': _bound(field, start),
+            f'{field_name}__lt': _bound(field, end),
+        }))
+    found = queryset.model._default_manager.annotate(**probes).values(*probes).first() or {}
+    return [start for index, start in enumerate(starts) if found.get(f'p{index}')]
+
+
+def _period_end(start, kind):
+    if kind == 'year':
+        return start.replace(year=start.year + 1)
+    if kind == 'month':
+        return (start + datetime.timedelta(days=32)).replace(day=1)
+    return start + datetime.timedelta(days=1)
+
+
+def _bound(field, day):
+    """Borne de période pour le champ (datetime locale si DateTimeField)."""
+    if not isinstance(field, models.DateTimeField):
+        return day
+    value = datetime.datetime.combine(day, datetime.time.min)
+    return timezone.make_aware(value) if settings.USE_TZ else value
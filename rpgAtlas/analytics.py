@@ -0,0 +1,169 @@
+"""
+PAFFMMO - Analyses des héros
+============================
+Calculs vectorisés (NumPy) sur l'instantané colonnaire des héros
+(rpgAtlas.snapshot) : filtres de l'API en masque booléen, groupes par
+np.unique, puis histogrammes, statistiques, percentiles et corrélations
+en quelques passes sur les colonnes (bincount, reduceat, lexsort), quel
+que soit le nombre de groupes.
+"""
+import numpy as np
+
+
+# Colonnes analysables et colonnes de regroupement
+NUMERIC_COLUMNS = ('level', 'xp', 'gold', 'hp_current', 'max_hp', 'hp_percentage')
+GROUP_COLUMNS = ('job_class', 'region', 'is_active')
+
+# Bornes des paramètres
+MAX_BINS = 200
+MAX_PERCENTILES = 20
+
+
+def filter_mask(snapshot, filters):
+    """
+    Masque des héros retenus par les filtres ({'job_class': code,
+    'region': id, 'is_active': bool, 'min_level': n, ...}), None si aucun.
+    """
+    mask = None
+
+    def combine(condition):
+        nonlocal mask
+        mask = condition if mask is None else mask & condition
+
+    if filters.get('job_class') is not None:
+        combine(snapshot['job_class'] == filters['job_class'])
+    if filters.get('region') is not None:
+        combine(snapshot['region'] == filters['region'])
+    if filters.get('is_active') is not None:
+        combine(snapshot['is_active'] == filters['is_active'])
+    if filters.get('min_level') is not None:
+        combine(snapshot['level'] >= filters['min_level'])
+    if filters.get('max_level') is not None:
+        combine(snapshot['level'] <= filters['max_level'])
+    if filters.get('min_hp_pct') is not None:
+        combine(snapshot['hp_percentage'] >= filters['min_hp_pct'])
+    if filters.get('max_hp_pct') is not None:
+        combine(snapshot['hp_percentage'] <= filters['max_hp_pct'])
+    return mask
+
+
+def select(snapshot, name, mask):
+    """Colonne restreinte au masque (copie en mémoire des seules lignes retenues)."""
+    column = snapshot[name]
+    return np.asarray(column) if mask is None else column[mask]
+
+
+def group_by(snapshot, by, mask):
+    """
+    (clés triées des groupes non vides, indice de groupe de chaque héros
+    retenu) ; un seul groupe (clé None) sans regroupement.
+    """
+    if by is None:
+        count = len(snapshot) if mask is None else int(np.count_nonzero(mask))
+        return [None], np.zeros(count, dtype=np.intp)
+    keys, inverse = np.unique(select(snapshot, by, mask), return_inverse=True)
+    return keys.tolist(), inverse.reshape(-1)
+
+
+def group_key(snapshot, by, key):
+    """Clé publique et libellé d'un groupe (classe, région, statut)."""
+    if by == 'job_class':
+        job_classes = snapshot.meta['job_classes']
+        return tuple(job_classes[key]) if 0 <= key < len(job_classes) else (None, None)
+    if by == 'region':
+        return (None, None) if key < 0 else (key, snapshot.meta['regions'].get(str(key)))
+    if by == 'is_active':
+        return bool(key), 'Actif' if key else 'Inactif'
+    return None, None
+
+
+def group_counts(inverse, groups):
+    """Effectif de chaque groupe."""
+    return np.bincount(inverse, minlength=groups)
+
+
+def _bounds(counts):
+    """Début de chaque groupe dans les valeurs triées par groupe."""
+    return np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+
+def histogram(values, inverse, groups, bins):
+    """
+    Bornes communes et effectifs par groupe (tableau groupes x classes),
+    comme np.histogram (dernière classe fermée).
+    """
+    if not len(values):
+        return np.full(bins + 1, np.nan), np.zeros((groups, bins), dtype=np.int64)
+    edges = np.histogram_bin_edges(values, bins=bins)
+    index = np.clip(np.searchsorted(edges, values, side='right') - 1, 0, bins - 1)
+    counts = np.bincount(inverse * bins + index, minlength=groups * bins)
+    return edges, counts.reshape(groups, bins)
+
+
+def describe(values, inverse, groups):
+    """Effectif, somme, moyenne, écart-type, minimum et maximum par groupe."""
+    counts = np.bincount(inverse, minlength=groups)
+    values = values.astype(np.float64)
+    sums = np.bincount(inverse, weights=values, minlength=groups)
+    squares = np.bincount(inverse, weights=values * values, minlength=groups)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / counts
+        stds = np.sqrt(np.maximum(squares / counts - means * means, 0))
+    ordered = values[np.argsort(inverse, kind='stable')]
+    starts = _bounds(counts)
+    return {
+        'count': counts,
+        'sum': sums,
+        'mean': means,
+        'std': stds,
+        'min': np.minimum.reduceat(ordered, starts) if len(ordered) else counts * np.nan,
+        'max': np.maximum.reduceat(ordered, starts) if len(ordered) else counts * np.nan,
+    }
+
+
+def percentiles(values, inverse, groups, points):
+    """
+    Percentiles (interpolation linéaire, comme np.percentile) de chaque
+    groupe : tableau groupes x points, calculé sur un seul tri.
+    """
+    counts = group_counts(inverse, groups)
+    ordered = values[np.lexsort((values, inverse))].astype(np.float64)
+    if not len(ordered):
+        return np.full((groups, len(points)), np.nan)
+    positions = _bounds(counts)[:, None] + np.asarray(points)[None, :] / 100 * (counts[:, None] - 1)
+    lower = np.floor(positions).astype(np.intp)
+    upper = np.ceil(positions).astype(np.intp)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (positions - lower)
+
+
+def correlation(x, y, inverse, groups):
+    """Coefficient de Pearson et droite de régression y = a·x + b par groupe."""
+    x = x.astype(np.float64)
+    y = y.astype(np.float64)
+    counts = np.bincount(inverse, minlength=groups)
+    sums = {
+        name: np.bincount(inverse, weights=weights, minlength=groups)
+        for name, weights in (('x', x), ('y', y), ('xx', x * x), ('yy', y * y), ('xy', x * y))
+    }
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_x = sums['x'] / counts
+        mean_y = sums['y'] / counts
+        var_x = sums['xx'] / counts - mean_x * mean_x
+        var_y = sums['yy'] / counts - mean_y * mean_y
+        covariance = sums['xy'] / counts - mean_x * mean_y
+        pearson = covariance / np.sqrt(var_x * var_y)
+        slope = covariance / var_x
+    return {
+        'count': counts,
+        'pearson': pearson,
+        'slope': slope,
+        'intercept': mean_y - slope * mean_x,
+    }
+
+
+def to_json(value):
+    """Scalaire NumPy en valeur JSON (NaN et infinis : None)."""
+    value = value.item() if hasattr(value, 'item') else value
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    return value
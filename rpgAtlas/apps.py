@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class RpgatlasConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'rpgAtlas'
+
+    def ready(self):
+        from . import signals
+        post_migrate.connect(signals.setup_search_index, sender=self)
+        post_migrate.connect(signals.setup_stats_rollup, sender=self)
@@ -0,0 +1,170 @@
+"""
+PAFFMMO - Vues asynchrones de l'API
+===================================
+Chemins de lecture asynchrones des ViewSets (ORM asynchrone de Django),
+servis sous ASGI à la place des vues synchrones lorsque le réglage
+API_ASYNC_VIEWS est actif : une requête lente (recherche, statistiques)
+n'immobilise plus un thread du worker pendant ses accès à la base.
+
+Chaque action de lecture n'a qu'une implémentation, asynchrone,
+préfixée par « a » (alist, aretrieve, astats...) ; l'action synchrone du
+même nom (WSGI, API navigable) en est dérivée par sync_action. Filtres,
+pagination, serializers, requêtes conditionnelles et cache des réponses
+sont repris des ViewSets. Les formats autres que JSON (API navigable)
+sont délégués à la vue synchrone.
+"""
+from contextlib import nullcontext
+from functools import wraps
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from django.urls import URLPattern
+from rest_framework.response import Response
+
+from .routers import use_replica
+
+
+def sync_action(async_method):
+    """
+    Action synchrone exécutant l'action asynchrone `async_method` (avec
+    les décorateurs de la vue) : une seule implémentation par action.
+    """
+    name = async_method.__name__
+
+    @wraps(async_method)
+    def method(self, request, *args, **kwargs):
+        return async_to_sync(getattr(self, name))(request, *args, **kwargs)
+    # Nom de l'action (routes de @action) et non de la variante asynchrone
+    method.__name__ = name[1:]
+    return method
+
+
+class AsyncReadOnlyMixin:
+    """
+    list et retrieve d'un ViewSet DRF implémentées avec l'ORM asynchrone
+    (alist, aretrieve), les variantes synchrones en étant dérivées.
+    """
+
+    async def afilter_queryset(self, queryset):
+        """
+        filter_queryset dans un thread : certains backends de recherche
+        (index inversé) lisent la base à la construction du filtre.
+        """
+        return await sync_to_async(self.filter_queryset)(queryset)
+
+    async def apaginate_queryset(self, queryset):
+        """Variante asynchrone de paginate_queryset."""
+        if self.paginator is None:
+            return None
+        return await self.paginator.apaginate_queryset(queryset, self.request, view=self)
+
+    async def aget_object(self):
+        """Variante asynchrone de get_object."""
+        queryset = await self.afilter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            obj = await queryset.aget(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (queryset.model.DoesNotExist, TypeError, ValueError, ValidationError):
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = await self.afilter_queryset(self.get_queryset())
+        page = await self.apaginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = self.get_serializer([obj async for obj in queryset], many=True)
+        return Response(serializer.data)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        instance = await self.aget_object()
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data)
+
+    list = sync_action(alist)
+    retrieve = sync_action(aretrieve)
+
+
+def async_action_view(viewset_class, action, sync_view=None, **initkwargs):
+    """
+    Construit la vue Django asynchrone de l'action `action` du ViewSet,
+    équivalente à viewset_class.as_view({'get': action}). `sync_view`
+    (vue du routeur) sert les autres méthodes de la route.
+    """
+    handler_name = f'a{action}'
+    if sync_view is None:
+        sync_view = viewset_class.as_view({'get': action}, **initkwargs)
+    actions = dict(getattr(sync_view, 'actions', None) or {'get': action})
+
+    async def view(request, *args, **kwargs):
+        # OPTIONS et autres méthodes de la route : vue synchrone
+        if request.method not in ('GET', 'HEAD'):
+            return await sync_to_async(sync_view)(request, *args, **kwargs)
+
+        self = viewset_class(**initkwargs)
+        self.action_map = actions
+        self.action = action
+        # Comme ViewSetMixin.as_view : en-tête Allow et HEAD
+        for method, name in actions.items():
+            setattr(self, method, getattr(self, name))
+        if 'head' not in actions:
+            self.head = self.get
+        self.args = args
+        self.kwargs = kwargs
+        self.headers = self.default_response_headers
+        self.response_deferred = True
+
+        # Lectures sur un réplica (voir rpgAtlas.routers)
+        routing = nullcontext()
+        if hasattr(self, 'select_replica'):
+            routing = use_replica(await sync_to_async(self.select_replica)(request))
+        with routing:
+            request = self.initialize_request(request, *args, **kwargs)
+            self.request = request
+            try:
+                self.format_kwarg = self.get_format_suffix(**kwargs)
+                request.accepted_renderer, request.accepted_media_type = \
+                    self.perform_content_negotiation(request)
+                if request.accepted_renderer.format != 'json':
+                    return await sync_to_async(sync_view)(request._request, *args, **kwargs)
+                # Authentification (session), permissions et throttling
+                await sync_to_async(self.initial)(request, *args, **kwargs)
+                response = await getattr(self, handler_name)(request, *args, **kwargs)
+            except Exception as exc:
+                response = self.handle_exception(exc)
+
+            response = self.finalize_response(request, response, *args, **kwargs)
+            if hasattr(response, 'render'):
+                response.render()
+            if hasattr(self, 'astore_response'):
+                await self.astore_response(response)
+        return response
+
+    # Attributs lus par le budget de requêtes et le routeur d'URL
+    view.cls = viewset_class
+    view.actions = actions
+    view.initkwargs = initkwargs
+    view.csrf_exempt = True
+    return view
+
+
+def async_urlpatterns(router):
+    """
+    Routes du routeur DRF, dans son ordre, où la lecture (GET) des
+    actions disposant d'une méthode a<action> est servie par la vue
+    asynchrone : à utiliser à la place de router.urls. Garder l'ordre du
+    routeur évite que la route de détail capture une action de liste
+    (/heroes/leaderboard/ lu comme le héros « leaderboard »).
+    """
+    patterns = []
+    for pattern in router.urls:
+        callback = getattr(pattern, 'callback', None)
+        action = (getattr(callback, 'actions', None) or {}).get('get')
+        if action and hasattr(callback.cls, f'a{action}'):
+            view = async_action_view(callback.cls, action, sync_view=callback, **callback.initkwargs)
+            pattern = URLPattern(pattern.pattern, view, pattern.default_args, pattern.name)
+        patterns.append(pattern)
+    return patterns
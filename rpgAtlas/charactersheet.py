@@ -0,0 +1,374 @@
+"""
+PAFFMMO - Fiches personnage PDF
+===============================
+Rendu des fiches personnage (reportlab), à l'unité ou par lots :
+
+- les styles de paragraphes et de tableaux sont construits une seule
+  fois par processus (get_styles) ;
+- un lot est rendu en parallèle dans un pool de processus (un par cœur
+  par défaut, réglage CHARACTER_SHEET_WORKERS), partagé entre les
+  requêtes du worker web ;
+- chaque fiche rendue est mise en cache (réglage CHARACTER_SHEET_CACHE),
+  indexée par l'identifiant du héros, son updated_at et une empreinte
+  des données qu'updated_at ne couvre pas (compétences, région).
+
+Les fonctions de rendu ne reçoivent que des dict (sheet_data) : les
+processus du pool n'accèdent ni à la base ni aux modèles.
+"""
+import hashlib
+import io
+import multiprocessing
+import os
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.core.cache import caches
+from pypdf import PdfWriter
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+
+# En dessous de ce nombre de fiches à rendre, le rendu reste dans le processus
+POOL_MIN_SHEETS = 4
+
+# Au-delà de cette taille, l'archive ou le PDF fusionné est écrit sur disque
+SHEET_SPOOL_SIZE = 10 * 1024 * 1024
+
+# Palette de couleurs
+COLOR_HEADER = colors.HexColor('#1a1a2e')
+COLOR_ACCENT = colors.HexColor('#f4c430')
+COLOR_BG = colors.HexColor('#f5f5f5')
+COLOR_TEXT = colors.HexColor('#333333')
+COLOR_SKILL = {
+    'physical': colors.HexColor('#e74c3c'),
+    'magical': colors.HexColor('#9b59b6'),
+    'healing': colors.HexColor('#27ae60'),
+    'mixed': colors.HexColor('#f39c12'),
+}
+COLOR_HP_HIGH = colors.HexColor('#27ae60')
+COLOR_HP_MEDIUM = colors.HexColor('#f39c12')
+COLOR_HP_LOW = colors.HexColor('#e74c3c')
+
+
+@lru_cache(maxsize=None)
+def get_styles():
+    """Styles des fiches, construits une fois par processus."""
+    sample = getSampleStyleSheet()
+
+    def separator(padding):
+        return TableStyle([
+            ('BACKGROUND', (0, 0), (-1, -1), COLOR_ACCENT),
+            ('TOPPADDING', (0, 0), (-1, -1), padding),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), padding),
+        ])
+
+    def section(name, space_before, space_after):
+        return ParagraphStyle(
+            name, fontSize=12, textColor=COLOR_HEADER, fontName='Helvetica-Bold',
+            spaceBefore=space_before, spaceAfter=space_after
+        )
+
+    def hp_bar(color):
+        return TableStyle([
+            ('BACKGROUND', (0, 0), (-1, -1), color),
+            ('TOPPADDING', (0, 0), (-1, -1), 8),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+        ])
+
+    return SimpleNamespace(
+        title=ParagraphStyle(
+            'HeroTitle', parent=sample['Heading1'], fontSize=26, textColor=COLOR_HEADER,
+            alignment=1, spaceAfter=8, fontName='Helvetica-Bold'
+        ),
+        subtitle=ParagraphStyle(
+            'Subtitle', fontSize=16, textColor=COLOR_ACCENT, alignment=1, spaceAfter=20,
+            fontName='Helvetica'
+        ),
+        name=ParagraphStyle(
+            'HeroName', fontSize=22, textColor=COLOR_HEADER, alignment=1, spaceAfter=30,
+            fontName='Helvetica-Bold'
+        ),
+        job_class=ParagraphStyle(
+            'ClassInfo', fontSize=14, textColor=COLOR_TEXT, alignment=1, spaceAfter=40,
+            fontName='Helvetica'
+        ),
+        stats_title=section('StatsTitle', 10, 8),
+        hp_title=section('HPTitle', 10, 5),
+        hp_text=ParagraphStyle('HPText', fontSize=11, textColor=COLOR_TEXT, alignment=1, spaceAfter=15),
+        skill_title=section('SkillTitle', 15, 10),
+        skill_items={
+            damage_type: ParagraphStyle(
+                'SkillItem', fontSize=11, textColor=color, spaceBefore=3, spaceAfter=3,
+                fontName='Helvetica-Bold'
+            )
+            for damage_type, color in {**COLOR_SKILL, None: colors.grey}.items()
+        },
+        skill_sub=ParagraphStyle(
+            'SkillSub', fontSize=10, textColor=colors.grey, spaceBefore=0, spaceAfter=5,
+            fontName='Helvetica'
+        ),
+        bio_title=section('BioTitle', 15, 10),
+        bio=ParagraphStyle(
+            'BioText', parent=sample['Normal'], fontSize=10, leading=14, alignment=4,
+            spaceBefore=5, textColor=COLOR_TEXT
+        ),
+        footer=ParagraphStyle(
+            'Footer', parent=sample['Normal'], fontSize=9, textColor=colors.grey, alignment=1,
+            spaceBefore=15
+        ),
+        header_separator=separator(3),
+        footer_separator=separator(2),
+        stats_header=TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), COLOR_HEADER),
+            ('TEXTCOLOR', (0, 0), (-1, 0), COLOR_ACCENT),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 11),
+            ('TOPPADDING', (0, 0), (-1, 0), 8),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+        ]),
+        stats=TableStyle([
+            ('BACKGROUND', (0, 0), (-1, -1), COLOR_BG),
+            ('TEXTCOLOR', (0, 0), (-1, -1), COLOR_TEXT),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+            ('FONTNAME', (2, 0), (2, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 11),
+            ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+            ('TOPPADDING', (0, 0), (-1, -1), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
+            ('ROWBACKGROUNDS', (0, 0), (-1, -1), [COLOR_BG, colors.HexColor('#e8e8e8')]),
+        ]),
+        hp_bars={
+            'high': hp_bar(COLOR_HP_HIGH),
+            'medium': hp_bar(COLOR_HP_MEDIUM),
+            'low': hp_bar(COLOR_HP_LOW),
+        },
+    )
+
+
+def sheet_data(hero):
+    """
+    Données d'une fiche, sous forme sérialisable pour le pool de
+    processus (héros chargé avec sa région et ses compétences).
+    """
+    return {
+        'id': hero.pk,
+        'nickname': hero.nickname,
+        'level': hero.level,
+        'job_class_display': str(hero.get_job_class_display()),
+        'hp_current': hero.hp_current,
+        'max_hp': hero.max_hp,
+        'xp': hero.xp,
+        'gold': hero.gold,
+        'is_active': hero.is_active,
+        'region_name': hero.region.name if hero.region else None,
+        'created_at': hero.created_at,
+        'updated_at': hero.updated_at,
+        'biography': hero.biography,
+        'skills': [
+            (skill.name, skill.damage_type, str(skill.get_damage_type_display()), skill.mana_cost)
+            for skill in hero.skills.all()
+        ],
+    }
+
+
+def render_sheet(data):
+    """Rend la fiche PDF d'un héros (dict de sheet_data) ; retourne les octets du PDF."""
+    styles = get_styles()
+    output = io.BytesIO()
+    doc = SimpleDocTemplate(output, pagesize=letter, rightMargin=50, leftMargin=50, topMargin=50, bottomMargin=50)
+    story = []
+
+    # === TITRE PRINCIPAL ===
+    story.append(Paragraph('FICHE PERSONNAGE', styles.title))
+    story.append(Paragraph('PAFFMMO RPG ATLAS', styles.subtitle))
+
+    # Ligne de separation
+    line_table = Table([['']], colWidths=[450])
+    line_table.setStyle(styles.header_separator)
+    story.append(line_table)
+    story.append(Spacer(1, 15))
+
+    # === NOM ET NIVEAU ===
+    story.append(Paragraph(data['nickname'], styles.name))
+    story.append(Paragraph(f"Niveau {data['level']} - {data['job_class_display']}", styles.job_class))
+    story.append(Spacer(1, 20))
+
+    # === TABLEAU DES STATS ===
+    story.append(Paragraph('STATISTIQUES', styles.stats_title))
+
+    header_table = Table([['Attribut', 'Valeur', 'Attribut', 'Valeur']], colWidths=[120, 130, 120, 130])
+    header_table.setStyle(styles.stats_header)
+    story.append(header_table)
+
+    stats_data = [
+        ['HP Actuel', f"{data['hp_current']}", 'HP Maximum', f"{data['max_hp']}"],
+        ['Experience (XP)', f"{data['xp']}", 'Niveau', f"{data['level']}"],
+        ['Or', f"{data['gold']}", 'Actif', 'Oui' if data['is_active'] else 'Non'],
+        ['Region', data['region_name'] or 'Inconnue', 'Cree le', data['created_at'].strftime('%d/%m/%Y')],
+    ]
+    stats_table = Table(stats_data, colWidths=[120, 130, 120, 130])
+    stats_table.setStyle(styles.stats)
+    story.append(stats_table)
+    story.append(Spacer(1, 15))
+
+    # === BARRE DE HP ===
+    hp_pct = data['hp_current'] / data['max_hp'] if data['max_hp'] else 0
+    hp_level = 'high' if hp_pct > 0.5 else 'medium' if hp_pct > 0.25 else 'low'
+    hp_table = Table([['']], colWidths=[int(400 * hp_pct)])
+    hp_table.setStyle(styles.hp_bars[hp_level])
+
+    story.append(Paragraph('BARRE DE VIE', styles.hp_title))
+    story.append(hp_table)
+    story.append(Paragraph(
+        f"{data['hp_current']} / {data['max_hp']} HP ({hp_pct*100:.1f}%)", styles.hp_text
+    ))
+
+    # === COMPETENCES ===
+    if data['skills']:
+        story.append(Paragraph('COMPETENCES', styles.skill_title))
+        for name, damage_type, damage_type_display, mana_cost in data['skills']:
+            skill_style = styles.skill_items.get(damage_type, styles.skill_items[None])
+            story.append(Paragraph(f'{name} - {damage_type_display} ({mana_cost} mana)', skill_style))
+            story.append(Paragraph(
+                f'Type: {damage_type_display} | Cout en mana: {mana_cost}', styles.skill_sub
+            ))
+        story.append(Spacer(1, 10))
+
+    # === BIOGRAPHIE ===
+    if data['biography']:
+        story.append(Paragraph('BIOGRAPHIE', styles.bio_title))
+        story.append(Paragraph(data['biography'], styles.bio))
+        story.append(Spacer(1, 15))
+
+    # === FOOTER ===
+    story.append(Spacer(1, 10))
+    line_table2 = Table([['']], colWidths=[450])
+    line_table2.setStyle(styles.footer_separator)
+    story.append(line_table2)
+    story.append(Paragraph(
+        f'Fiche genere le {data["created_at"].strftime("%d/%m/%Y a %H:%M")} - PAFFMMO RPG ATLAS',
+        styles.footer,
+    ))
+
+    doc.build(story)
+    return output.getvalue()
+
+
+def get_sheet_cache():
+    """Retourne le cache des fiches rendues, ou None s'il est désactivé."""
+    alias = getattr(settings, 'CHARACTER_SHEET_CACHE', None)
+    return caches[alias] if alias else None
+
+
+def sheet_cache_key(data):
+    """
+    Clé : identifiant et updated_at du héros, plus une empreinte des
+    données de la fiche (les compétences et la région peuvent changer
+    sans modifier updated_at).
+    """
+    digest = hashlib.sha1(repr(sorted(data.items())).encode('utf-8')).hexdigest()[:16]
+    return f"sheet:{data['id']}:{int(data['updated_at'].timestamp() * 1000000)}:{digest}"
+
+
+def render_sheets(heroes):
+    """
+    Fiches PDF des héros (région et compétences préchargées), dans
+    l'ordre : [(données, octets du PDF)]. Les fiches absentes du cache
+    sont rendues en parallèle puis mises en cache.
+    """
+    datas = [sheet_data(hero) for hero in heroes]
+    keys = [sheet_cache_key(data) for data in datas]
+    cache = get_sheet_cache()
+    sheets = cache.get_many(keys) if cache is not None else {}
+
+    missing = [(key, data) for key, data in zip(keys, datas) if key not in sheets]
+    if missing:
+        rendered = dict(zip(
+            [key for key, data in missing],
+            render_many([data for key, data in missing]),
+        ))
+        if cache is not None:
+            cache.set_many(rendered)
+        sheets.update(rendered)
+    return [(data, sheets[key]) for key, data in zip(keys, datas)]
+
+
+_pool = None
+
+
+def get_workers():
+    """Nombre de processus de rendu (réglage CHARACTER_SHEET_WORKERS, un par cœur sinon)."""
+    return getattr(settings, 'CHARACTER_SHEET_WORKERS', None) or os.cpu_count() or 1
+
+
+def get_pool():
+    """
+    Pool de processus de rendu, créé au premier lot et réutilisé ensuite.
+    Démarrage 'spawn' : les workers web sont multithreadés, un fork
+    pourrait hériter d'un verrou tenu par un autre thread.
+    """
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=get_workers(),
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=get_styles,
+        )
+    return _pool
+
+
+def render_many(datas):
+    """Rend plusieurs fiches, en parallèle si le lot le justifie."""
+    workers = get_workers()
+    if workers <= 1 or len(datas) < POOL_MIN_SHEETS:
+        return [render_sheet(data) for data in datas]
+
+    global _pool
+    chunksize = max(1, len(datas) // (workers * 4))
+    try:
+        return list(get_pool().map(render_sheet, datas, chunksize=chunksize))
+    except BrokenProcessPool:
+        # Processus de rendu tué (mémoire...) : nouveau pool au prochain lot
+        _pool = None
+        return [render_sheet(data) for data in datas]
+
+
+def sheet_filename(data):
+    return f"fiche_{data['nickname']}.pdf"
+
+
+def build_zip(sheets):
+    """Archive ZIP des fiches (fichier temporaire, positionné au début)."""
+    output = tempfile.SpooledTemporaryFile(max_size=SHEET_SPOOL_SIZE)
+    names = set()
+    # Les PDF sont déjà compressés : stockés tels quels
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_STORED) as archive:
+        for data, pdf in sheets:
+            name = sheet_filename(data)
+            if name in names:
+                name = f"fiche_{data['nickname']}_{data['id']}.pdf"
+            names.add(name)
+            archive.writestr(name, pdf)
+    output.seek(0)
+    return output
+
+
+def merge_sheets(sheets):
+    """Fiches concaténées en un seul PDF (fichier temporaire, positionné au début)."""
+    writer = PdfWriter()
+    for data, pdf in sheets:
+        writer.append(io.BytesIO(pdf))
+    output = tempfile.SpooledTemporaryFile(max_size=SHEET_SPOOL_SIZE)
+    writer.write(output)
+    output.seek(0)
+    return output
@@ -0,0 +1,223 @@
+"""
+PAFFMMO - Export colonnaire
+===========================
+Export des héros au format Parquet ou Arrow IPC (flux), pour les analyses
+(pandas, DuckDB, Polars...). Les héros sont lus par lots sur la clé
+primaire avec values_list() (colonnes typées, région jointe) et leurs
+compétences en une requête par lot (plage d'identifiants, ou listes IN
+si le filtre est sélectif) ; chaque lot devient un RecordBatch
+Arrow (un row group Parquet) écrit puis envoyé aussitôt : la mémoire
+utilisée ne dépend que de la taille d'un lot.
+
+pyarrow n'est importé qu'au premier export (démarrage des workers).
+"""
+from collections import defaultdict
+from importlib.util import find_spec
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import StreamingHttpResponse
+
+from .models import Hero
+
+
+# Héros par lot (RecordBatch Arrow / row group Parquet)
+EXPORT_BATCH_SIZE = 20000
+
+# Lot clairsemé (compétences lues par IN) quand il contient moins d'un
+# identifiant sur SPARSE_BATCH_RATIO de sa plage
+SPARSE_BATCH_RATIO = 4
+
+# Colonnes lues dans values_list(), dans l'ordre du schéma
+EXPORT_COLUMNS = (
+    'id',
+    'nickname',
+    'job_class',
+    'level',
+    'hp_current',
+    'max_hp',
+    'hp_percentage',
+    'xp',
+    'gold',
+    'is_active',
+    'region_id',
+    'region__name',
+    'created_at',
+    'updated_at',
+)
+
+# Formats : extension, type MIME
+EXPORT_FORMATS = {
+    'parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'arrow': ('arrows', 'application/vnd.apache.arrow.stream'),
+}
+
+
+def is_available():
+    """pyarrow est-il installé ?"""
+    return find_spec('pyarrow') is not None
+
+
+def get_schema():
+    """Schéma Arrow de l'export (region_name et skills en plus des colonnes du héros)."""
+    import pyarrow as pa
+
+    return pa.schema([
+        ('id', pa.int64()),
+        ('nickname', pa.string()),
+        ('job_class', pa.dictionary(pa.int8(), pa.string())),
+        ('level', pa.int32()),
+        ('hp_current', pa.int32()),
+        ('max_hp', pa.int32()),
+        ('hp_percentage', pa.float64()),
+        ('xp', pa.int64()),
+        ('gold', pa.int64()),
+        ('is_active', pa.bool_()),
+        ('region_id', pa.int64()),
+        ('region_name', pa.string()),
+        ('created_at', pa.timestamp('us', tz='UTC')),
+        ('updated_at', pa.timestamp('us', tz='UTC')),
+        ('skills', pa.list_(pa.string())),
+    ])
+
+
+def iter_batches(queryset, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Parcourt les héros du queryset par lots sur la clé primaire (sans
+    OFFSET ni curseur serveur ouvert pendant tout l'export) et produit
+    un RecordBatch par lot.
+    """
+    import pyarrow as pa
+
+    schema = get_schema()
+    rows_queryset = queryset.select_related(None).prefetch_related(None).order_by('pk')
+    last_id = None
+    while True:
+        page = rows_queryset if last_id is None else rows_queryset.filter(pk__gt=last_id)
+        rows = list(page.values_list(*EXPORT_COLUMNS)[:batch_size])
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        columns = list(zip(*rows))
+        columns.append(_skill_names(columns[0], using=queryset.db))
+        yield pa.record_batch(
+            [_column_array(values, field.type) for values, field in zip(columns, schema)],
+            schema=schema,
+        )
+        if len(rows) < batch_size:
+            return
+
+
+def _skill_names(hero_ids, using=None):
+    """
+    Noms des compétences de chaque héros du lot, dans l'ordre des
+    identifiants. Lot dense (filtre peu sélectif) : plage d'identifiants
+    plutôt qu'une longue liste IN ; lot clairsemé : listes IN bornées par
+    la limite de paramètres du moteur, pour ne pas parcourir toute la
+    table de liaison entre le premier et le dernier héros.
+    """
+    skills = defaultdict(list)
+    links = Hero.skills.through.objects.using(using)
+    if len(hero_ids) * SPARSE_BATCH_RATIO >= hero_ids[-1] - hero_ids[0] + 1:
+        filters = [{'hero_id__gte': hero_ids[0], 'hero_id__lte': hero_ids[-1]}]
+    else:
+        size = connections[using or DEFAULT_DB_ALIAS].features.max_query_params or len(hero_ids)
+        filters = [{'hero_id__in': hero_ids[start:start + size]} for start in range(0, len(hero_ids), size)]
+    for lookup in filters:
+        rows = links.filter(**lookup).order_by('hero_id', 'skill__name').values_list('hero_id', 'skill__name')
+        for hero_id, name in rows:
+            skills[hero_id].append(name)
+    return [skills.get(hero_id, []) for hero_id in hero_ids]
+
+
+# Dictionnaire fixe de la colonne job_class, identique pour tous les lots
+JOB_CLASS_INDEX = {value: index for index, value in enumerate(Hero.JobClass.values)}
+
+
+def _column_array(values, arrow_type):
+    import pyarrow as pa
+
+    if pa.types.is_dictionary(arrow_type):
+        indices = pa.array([JOB_CLASS_INDEX.get(value) for value in values], type=arrow_type.index_type)
+        return pa.DictionaryArray.from_arrays(indices, pa.array(Hero.JobClass.values, type=pa.string()))
+    return pa.array(values, type=arrow_type)
+
+
+class ChunkSink:
+    """
+    Pseudo-fichier en écriture seule : accumule les octets écrits par
+    pyarrow jusqu'à ce que le flux HTTP les récupère par take().
+    """
+
+    closed = False
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_export(queryset, export_format, batch_size=EXPORT_BATCH_SIZE):
+    """Octets du fichier d'export, produits lot par lot."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = ChunkSink()
+    schema = get_schema()
+    if export_format == 'parquet':
+        writer = pq.ParquetWriter(sink, schema, compression='zstd')
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+
+    for batch in iter_batches(queryset, batch_size):
+        if export_format == 'parquet':
+            writer.write_batch(batch, row_group_size=batch.num_rows)
+        else:
+            writer.write_batch(batch)
+        yield sink.take()
+    writer.close()
+    yield sink.take()
+
+
+def export_response(request, queryset, export_format):
+    """
+    Réponse HTTP en flux. Sous ASGI, le flux est asynchrone : chaque lot
+    est produit dans le thread des vues synchrones, sans charger tout
+    l'export en mémoire.
+    """
+    extension, content_type = EXPORT_FORMATS[export_format]
+    chunks = iter_export(queryset, export_format)
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        chunks = _aiter_chunks(chunks)
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename=heroes.{extension}'
+    return response
+
+
+async def _aiter_chunks(chunks):
+    next_chunk = sync_to_async(next)
+    while True:
+        chunk = await next_chunk(chunks, None)
+        if chunk is None:
+            return
+        yield chunk
@@ -0,0 +1,129 @@
+"""
+PAFFMMO - Ticks de combat
+=========================
+Application groupée de soins et de dégâts : mêmes règles que Hero.heal et
+Hero.take_damage (0 ≤ hp_current ≤ level × 100), mais calculées par la base
+dans quelques UPDATE ensemblistes plutôt qu'un chargement et une sauvegarde
+par héros. Les lignes sont verrouillées (SELECT ... FOR UPDATE, si le moteur
+le permet) le temps de lire les HP et d'appliquer l'UPDATE : aucun soin ni
+dégât concurrent n'est perdu et les montants renvoyés sont exacts.
+
+Les UPDATE ne déclenchent pas les signaux de Hero : updated_at et la
+version 'hero_rows' sont donc tenus à jour ici, et les fiches en cache
+des héros modifiés retirées (herocache). Les agrégats de
+statistiques ne dépendent pas des HP.
+"""
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Greatest, Least
+from django.utils import timezone
+
+from . import conditional, herocache
+from .models import Hero
+
+
+# Colonnes lues pour calculer les montants appliqués
+TICK_COLUMNS = ('id', 'hp_current', 'level')
+
+
+class TooManyHeroes(Exception):
+    """Le filtre d'un tick désigne plus de héros que la limite permise."""
+
+    def __init__(self, count, limit):
+        self.count = count
+        self.limit = limit
+        super().__init__(f'{count} héros correspondent au filtre, au plus {limit} par tick')
+
+
+def clamped_hp(delta):
+    """Expression SQL : hp_current + delta, borné à [0, level × 100]."""
+    return Greatest(
+        Least(F('hp_current') + delta, F('level') * 100),
+        Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def apply_deltas(deltas):
+    """
+    Applique un delta de HP par héros ({hero_id: delta}, positif pour un
+    soin, négatif pour des dégâts).
+
+    Retourne une liste de {'hero_id', 'applied', 'hp_current'} pour les
+    héros trouvés ; applied est la variation réellement appliquée.
+    """
+    ids = sorted(deltas)
+    # Deux paramètres par héros au plus : filtre et CASE de l'UPDATE
+    batch_size = max(connection.ops.bulk_batch_size(('id', 'delta'), ids), 1)
+    results = []
+    with transaction.atomic():
+        now = timezone.now()
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            rows = _lock_rows(Hero.objects.filter(pk__in=batch))
+            changes = _compute(rows, deltas.get)
+            results.extend(changes)
+
+            # Un CASE par valeur de delta : un tick répète souvent les mêmes
+            by_delta = defaultdict(list)
+            for change in changes:
+                if change['applied']:
+                    by_delta[deltas[change['hero_id']]].append(change['hero_id'])
+            if by_delta:
+                delta = Case(
+                    *[When(pk__in=hero_ids, then=Value(value)) for value, hero_ids in by_delta.items()],
+                    default=Value(0),
+                    output_field=IntegerField(),
+                )
+                changed = [hero_id for hero_ids in by_delta.values() for hero_id in hero_ids]
+                Hero.objects.filter(pk__in=changed).update(hp_current=clamped_hp(delta), updated_at=now)
+        _bump_versions(results)
+    return results
+
+
+def apply_delta(queryset, delta, limit=None):
+    """
+    Applique le même delta de HP à tous les héros du queryset, en un seul
+    UPDATE ; retourne les montants appliqués comme apply_deltas. Lève
+    TooManyHeroes, sans rien modifier, si plus de `limit` héros sont
+    concernés (vérifié avant de verrouiller et de lire les lignes).
+    """
+    with transaction.atomic():
+        if limit is not None:
+            count = queryset.count()
+            if count > limit:
+                raise TooManyHeroes(count, limit)
+        rows = _lock_rows(queryset)
+        # Héros apparus entre le comptage et le verrouillage
+        if limit is not None and len(rows) > limit:
+            raise TooManyHeroes(len(rows), limit)
+        results = _compute(rows, lambda hero_id: delta)
+        # Seuls les héros dont les HP changent sont modifiés (updated_at, ETag)
+        queryset.exclude(hp_current=clamped_hp(delta)).update(
+            hp_current=clamped_hp(delta), updated_at=timezone.now()
+        )
+        _bump_versions(results)
+    return results
+
+
+def _lock_rows(queryset):
+    """Lit et verrouille les héros, dans l'ordre des clés (pas d'interblocage)."""
+    return list(queryset.select_for_update().order_by('pk').values_list(*TICK_COLUMNS))
+
+
+def _compute(rows, get_delta):
+    """Nouveaux HP et montants appliqués, selon les règles de heal / take_damage."""
+    results = []
+    for hero_id, hp_current, level in rows:
+        new_hp = max(min(hp_current + get_delta(hero_id), level * 100), 0)
+        results.append({'hero_id': hero_id, 'applied': new_hp - hp_current, 'hp_current': new_hp})
+    return results
+
+
+def _bump_versions(results):
+    changed = [result['hero_id'] for result in results if result['applied']]
+    if changed:
+        conditional.bump('hero_rows')
+        herocache.invalidate(*changed)
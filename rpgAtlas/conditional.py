@@ -0,0 +1,206 @@
+"""
+PAFFMMO - Requêtes conditionnelles
+==================================
+ETag / Last-Modified sur les endpoints en lecture de l'API : les
+validateurs sont calculés sans sérialiser (Hero.updated_at et compteurs
+DataVersion) et une requête If-None-Match / If-Modified-Since dont les
+validateurs correspondent reçoit un 304 Not Modified.
+"""
+import hashlib
+import inspect
+from functools import wraps
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .models import DataVersion
+
+
+# Versions tenues à jour par les signaux :
+# - heroes : suppressions de héros, compétences des héros, régions et
+#   compétences affichées dans les fiches (les sauvegardes de héros sont
+#   couvertes par Hero.updated_at)
+# - hero_rows : sauvegardes de héros (générations du cache des réponses)
+# - regions : régions et nombre de héros par région
+# - skills : compétences et nombre de héros par compétence
+DATA_VERSIONS = ('heroes', 'hero_rows', 'regions', 'skills')
+
+
+def bump(*names):
+    """Incrémente les versions données, en les créant au besoin."""
+    now = timezone.now()
+    names = sorted(set(names))
+    updated = DataVersion.objects.filter(name__in=names).update(
+        version=F('version') + 1, updated_at=now
+    )
+    if updated == len(names):
+        return
+    existing = set(DataVersion.objects.filter(name__in=names).values_list('name', flat=True))
+    for name in names:
+        if name in existing:
+            continue
+        try:
+            with transaction.atomic():
+                DataVersion.objects.create(name=name, version=1, updated_at=now)
+        except IntegrityError:
+            # Créée entre-temps par une autre transaction
+            DataVersion.objects.filter(name=name).update(
+                version=F('version') + 1, updated_at=now
+            )
+
+
+def get_versions(*names):
+    """
+    Retourne ({nom: version}, date de dernière modification) pour les
+    versions données ; une version jamais incrémentée vaut 0.
+    """
+    return _collect_versions(names, _versions_queryset(names))
+
+
+async def aget_request_versions(view, *names):
+    """
+    get_versions() lu une seule fois par requête (ORM asynchrone) : la
+    première lecture couvre aussi les versions du cache des réponses de la
+    vue (get_cache_versions), que la clé de cache et les validateurs
+    partagent.
+    """
+    missing = _missing_versions(view, names)
+    if missing:
+        _store_versions(view, missing, [row async for row in _versions_queryset(missing)])
+    return _request_versions(view, names)
+
+
+def _missing_versions(view, names):
+    read = getattr(view, '_read_versions', {})
+    if all(name in read for name in names):
+        return ()
+    shared = view.get_cache_versions() if hasattr(view, 'get_cache_versions') else ()
+    return tuple(sorted({*names, *shared} - read.keys()))
+
+
+def _store_versions(view, names, rows):
+    read = view.__dict__.setdefault('_read_versions', {})
+    # Version jamais incrémentée : absente de la table
+    read.update(dict.fromkeys(names))
+    read.update({name: (version, updated_at) for name, version, updated_at in rows})
+
+
+def _request_versions(view, names):
+    read = view._read_versions
+    return _collect_versions(names, [(name, *read[name]) for name in names if read[name] is not None])
+
+
+def _versions_queryset(names):
+    return DataVersion.objects.filter(name__in=names).values_list('name', 'version', 'updated_at')
+
+
+def _collect_versions(names, rows):
+    versions = {name: 0 for name in names}
+    last_modified = None
+    for name, version, updated_at in rows:
+        versions[name] = version
+        last_modified = max(filter(None, (last_modified, updated_at)))
+    return versions, last_modified
+
+
+def make_etag(request, *parts):
+    """
+    ETag de la représentation : URL (paramètres triés, leur ordre ne change
+    pas la réponse), type de média et validateurs.
+    """
+    params = sorted((name, value) for name, values in request.GET.lists() for value in values)
+    source = '|'.join(str(part) for part in (
+        request.build_absolute_uri(request.path),
+        params,
+        getattr(request, 'accepted_media_type', ''),
+        *parts,
+    ))
+    return quote_etag(hashlib.sha1(source.encode('utf-8')).hexdigest())
+
+
+def conditional_get(method):
+    """
+    Décore une action de ViewSet : calcule les validateurs via
+    get_conditional_validators() (aget_conditional_validators() pour une
+    action asynchrone), répond 304 s'ils correspondent à la
+    requête, sinon exécute l'action et ajoute ETag et Last-Modified.
+    """
+    if inspect.iscoroutinefunction(method):
+        @wraps(method)
+        async def async_wrapper(self, request, *args, **kwargs):
+            if hasattr(self, '_conditional_validators'):
+                return await method(self, request, *args, **kwargs)
+            self._conditional_validators = validators = await self.aget_conditional_validators()
+            not_modified = _not_modified(request, validators)
+            if not_modified is not None:
+                return not_modified
+            return _add_validators(await method(self, request, *args, **kwargs), validators)
+        return async_wrapper
+
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        # Déjà évalué par une action englobante (super().list(), ...)
+        if hasattr(self, '_conditional_validators'):
+            return method(self, request, *args, **kwargs)
+        self._conditional_validators = validators = self.get_conditional_validators()
+        not_modified = _not_modified(request, validators)
+        if not_modified is not None:
+            return not_modified
+        return _add_validators(method(self, request, *args, **kwargs), validators)
+    return wrapper
+
+
+def _not_modified(request, validators):
+    """Réponse 304 (ou 412) si les validateurs correspondent à la requête."""
+    if validators is None:
+        return None
+    etag, last_modified = validators
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    return get_conditional_response(request, etag=etag, last_modified=timestamp)
+
+
+def _add_validators(response, validators):
+    if validators is None or response.status_code != 200:
+        return response
+    etag, last_modified = validators
+    response.headers.setdefault('ETag', etag)
+    if last_modified is not None:
+        response.headers.setdefault('Last-Modified', http_date(int(last_modified.timestamp())))
+    # Le client doit revalider plutôt que d'appliquer une fraîcheur heuristique
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+class ConditionalGetMixin:
+    """
+    Ajoute les requêtes conditionnelles à alist et aretrieve (et donc à
+    list et retrieve, qui en sont dérivées) ; la vue fournit
+    aget_conditional_validators().
+    """
+
+    async def aget_conditional_validators(self):
+        """Retourne (etag, last_modified) ou None pour désactiver le mécanisme."""
+        raise NotImplementedError
+
+    @conditional_get
+    async def alist(self, request, *args, **kwargs):
+        return await super().alist(request, *args, **kwargs)
+
+    @conditional_get
+    async def aretrieve(self, request, *args, **kwargs):
+        return await super().aretrieve(request, *args, **kwargs)
+
+
+class DataVersionConditionalMixin(ConditionalGetMixin):
+    """Validateurs tirés des compteurs DataVersion listés dans data_versions."""
+
+    data_versions = ()
+
+    async def aget_conditional_validators(self):
+        return self._validators(*await aget_request_versions(self, *self.data_versions))
+
+    def _validators(self, versions, last_modified):
+        return make_etag(self.request, *sorted(versions.items())), last_modified
@@ -0,0 +1,55 @@
+"""
+PAFFMMO - Exports et rapports de l'admin
+========================================
+Registre des backends d'export de l'admin (CSV, Excel, fiches PDF,
+graphiques). Chaque backend est un module de ce paquet, importé au premier
+usage seulement : openpyxl, reportlab, pypdf et matplotlib ne sont chargés
+ni au démarrage des workers, ni par les commandes manage.py.
+
+Voir la commande profile_startup pour mesurer le coût des imports.
+"""
+from django.utils.module_loading import import_string
+
+
+# Nombre de héros chargés (et de compétences préchargées) par lot d'export
+EXPORT_CHUNK_SIZE = 2000
+
+# Backends : nom -> (chemin de la fonction, libellé)
+EXPORT_BACKENDS = {
+    'csv': ('rpgAtlas.exports.csvfile.export_to_csv', 'Exporter en CSV'),
+    'excel': ('rpgAtlas.exports.excel.export_to_excel', 'Exporter en Excel'),
+    'pdf': ('rpgAtlas.exports.pdf.generate_character_sheet', 'Générer les fiches PDF (ZIP si plusieurs)'),
+    'pdf_merged': ('rpgAtlas.exports.pdf.generate_character_sheets_pdf', 'Générer les fiches PDF (un seul fichier)'),
+    'chart': ('rpgAtlas.exports.chart.dashboard_chart', 'Graphiques'),
+}
+
+_backends = {}
+
+
+def get_backend(name):
+    """Fonction du backend `name`, importée au premier appel."""
+    if name not in _backends:
+        _backends[name] = import_string(EXPORT_BACKENDS[name][0])
+    return _backends[name]
+
+
+def admin_action(name, action_name):
+    """
+    Action d'admin `action_name` déléguant au backend `name` : le module du
+    backend n'est importé qu'au premier déclenchement de l'action.
+    """
+    def action(modeladmin, request, queryset):
+        return get_backend(name)(modeladmin, request, queryset)
+
+    action.__name__ = action.__qualname__ = action_name
+    action.short_description = EXPORT_BACKENDS[name][1]
+    return action
+
+
+def iter_export_rows(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Parcourt le queryset par lots : une requête par lot pour les héros
+    (région jointe) et une pour leurs compétences.
+    """
+    queryset = queryset.select_related('region').prefetch_related('skills')
+    return queryset.iterator(chunk_size=chunk_size)
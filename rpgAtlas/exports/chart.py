@@ -0,0 +1,32 @@
+"""
+PAFFMMO - Graphiques du dashboard
+=================================
+Rendu PNG (matplotlib, backend Agg) des données du dashboard.
+"""
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from django.http import HttpResponse
+
+
+def dashboard_chart(data):
+    """Répartition des classes et niveau moyen par région, en PNG."""
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 6))
+
+    classes = data['class_distribution']
+    ax1.pie([c['count'] for c in classes], labels=[c['label'] for c in classes], autopct='%1.1f%%', startangle=90)
+    ax1.set_title('Répartition des Classes')
+
+    regions = data['region_levels']
+    ax2.bar([r['region'] for r in regions], [r['avg_level'] for r in regions], color='steelblue')
+    ax2.set_title('Moyenne des Niveaux par Région')
+    ax2.set_xlabel('Région')
+    ax2.set_ylabel('Niveau Moyen')
+    ax2.tick_params(axis='x', rotation=45)
+
+    plt.tight_layout()
+    response = HttpResponse(content_type='image/png')
+    plt.savefig(response, format='png')
+    plt.close()
+
+    return response
@@ -0,0 +1,61 @@
+"""
+PAFFMMO - Export Excel
+======================
+Export des héros sélectionnés en classeur Excel (openpyxl, mode write-only).
+"""
+import tempfile
+
+from django.http import FileResponse
+from openpyxl import Workbook
+
+from . import iter_export_rows
+
+
+# Nombre maximal de lignes d'une feuille Excel (en-tête compris)
+EXCEL_MAX_ROWS = 1048576
+
+# Au-delà de cette taille, le classeur généré est écrit sur disque
+EXCEL_SPOOL_SIZE = 10 * 1024 * 1024
+
+
+def export_to_excel(modeladmin, request, queryset):
+    # Mode write-only : les lignes sont écrites au fil de l'eau, sans
+    # conserver les objets cellule en mémoire.
+    wb = Workbook(write_only=True)
+    headers = ['Surnom', 'Classe', 'Niveau', 'HP Actuel', 'XP', 'Or', 'Actif', 'Région', 'Compétences']
+
+    ws = None
+    sheet_rows = 0
+    for hero in iter_export_rows(queryset):
+        if ws is None or sheet_rows >= EXCEL_MAX_ROWS:
+            ws = wb.create_sheet('Héros' if ws is None else f'Héros {len(wb.worksheets) + 1}')
+            ws.append(headers)
+            sheet_rows = 1
+
+        skills_list = ', '.join([s.name for s in hero.skills.all()])
+        ws.append([
+            hero.nickname,
+            hero.get_job_class_display(),
+            hero.level,
+            hero.hp_current,
+            hero.xp,
+            hero.gold,
+            'Oui' if hero.is_active else 'Non',
+            str(hero.region) if hero.region else '',
+            skills_list
+        ])
+        sheet_rows += 1
+
+    if ws is None:
+        wb.create_sheet('Héros').append(headers)
+
+    output = tempfile.SpooledTemporaryFile(max_size=EXCEL_SPOOL_SIZE)
+    wb.save(output)
+    output.seek(0)
+
+    return FileResponse(
+        output,
+        as_attachment=True,
+        filename='heroes.xlsx',
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
@@ -0,0 +1,58 @@
+"""
+PAFFMMO - Export des fiches personnage PDF
+==========================================
+Actions d'admin de génération des fiches (voir rpgAtlas.charactersheet) :
+un PDF par héros (archive ZIP si plusieurs) ou un seul PDF fusionné.
+"""
+from django.http import FileResponse, HttpResponse
+
+from .. import charactersheet
+
+
+# Nombre maximal de fiches générées en une fois
+CHARACTER_SHEET_MAX_BATCH = 1000
+
+
+def get_sheet_heroes(modeladmin, request, queryset):
+    """Héros sélectionnés (région et compétences préchargées), None si le lot est trop grand."""
+    if queryset.count() > CHARACTER_SHEET_MAX_BATCH:
+        modeladmin.message_user(
+            request, f'Selectionnez au plus {CHARACTER_SHEET_MAX_BATCH} heros.', level='error'
+        )
+        return None
+    return list(queryset.select_related('region').prefetch_related('skills').order_by('nickname'))
+
+
+def generate_character_sheet(modeladmin, request, queryset):
+    """Fiche PDF d'un héros, ou archive ZIP des fiches de plusieurs héros."""
+    heroes = get_sheet_heroes(modeladmin, request, queryset)
+    if not heroes:
+        return
+
+    sheets = charactersheet.render_sheets(heroes)
+    if len(sheets) == 1:
+        data, pdf = sheets[0]
+        response = HttpResponse(pdf, content_type='application/pdf')
+        response['Content-Disposition'] = f'attachment; filename={charactersheet.sheet_filename(data)}'
+        return response
+
+    return FileResponse(
+        charactersheet.build_zip(sheets),
+        as_attachment=True,
+        filename='fiches_personnages.zip',
+        content_type='application/zip',
+    )
+
+
+def generate_character_sheets_pdf(modeladmin, request, queryset):
+    """Fiches des héros sélectionnés, réunies dans un seul PDF."""
+    heroes = get_sheet_heroes(modeladmin, request, queryset)
+    if not heroes:
+        return
+
+    return FileResponse(
+        charactersheet.merge_sheets(charactersheet.render_sheets(heroes)),
+        as_attachment=True,
+        filename='fiches_personnages.pdf',
+        content_type='application/pdf',
+    )
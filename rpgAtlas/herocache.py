@@ -0,0 +1,195 @@
+"""
+PAFFMMO - Cache des fiches de héros
+===================================
+Cache LRU borné, propre à chaque processus, des fiches de héros rendues
+par HeroSerializer (détail de l'API, popup showHero du frontend). Une
+entrée vaut pour le updated_at du héros et la version 'heroes' (régions,
+compétences) lus à sa création : un détail souvent demandé est servi sans
+accès à la base, validateurs des requêtes conditionnelles compris.
+
+Invalidation :
+- dans le processus qui écrit, par les signaux (héros sauvegardé ou
+  supprimé, compétences d'un héros, régions et compétences modifiées) et
+  par les ticks de combat ;
+- dans tous les processus, au plus toutes les HERO_DETAIL_CACHE_REVALIDATE
+  secondes, sur la base principale : les entrées d'une version 'heroes'
+  dépassée sont retirées ; si 'hero_rows' a changé, ou pour les entrées
+  jamais vérifiées (lues sur un réplica), les updated_at sont comparés.
+
+Les compteurs (succès, échecs, évictions, invalidations) de chaque
+processus sont journalisés au plus toutes les
+HERO_DETAIL_CACHE_LOG_INTERVAL secondes, lors d'une revalidation.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from .models import DataVersion, Hero
+
+
+logger = logging.getLogger(__name__)
+
+class DetailEntry:
+    """Fiche rendue d'un héros et validateurs lus à sa création."""
+
+    __slots__ = ('updated_at', 'versions', 'payload', 'verified')
+
+    def __init__(self, updated_at, versions, payload):
+        self.updated_at = updated_at
+        # (versions, date de modification) de get_versions('heroes')
+        self.versions = versions
+        self.payload = payload
+        self.verified = False
+
+    @property
+    def heroes_version(self):
+        return self.versions[0]['heroes']
+
+
+class HeroDetailCache:
+    """LRU thread-safe {id du héros: DetailEntry} avec compteurs."""
+
+    def __init__(self, maxsize, revalidate_interval, log_interval=0):
+        self.maxsize = maxsize
+        self.revalidate_interval = revalidate_interval
+        self.log_interval = log_interval
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._rows_version = None
+        self._checked = float('-inf')
+        self._logged = time.monotonic()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def get(self, pk):
+        with self._lock:
+            entry = self._entries.get(pk)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(pk)
+            self.hits += 1
+            return entry
+
+    def set(self, pk, entry):
+        with self._lock:
+            self._entries[pk] = entry
+            self._entries.move_to_end(pk)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, *pks):
+        with self._lock:
+            for pk in pks:
+                if self._entries.pop(pk, None) is not None:
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def revalidation_due(self):
+        return time.monotonic() - self._checked >= self.revalidate_interval
+
+    def revalidate(self):
+        """Confronte les entrées aux versions et aux updated_at de la base principale."""
+        self._checked = time.monotonic()
+        versions = dict(
+            DataVersion.objects.using(DEFAULT_DB_ALIAS)
+            .filter(name__in=('heroes', 'hero_rows')).values_list('name', 'version')
+        )
+        heroes, rows = versions.get('heroes', 0), versions.get('hero_rows', 0)
+        with self._lock:
+            for pk in [pk for pk, entry in self._entries.items() if entry.heroes_version < heroes]:
+                del self._entries[pk]
+                self.invalidations += 1
+            rows_changed = rows != self._rows_version
+            pending = [pk for pk, entry in self._entries.items() if rows_changed or not entry.verified]
+        if pending:
+            current = dict(
+                Hero.objects.using(DEFAULT_DB_ALIAS).filter(pk__in=pending).values_list('pk', 'updated_at')
+            )
+            with self._lock:
+                for pk in pending:
+                    entry = self._entries.get(pk)
+                    if entry is None:
+                        continue
+                    if current.get(pk) != entry.updated_at:
+                        del self._entries[pk]
+                        self.invalidations += 1
+                    else:
+                        entry.verified = True
+        self._rows_version = rows
+        if self.log_interval and self._checked - self._logged >= self.log_interval:
+            self._logged = self._checked
+            self.log_stats()
+
+    def log_stats(self):
+        """Journalise les compteurs du cache de ce processus."""
+        stats = self.stats()
+        lookups = stats['hits'] + stats['misses']
+        logger.info(
+            'Cache des fiches (processus %d) : %d succès, %d échecs (%.0f %% de succès), '
+            '%d évictions, %d invalidations, %d/%d fiches',
+            os.getpid(), stats['hits'], stats['misses'], 100 * stats['hits'] / lookups if lookups else 0,
+            stats['evictions'], stats['invalidations'], stats['size'], stats['maxsize'],
+        )
+
+    def stats(self):
+        with self._lock:
+            size = len(self._entries)
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'size': size,
+            'maxsize': self.maxsize,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_detail_cache():
+    """Cache des fiches du processus, ou None s'il est désactivé (taille 0)."""
+    global _cache
+    size = getattr(settings, 'HERO_DETAIL_CACHE_SIZE', 0)
+    if size <= 0:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = HeroDetailCache(
+                    size,
+                    getattr(settings, 'HERO_DETAIL_CACHE_REVALIDATE', 1.0),
+                    getattr(settings, 'HERO_DETAIL_CACHE_LOG_INTERVAL', 0),
+                )
+    return _cache
+
+
+def invalidate(*pks):
+    """Retire les fiches des héros donnés (signaux, ticks de combat)."""
+    cache = get_detail_cache()
+    if cache is not None:
+        cache.invalidate(*pks)
+
+
+def clear():
+    """Vide le cache des fiches (régions ou compétences modifiées)."""
+    cache = get_detail_cache()
+    if cache is not None:
+        cache.clear()
+
+
+def get_stats():
+    """Compteurs du cache des fiches du processus, None s'il est désactivé."""
+    cache = get_detail_cache()
+    return cache.stats() if cache is not None else None
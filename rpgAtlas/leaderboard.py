@@ -0,0 +1,117 @@
+"""
+PAFFMMO - Classements
+=====================
+Classements des héros (global, par classe, par région) triés par niveau
+puis expérience, sans balayage de la table des héros :
+
+- le nombre de héros par niveau est lu dans HeroStatsRollup, déjà
+  maintenu incrémentalement par les signaux (montées de niveau comprises) ;
+- à l'intérieur d'un niveau, le rang se lit par recherche dans les index
+  composites (level, xp, id) de Hero, préfixés par la classe ou la région.
+
+Le rang d'un héros vaut 1 + le nombre de héros strictement devant lui
+(niveau supérieur, ou même niveau et plus d'expérience) : deux héros à
+égalité partagent le même rang. Les pages suivent l'ordre ORDERING.
+"""
+from django.db.models import Count, Q, Sum
+
+from .models import Hero
+from .rollup import filter_rollups
+
+
+# Ordre du classement, couvert par les index de Hero.Meta.indexes
+ORDERING = ('-level', '-xp', 'id')
+
+
+def scope_filters(job_class=None, region_id=None):
+    """Filtres de la portée du classement (global si aucun)."""
+    filters = {}
+    if job_class:
+        filters['job_class'] = job_class
+    if region_id:
+        filters['region_id'] = region_id
+    return filters
+
+
+def level_counts(**scope):
+    """Nombre de héros par niveau, du plus haut au plus bas (agrégats)."""
+    return list(
+        filter_rollups(**scope)
+        .values('level')
+        .annotate(count=Sum('hero_count'))
+        .order_by('-level')
+        .values_list('level', 'count')
+    )
+
+
+def get_ranks(hero, scopes):
+    """
+    Rangs du héros dans plusieurs portées ({nom: filtres}) en deux
+    requêtes : sommes des agrégats des niveaux supérieurs, puis héros du
+    même niveau ayant plus d'expérience (recherche dans l'index).
+
+    Retourne {nom: {'rank': ..., 'total': ...}}.
+    """
+    rollups = {}
+    ahead = {}
+    for name, filters in scopes.items():
+        rollups[f'{name}_total'] = Sum('hero_count', filter=Q(**filters) if filters else None)
+        rollups[f'{name}_above'] = Sum('hero_count', filter=Q(level__gt=hero.level, **filters))
+        ahead[name] = Count('id', filter=Q(**filters) if filters else None)
+
+    totals = filter_rollups().aggregate(**rollups)
+    same_level = Hero.objects.filter(level=hero.level, xp__gt=hero.xp).aggregate(**ahead)
+    return {
+        name: {
+            'rank': (totals[f'{name}_above'] or 0) + same_level[name] + 1,
+            'total': totals[f'{name}_total'] or 0,
+        }
+        for name in scopes
+    }
+
+
+def get_page(queryset, start, size, **scope):
+    """
+    Héros classés aux positions [start, start + size[ (à partir de 1) de
+    la portée, lus depuis `queryset` (instances ou lignes values()).
+
+    Le niveau de la position `start` est trouvé dans les agrégats ; seul
+    le décalage à l'intérieur de ce niveau est parcouru dans l'index.
+    Retourne (nombre total de héros classés, [(rang, position, héros)]).
+    """
+    counts = level_counts(**scope)
+    total = sum(count for level, count in counts)
+    above = 0
+    for level, count in counts:
+        if above + count >= start:
+            break
+        above += count
+    else:
+        return total, []
+
+    offset = start - 1 - above
+    heroes = list(
+        queryset.filter(level__lte=level, **scope).order_by(*ORDERING)[offset:offset + size]
+    )
+    if not heroes:
+        return total, []
+
+    # Rang du premier héros : égalités éventuelles avec la page précédente
+    first = heroes[0]
+    first_level, first_xp = _value(first, 'level'), _value(first, 'xp')
+    above = sum(count for level, count in counts if level > first_level)
+    rank = above + Hero.objects.filter(level=first_level, xp__gt=first_xp, **scope).count() + 1
+
+    results = []
+    previous = (first_level, first_xp)
+    for position, hero in enumerate(heroes, start=start):
+        key = (_value(hero, 'level'), _value(hero, 'xp'))
+        if key != previous:
+            rank = position
+            previous = key
+        results.append((rank, position, hero))
+    return total, results
+
+
+def _value(hero, field):
+    return hero[field] if isinstance(hero, dict) else getattr(hero, field)
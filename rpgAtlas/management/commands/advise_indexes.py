@@ -0,0 +1,340 @@
+"""
+PAFFMMO - Conseil d'index
+=========================
+Rejoue les formes de requêtes de héros les plus fréquentes (relevées par
+rpgAtlas.queryshapes) avec leurs paramètres d'exemple, affiche leur plan
+d'exécution (EXPLAIN, base configurée) et propose les index composites
+(colonnes d'égalité, puis tri et plages) ou partiels (is_active constant)
+qui éviteraient un parcours complet, un tri temporaire ou le filtrage
+ligne à ligne d'un index ne couvrant qu'une partie des colonnes d'égalité
+et de tri de la forme.
+
+Le projet n'ayant pas de migrations, les index proposés sont donnés sous
+forme d'entrées de Hero.Meta.indexes (et de DDL avec --sql) ; --apply les
+crée directement dans la base pour en mesurer l'effet.
+"""
+import hashlib
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, models
+from django.db.models import Q
+from django.test import RequestFactory
+from rest_framework.request import Request
+
+from rpgAtlas.models import Hero, QueryShape
+from rpgAtlas.queryshapes import ACTION_ORDERING
+
+
+# Signes d'un plan coûteux sur la table des héros, par moteur
+PLAN_PROBLEMS = {
+    'sqlite': [
+        (r'\bSCAN {table}(?: AS \w+)?\s*$', 'parcours complet de la table'),
+        (r'USE TEMP B-TREE FOR (?:RIGHT PART OF )?ORDER BY', 'tri temporaire'),
+    ],
+    'postgresql': [
+        (r'Seq Scan on "?{table}"?', 'parcours complet de la table'),
+        (r'^\s*(?:->\s*)?(?:Incremental )?Sort\b', 'tri'),
+    ],
+    'mysql': [
+        (r'\btype\W+ALL\b', 'parcours complet de la table'),
+        (r'Using filesort', 'tri'),
+    ],
+}
+
+# Index de la table des héros retenus par le plan, par moteur
+PLAN_INDEXES = {
+    'sqlite': r'\b(?:SEARCH|SCAN) {table}(?: AS \w+)? USING (?:COVERING )?INDEX (\w+)',
+    'postgresql': r'(?:Index (?:Only )?Scan(?: Backward)? using (\w+) on "?{table}"?|Bitmap Index Scan on (\w+))',
+}
+
+
+def index_name(fields, condition):
+    """Nom d'index stable, de 30 caractères au plus (limite Oracle)."""
+    digest = hashlib.sha1(repr((fields, str(condition))).encode('utf-8')).hexdigest()[:8]
+    suffix = 'pidx' if condition else 'idx'
+    return f"hero_{fields[0].lstrip('-')[:10]}_{digest}_{suffix}"
+
+
+def propose_index(shape, supports_partial):
+    """
+    Index servant la forme : colonnes d'égalité, puis clés de tri (parcours
+    ordonné, sans tri) et colonnes de plage (filtrées dans l'index). Un
+    is_active constant devient la condition d'un index partiel si le
+    moteur le permet. None pour un tri par pertinence (recherche).
+    """
+    if shape['search'] and '-search_rank' in shape['ordering']:
+        return None
+    fields, condition = [], None
+    for column in shape['equality']:
+        name, _, value = column.partition('=')
+        if value and supports_partial:
+            condition = Q(**{name: value == 'True'})
+        else:
+            fields.append(name)
+    for column in [*shape['ordering'], *shape['range']]:
+        if column.lstrip('-') not in {field.lstrip('-') for field in fields}:
+            fields.append(column)
+    if not fields:
+        return None
+    return models.Index(fields=fields, condition=condition, name=index_name(fields, condition))
+
+
+def existing_indexes():
+    """(champs, condition) des index déclarés sur Hero, index de champ compris."""
+    indexes = {(tuple(index.fields), str(index.condition)) for index in Hero._meta.indexes}
+    for field in Hero._meta.fields:
+        if field.db_index or field.unique or field.is_relation:
+            indexes.add(((field.name,), 'None'))
+    return indexes
+
+
+def is_covered(index, indexes):
+    """Un index existant (même condition) commence par les champs proposés."""
+    fields = tuple(index.fields)
+    return any(
+        existing[:len(fields)] == fields and condition == str(index.condition)
+        for existing, condition in indexes
+    )
+
+
+def column(name):
+    """Colonne en base d'un champ de Hero (préfixe de tri ôté)."""
+    return Hero._meta.get_field(name.lstrip('-')).column
+
+
+def condition_columns(index):
+    """Colonnes fixées par la condition d'un index partiel."""
+    if index is None or index.condition is None:
+        return set()
+    return {column(name) for name, _ in index.condition.children}
+
+
+def uncovered_columns(shape, index_columns, fixed=()):
+    """
+    Colonnes d'égalité et de tri de la forme que l'index ne sert pas
+    (filtrées ligne à ligne ou triées à part) : ses premières colonnes
+    doivent être les égalités, dans un ordre quelconque, suivies des clés
+    de tri. fixed : colonnes fixées par la condition d'un index partiel.
+    """
+    equality = {column(name.partition('=')[0]) for name in shape['equality']} - set(fixed)
+    ordering = [column(name) for name in shape['ordering']]
+    ordering = [name for name in ordering if name not in equality and name not in fixed]
+    position = 0
+    while position < len(index_columns) and index_columns[position] in equality:
+        position += 1
+    served = set(index_columns[:position])
+    sorted_by = 0
+    for name in index_columns[position:]:
+        if sorted_by == len(ordering) or name != ordering[sorted_by]:
+            break
+        sorted_by += 1
+    return sorted(equality - served) + ordering[sorted_by:]
+
+
+def index_source(index):
+    """Entrée de Hero.Meta.indexes pour l'index."""
+    condition = f', condition=Q({index.condition.children[0][0]}={index.condition.children[0][1]})' \
+        if index.condition else ''
+    return f"models.Index(fields={index.fields!r}, name='{index.name}'{condition}),"
+
+
+class Command(BaseCommand):
+    """Commande Django de conseil d'index pour les listes de héros."""
+
+    help = 'Analyse (EXPLAIN) les formes de requêtes de héros fréquentes et propose des index'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=10,
+            help='Nombre de formes analysées (défaut: 10)'
+        )
+        parser.add_argument(
+            '--sort',
+            choices=['count', 'time'],
+            default='count',
+            help='Formes les plus fréquentes ou les plus coûteuses en durée cumulée (défaut: count)'
+        )
+        parser.add_argument(
+            '--min-count',
+            type=int,
+            default=1,
+            help='Nombre minimal de requêtes pour analyser une forme (défaut: 1)'
+        )
+        parser.add_argument(
+            '--database',
+            default=DEFAULT_DB_ALIAS,
+            help='Base sur laquelle exécuter EXPLAIN (défaut: default)'
+        )
+        parser.add_argument(
+            '--page-size',
+            type=int,
+            default=20,
+            help='Nombre de lignes lues par la requête rejouée (défaut: 20)'
+        )
+        parser.add_argument(
+            '--sql',
+            action='store_true',
+            help='Affiche aussi le DDL des index proposés'
+        )
+        parser.add_argument(
+            '--apply',
+            action='store_true',
+            help='Crée les index proposés dans la base, puis rejoue les plans'
+        )
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Efface les formes relevées et quitte'
+        )
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            deleted, _ = QueryShape.objects.all().delete()
+            self.stdout.write(self.style.SUCCESS(f'{deleted} formes effacées'))
+            return
+
+        self.connection = connections[options['database']]
+        self.explain = self.connection.features.supports_explaining_query_execution
+        self.page_size = options['page_size']
+        self.index_columns = None
+        order = '-count' if options['sort'] == 'count' else '-total_time'
+        shapes = list(
+            QueryShape.objects.using(options['database'])
+            .filter(count__gte=options['min_count']).order_by(order)[:options['limit']]
+        )
+        if not shapes:
+            raise CommandError("Aucune forme relevée : activez QUERY_SHAPES_ENABLED et servez des listes de héros.")
+        if not self.explain:
+            self.stdout.write(self.style.WARNING(
+                f'EXPLAIN non disponible sur {self.connection.vendor} : propositions sans plan.\n'
+            ))
+
+        supports_partial = self.connection.features.supports_partial_indexes
+        indexes = existing_indexes()
+        proposals = {}
+        for rank, stat in enumerate(shapes, start=1):
+            self.stdout.write(self.style.MIGRATE_HEADING(f'#{rank} {stat.key}'))
+            self.stdout.write(
+                f'    {stat.count} requêtes, moy. {stat.avg_time * 1000:.1f} ms, '
+                f'max {stat.max_time * 1000:.1f} ms, exemple {stat.sample}'
+            )
+            index = propose_index(stat.shape, supports_partial)
+            problems = self.show_plan(stat, index)
+            if index is None:
+                self.stdout.write('    Tri par pertinence : pas d\'index proposé (index plein texte)')
+            elif self.explain and not problems:
+                self.stdout.write(self.style.SUCCESS('    Plan correct'))
+            elif is_covered(index, indexes):
+                self.stdout.write(f'    Index existant non retenu par le planificateur : {index.fields}')
+            else:
+                self.stdout.write(self.style.WARNING(f'    Index proposé : {index_source(index)}'))
+                key = (tuple(index.fields), str(index.condition))
+                proposals.setdefault(key, (index, []))[1].append(stat)
+            self.stdout.write('')
+
+        if not proposals:
+            self.stdout.write(self.style.SUCCESS('Aucun index à ajouter.'))
+            return
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Index à ajouter à Hero.Meta.indexes :'))
+        for index, _ in proposals.values():
+            self.stdout.write(f'    {index_source(index)}')
+        if options['sql']:
+            with self.connection.schema_editor(collect_sql=True) as editor:
+                for index, _ in proposals.values():
+                    editor.add_index(Hero, index)
+            self.stdout.write(self.style.MIGRATE_HEADING('\nDDL :'))
+            for statement in editor.collected_sql:
+                self.stdout.write(f'    {statement}')
+        if options['apply']:
+            self.apply(proposals.values())
+
+    def apply(self, proposals):
+        """Crée les index proposés, puis rejoue les plans des formes concernées."""
+        with self.connection.schema_editor() as editor:
+            for index, _ in proposals:
+                editor.add_index(Hero, index)
+        self.index_columns = None
+        self.stdout.write(self.style.SUCCESS(
+            f'\n{len(proposals)} index créés ; reportez-les dans Hero.Meta.indexes.\n'
+        ))
+        for index, stats in proposals:
+            for stat in stats:
+                self.stdout.write(self.style.MIGRATE_HEADING(f'{stat.key} (après création)'))
+                self.show_plan(stat, index)
+
+    def show_plan(self, stat, index=None):
+        """
+        Affiche le plan de la requête rejouée ; retourne les problèmes
+        détectés, dont la couverture partielle de la forme par l'index
+        retenu (comparée à l'index proposé index).
+        """
+        if not self.explain:
+            return []
+        try:
+            plan = self.replay_queryset(stat).explain()
+        except Exception as exc:
+            self.stdout.write(self.style.ERROR(f'    Requête non rejouée : {exc}'))
+            return []
+        table = re.escape(Hero._meta.db_table)
+        patterns = [
+            (re.compile(pattern.format(table=table), re.MULTILINE), label)
+            for pattern, label in PLAN_PROBLEMS.get(self.connection.vendor, [])
+        ]
+        for line in plan.splitlines():
+            self.stdout.write(f'    | {line}')
+        problems = [label for pattern, label in patterns if pattern.search(plan)]
+        if index is not None:
+            problems += self.coverage_problems(stat.shape, plan, index)
+        if problems:
+            self.stdout.write(self.style.WARNING(f"    -> {', '.join(problems)}"))
+        return problems
+
+    def coverage_problems(self, shape, plan, proposed):
+        """Index retenus par le plan ne servant qu'une partie des égalités et du tri."""
+        pattern = PLAN_INDEXES.get(self.connection.vendor)
+        if pattern is None:
+            return []
+        pattern = re.compile(pattern.format(table=re.escape(Hero._meta.db_table)))
+        used = [name for match in pattern.finditer(plan) for name in match.groups() if name]
+        declared = {index.name: index for index in [*Hero._meta.indexes, proposed]}
+        columns = self.get_index_columns()
+        partial = []
+        for name in used:
+            if name not in columns:
+                continue
+            missing = uncovered_columns(shape, columns[name], condition_columns(declared.get(name)))
+            if not missing:
+                return []
+            partial.append(f"index {name} sans {', '.join(missing)}")
+        return partial
+
+    def get_index_columns(self):
+        """Colonnes des index de la table des héros, par nom (lues une fois)."""
+        if self.index_columns is None:
+            with self.connection.cursor() as cursor:
+                constraints = self.connection.introspection.get_constraints(cursor, Hero._meta.db_table)
+            self.index_columns = {
+                name: constraint['columns'] for name, constraint in constraints.items()
+                if constraint['index'] or constraint['unique'] or constraint['primary_key']
+            }
+        return self.index_columns
+
+    def replay_queryset(self, stat):
+        """Queryset construit par HeroViewSet pour l'action et les paramètres d'exemple."""
+        from rpgAtlas.views import HeroViewSet
+
+        action = stat.shape['action']
+        request = Request(RequestFactory().get('/api/heroes/', stat.sample))
+        view = HeroViewSet(action=action, request=request, format_kwarg=None, args=(), kwargs={})
+        queryset = view.get_queryset()
+        if action == 'list':
+            queryset = view.filter_queryset(queryset)
+        if action == 'by_class':
+            queryset = queryset.filter(job_class=stat.sample.get('class'))
+        if action in ACTION_ORDERING:
+            queryset = queryset.order_by(*ACTION_ORDERING[action])
+        return queryset.using(self.connection.alias)[:self.page_size]
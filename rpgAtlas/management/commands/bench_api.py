@@ -0,0 +1,302 @@
+"""
+PAFFMMO - Benchmark de l'API
+============================
+Mesure en processus le coût des endpoints de l'API (latence p50/p95/p99,
+requêtes SQL, octets rendus) via le client de test Django, sur une base
+de test peuplée par generate_data, et écrit les résultats en JSON pour
+pouvoir comparer deux commits.
+
+Avec --concurrency, les requêtes passent par le handler ASGI (AsyncClient)
+avec N requêtes simultanées et le débit est mesuré ; comparer
+API_ASYNC_VIEWS=true (vues asynchrones) et false (vues synchrones).
+
+Le cache des réponses et le cache des fiches de héros sont désactivés
+pendant la mesure (sinon chaque requête après la chauffe serait un succès
+de cache) ; --cached les garde, vidés au départ, pour mesurer les succès.
+"""
+import asyncio
+import io
+import json
+import platform
+import subprocess
+import time
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from typing import Dict, List
+
+import django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.conf import settings
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from rpgAtlas import herocache
+from rpgAtlas.responsecache import get_response_cache
+from rpgAtlas.models import Hero, Region
+from rpgAtlas.querybudget import QueryRecorder
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Percentile par rang le plus proche d'une liste non vide."""
+    ordered = sorted(values)
+    rank = max(int(round(pct / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+class Command(BaseCommand):
+    """Commande Django de benchmark des endpoints de l'API."""
+
+    help = "Mesure la latence, les requêtes SQL et la taille des réponses de l'API"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--heroes',
+            type=int,
+            default=1000,
+            help='Nombre de héros générés dans la base de test (défaut: 1000)'
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=50,
+            help='Nombre de requêtes mesurées par scénario (défaut: 50)'
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=5,
+            help='Requêtes de chauffe non mesurées par scénario (défaut: 5)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Graine du jeu de données (défaut: 42)'
+        )
+        parser.add_argument(
+            '--output',
+            default=None,
+            help='Fichier JSON de résultats'
+        )
+        parser.add_argument(
+            '--use-current-db',
+            action='store_true',
+            help='Mesure sur la base configurée, sans base de test ni génération'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=None,
+            help='Requêtes simultanées via le handler ASGI (débit sous charge)'
+        )
+        parser.add_argument(
+            '--only',
+            nargs='*',
+            default=None,
+            help='Noms des scénarios à exécuter (défaut: tous)'
+        )
+        parser.add_argument(
+            '--cached',
+            action='store_true',
+            help='Garde le cache des réponses et le cache des fiches (défaut: désactivés)'
+        )
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError("--iterations doit être supérieur à 0")
+        if options['concurrency'] is not None and options['concurrency'] < 1:
+            raise CommandError("--concurrency doit être supérieur à 0")
+
+        setup_test_environment()
+        old_name = None
+        # Sans caches, chaque requête mesurée exécute l'endpoint
+        caching = nullcontext() if options['cached'] else override_settings(
+            API_RESPONSE_CACHE=None, HERO_DETAIL_CACHE_SIZE=0
+        )
+        try:
+            if not options['use_current_db']:
+                old_name = connection.settings_dict['NAME']
+                connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+                call_command(
+                    'generate_data',
+                    heroes=options['heroes'],
+                    bulk=True,
+                    seed=options['seed'],
+                    stdout=io.StringIO(),
+                )
+
+            if not Hero.objects.exists():
+                raise CommandError('Aucun héros en base : rien à mesurer')
+
+            scenarios = self._get_scenarios()
+            if options['only']:
+                scenarios = {name: urls for name, urls in scenarios.items() if name in options['only']}
+
+            with caching:
+                if options['cached']:
+                    self._clear_caches(options['use_current_db'])
+                if options['concurrency']:
+                    results = asyncio.run(self._run_concurrent(
+                        scenarios, options['iterations'], options['warmup'], options['concurrency']
+                    ))
+                else:
+                    results = self._run(scenarios, options['iterations'], options['warmup'])
+                detail_cache_stats = herocache.get_stats()
+        finally:
+            if old_name is not None:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        report = {
+            'meta': {
+                'date': datetime.now(timezone.utc).isoformat(),
+                'commit': self._git_commit(),
+                'heroes': options['heroes'] if not options['use_current_db'] else None,
+                'iterations': options['iterations'],
+                'concurrency': options['concurrency'],
+                'cached': options['cached'],
+                'async_views': settings.API_ASYNC_VIEWS,
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+            },
+            'results': results,
+            'hero_detail_cache': detail_cache_stats,
+        }
+        self._print(results)
+        if report['hero_detail_cache']:
+            stats = report['hero_detail_cache']
+            self.stdout.write(
+                f"\nCache des fiches : {stats['hits']} succès, {stats['misses']} échecs, "
+                f"{stats['evictions']} évictions, {stats['invalidations']} invalidations"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as handle:
+                json.dump(report, handle, indent=2, ensure_ascii=False)
+            self.stdout.write(self.style.SUCCESS(f"Résultats écrits dans {options['output']}"))
+
+    def _clear_caches(self, current_db: bool):
+        """Vide les caches avant une mesure avec --cached."""
+        herocache.clear()
+        response_cache = get_response_cache()
+        # Les clés (versions DataVersion) d'une autre base de test seraient
+        # reprises à tort ; le cache d'une base réelle reste valide
+        if response_cache is not None and not current_db:
+            response_cache.clear()
+
+    def _get_scenarios(self) -> Dict[str, List[str]]:
+        """Scénarios : nom -> URLs parcourues à tour de rôle."""
+        hero_ids = list(Hero.objects.order_by('?').values_list('pk', flat=True)[:20])
+        region = Region.objects.order_by('pk').first()
+        job_class = Hero.JobClass.MAGE.value
+        return {
+            'list': ['/api/heroes/'],
+            'list_page_deep': ['/api/heroes/?page=50'],
+            'list_cursor': ['/api/heroes/?pagination=cursor&page_size=100'],
+            'list_filters': [f'/api/heroes/?job_class={job_class}&is_active=true&min_level=20&max_level=60'],
+            'list_region': [f'/api/heroes/?region={region.pk}' if region else '/api/heroes/'],
+            'list_search': ['/api/heroes/?search=dragon', '/api/heroes/?search=moines'],
+            'list_ordering': ['/api/heroes/?ordering=-level', '/api/heroes/?ordering=hp_percentage'],
+            'retrieve': [f'/api/heroes/{pk}/' for pk in hero_ids],
+            'by_class': [f'/api/heroes/by_class/?class={job_class}'],
+            'stats': ['/api/heroes/stats/'],
+            'stats_filtered': [f'/api/heroes/stats/?job_class={job_class}&min_level=20'],
+            'top': ['/api/heroes/top/?limit=100'],
+            'regions': ['/api/regions/'],
+            'skills': ['/api/skills/'],
+        }
+
+    def _run(self, scenarios: Dict[str, List[str]], iterations: int, warmup: int) -> Dict:
+        client = Client()
+        results = {}
+        for name, urls in scenarios.items():
+            for i in range(warmup):
+                client.get(urls[i % len(urls)])
+
+            latencies, queries, sizes = [], [], []
+            for i in range(iterations):
+                url = urls[i % len(urls)]
+                with QueryRecorder() as recorder:
+                    start = time.perf_counter()
+                    response = client.get(url)
+                    content = b''.join(response) if response.streaming else response.content
+                    latencies.append((time.perf_counter() - start) * 1000)
+                if response.status_code != 200:
+                    raise CommandError(f'{name}: {url} a répondu {response.status_code}')
+                queries.append(recorder.count)
+                sizes.append(len(content))
+
+            results[name] = {
+                'urls': urls,
+                'p50_ms': round(percentile(latencies, 50), 3),
+                'p95_ms': round(percentile(latencies, 95), 3),
+                'p99_ms': round(percentile(latencies, 99), 3),
+                'mean_ms': round(sum(latencies) / len(latencies), 3),
+                'queries': max(queries),
+                'bytes': round(sum(sizes) / len(sizes)),
+            }
+        return results
+
+    async def _run_concurrent(self, scenarios: Dict[str, List[str]], iterations: int,
+                              warmup: int, concurrency: int) -> Dict:
+        """Scénarios joués par le handler ASGI avec `concurrency` requêtes en vol."""
+        client = AsyncClient()
+        results = {}
+        for name, urls in scenarios.items():
+            for i in range(warmup):
+                await client.get(urls[i % len(urls)])
+
+            semaphore = asyncio.Semaphore(concurrency)
+            latencies, sizes = [], []
+
+            async def fetch(url):
+                async with semaphore:
+                    start = time.perf_counter()
+                    response = await client.get(url)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                if response.status_code != 200:
+                    raise CommandError(f'{name}: {url} a répondu {response.status_code}')
+                sizes.append(len(response.content))
+
+            start = time.perf_counter()
+            await asyncio.gather(*(fetch(urls[i % len(urls)]) for i in range(iterations)))
+            elapsed = time.perf_counter() - start
+
+            results[name] = {
+                'urls': urls,
+                'p50_ms': round(percentile(latencies, 50), 3),
+                'p95_ms': round(percentile(latencies, 95), 3),
+                'p99_ms': round(percentile(latencies, 99), 3),
+                'mean_ms': round(sum(latencies) / len(latencies), 3),
+                'queries': None,
+                'bytes': round(sum(sizes) / len(sizes)),
+                'throughput_rps': round(iterations / elapsed, 1),
+            }
+        return results
+
+    def _print(self, results: Dict):
+        self.stdout.write('')
+        self.stdout.write(
+            f"{'Scénario':<16} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'SQL':>5} {'octets':>9} {'req/s':>8}"
+        )
+        self.stdout.write('-' * 71)
+        for name, result in results.items():
+            queries = result['queries'] if result['queries'] is not None else '-'
+            throughput = result.get('throughput_rps') or '-'
+            self.stdout.write(
+                f"{name:<16} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} "
+                f"{result['p99_ms']:>9.2f} {queries:>5} {result['bytes']:>9} {throughput:>8}"
+            )
+
+    def _git_commit(self):
+        """Commit courant, si le projet est un dépôt git."""
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', 'HEAD'],
+                capture_output=True, text=True, check=True, timeout=5,
+            ).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return None
@@ -2,15 +2,21 @@
 PAFFMMO - Script de génération de données
 ==========================================
 Génère des héros, régions et compétences aléatoires via Faker.
+Le mode --bulk insère par lots (bulk_create) pour des millions de héros.
 Compatibilité Django 6.0+
 """
+import itertools
+import json
+import multiprocessing
+import os
 import random
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
 from faker import Faker
 
+from rpgAtlas import conditional, rollup
 from rpgAtlas.models import Hero, Region, Skill
 
 
@@ -108,6 +114,95 @@ BIO_DEEDS: List[str] = [
 ]
 
 
+# Limite du mode classique (une requête par héros)
+MAX_HEROES = 10000
+
+# Taille de lot par défaut du mode --bulk
+DEFAULT_BATCH_SIZE = 5000
+
+
+def generate_nickname(rng=random) -> str:
+    """Génère un pseudonyme (non garanti unique)."""
+    patterns = [
+        lambda: f"{fake.first_name()}{rng.choice(['_', ''])}{rng.randint(1, 999)}",
+        lambda: f"{fake.last_name()}{rng.choice(['X', 'Z', 'V', ''])}{rng.randint(1, 99)}",
+        lambda: f"{fake.user_name()}{rng.randint(1, 999)}",
+        lambda: f"{rng.choice(['Dark', 'Shadow', 'Light', 'Fire', 'Ice', 'Storm'])}{fake.first_name()}",
+        lambda: f"{fake.first_name()}The{rng.choice(['Great', 'Brave', 'Wise', 'Swift'])}",
+    ]
+    return rng.choice(patterns)()
+
+
+def nickname_candidates(nickname: str, index: int):
+    """
+    Pseudonymes essayés pour le héros d'index global `index` : le sien,
+    puis suffixé par l'index, puis par _2, _3...
+    """
+    yield nickname
+    base = f'{nickname}_{index}'
+    yield base
+    for attempt in itertools.count(2):
+        yield f'{base}_{attempt}'
+
+
+def generate_level(rng=random) -> int:
+    """Génère un niveau avec distribution réaliste (plus de bas niveaux)."""
+    roll = rng.random()
+    if roll < 0.5:
+        return rng.randint(1, 20)
+    elif roll < 0.8:
+        return rng.randint(21, 50)
+    elif roll < 0.95:
+        return rng.randint(51, 70)
+    else:
+        return rng.randint(71, 99)
+
+
+def generate_biography(nickname: str, region_names: List[str], rng=random) -> str:
+    """Génère une biographie aléatoire."""
+    origin = rng.choice(region_names) if region_names else "terres lointaines"
+    template = rng.choice(BIO_TEMPLATES)
+    biography = template.format(nickname=nickname, origin=origin)
+
+    # Ajout d'un exploit héroïque
+    hook = rng.choice(BIO_HOOKS)
+    deed = rng.choice(BIO_DEEDS)
+    biography += f" {hook} {deed}."
+
+    return biography
+
+
+def generate_hero_batch(task: Tuple) -> List[Dict]:
+    """
+    Génère les données d'un lot de héros sans accès à la base.
+
+    Le lot est entièrement déterminé par (graine, index du lot), ce qui
+    rend la génération reproductible et parallélisable entre processus.
+    """
+    seed, batch_index, size, region_ids, region_names, skill_ids = task
+    rng = random.Random(f'{seed}:{batch_index}')
+    fake.seed_instance(rng.getrandbits(64))
+
+    heroes = []
+    for _ in range(size):
+        nickname = generate_nickname(rng)
+        level = generate_level(rng)
+        max_hp = level * 100
+        heroes.append({
+            'nickname': nickname,
+            'job_class': rng.choice(JOB_CLASSES),
+            'level': level,
+            'hp_current': rng.randint(int(max_hp * 0.3), max_hp),
+            'xp': level * rng.randint(100, 500),
+            'gold': rng.randint(0, level * 100),
+            'is_active': rng.random() > 0.15,  # 85% actifs
+            'biography': generate_biography(nickname, region_names, rng),
+            'region_id': rng.choice(region_ids) if region_ids else None,
+            'skill_ids': rng.sample(skill_ids, min(rng.randint(1, 5), len(skill_ids))),
+        })
+    return heroes
+
+
 class Command(BaseCommand):
     """Commande Django pour générer des données aléatoires."""
     
@@ -130,29 +225,58 @@ class Command(BaseCommand):
             action='store_true',
             help='Effacer uniquement les héros existants'
         )
+        parser.add_argument(
+            '--bulk',
+            action='store_true',
+            help=f'Insertion par lots (bulk_create), sans limite de {MAX_HEROES} héros'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'Taille des lots en mode --bulk (défaut: {DEFAULT_BATCH_SIZE})'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=None,
+            help='Graine aléatoire pour un jeu de données reproductible'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Nombre de processus de génération en mode --bulk (défaut: 1)'
+        )
+        parser.add_argument(
+            '--progress-file',
+            default=None,
+            help='Fichier de progression permettant de reprendre un mode --bulk interrompu'
+        )
 
-    @transaction.atomic
     def handle(self, *args, **options):
         hero_count = options['heroes']
         
         if hero_count < 1:
             raise CommandError('Le nombre de héros doit être supérieur à 0')
         
-        if hero_count > 10000:
-            raise CommandError('Le nombre de héros ne peut pas dépasser 10000')
+        if hero_count > MAX_HEROES and not options['bulk']:
+            raise CommandError(
+                f'Le nombre de héros ne peut pas dépasser {MAX_HEROES} (utilisez --bulk)'
+            )
 
-        # Nettoyage des données
-        if options['clear']:
-            self._clear_all_data()
-        elif options['clear_heroes']:
-            self._clear_heroes()
+        if options['batch_size'] < 1 or options['workers'] < 1:
+            raise CommandError('--batch-size et --workers doivent être supérieurs à 0')
 
-        # Création des données de base
-        regions = self._create_regions()
-        skills = self._create_skills()
+        if options['seed'] is not None:
+            random.seed(options['seed'])
+            fake.seed_instance(options['seed'])
 
-        # Création des héros
-        created_count = self._create_heroes(hero_count, regions, skills)
+        if options['bulk']:
+            regions, skills, created_count = self._handle_bulk(hero_count, options)
+        else:
+            with transaction.atomic():
+                regions, skills, created_count = self._handle_classic(hero_count, options)
 
         # Résumé
         self.stdout.write('')
@@ -164,17 +288,197 @@ class Command(BaseCommand):
         self.stdout.write(f'  🦸 Héros créés: {created_count}')
         self.stdout.write(f'  📊 Total héros: {Hero.objects.count()}')
 
+    def _prepare(self, options) -> Tuple[List[Region], List[Skill]]:
+        """Nettoie si demandé puis crée les régions et compétences."""
+        if options['clear']:
+            self._clear_all_data()
+        elif options['clear_heroes']:
+            self._clear_heroes()
+
+        return self._create_regions(), self._create_skills()
+
+    def _handle_classic(self, hero_count: int, options) -> Tuple[List[Region], List[Skill], int]:
+        """Mode classique : un héros à la fois, dans une seule transaction."""
+        regions, skills = self._prepare(options)
+        created_count = self._create_heroes(hero_count, regions, skills)
+        return regions, skills, created_count
+
+    def _handle_bulk(self, hero_count: int, options) -> Tuple[List[Region], List[Skill], int]:
+        """
+        Mode bulk : lots générés en mémoire (éventuellement en parallèle),
+        insérés par bulk_create et validés un par un.
+        """
+        batch_size = options['batch_size']
+        progress_file = options['progress_file']
+        progress = self._load_progress(progress_file)
+
+        seed = options['seed']
+        if progress:
+            seed = progress['seed']
+            if progress['heroes'] != hero_count or progress['batch_size'] != batch_size:
+                raise CommandError(
+                    f'{progress_file} correspond à un autre lancement '
+                    f"(--heroes={progress['heroes']} --batch-size={progress['batch_size']})"
+                )
+            progress['completed_batches'] += self._pending_batch_committed(progress)
+            self.stdout.write(f"\nReprise après {progress['completed_batches']} lots validés")
+        elif seed is None:
+            seed = random.randrange(2 ** 32)
+
+        # Une reprise ne doit pas effacer les lots déjà validés
+        if progress:
+            options = {**options, 'clear': False, 'clear_heroes': False}
+        with transaction.atomic():
+            regions, skills = self._prepare(options)
+
+        completed = progress['completed_batches'] if progress else 0
+        batch_count = (hero_count + batch_size - 1) // batch_size
+        region_ids = [r.pk for r in regions]
+        region_names = [r.name for r in regions]
+        skill_ids = [s.pk for s in skills]
+        tasks = [
+            (seed, index, min(batch_size, hero_count - index * batch_size),
+             region_ids, region_names, skill_ids)
+            for index in range(completed, batch_count)
+        ]
+
+        self.stdout.write(f'\nCréation de {hero_count} héros par lots de {batch_size} (graine {seed})...')
+
+        created_count = completed * batch_size
+        seen_nicknames = set()
+        pool = self._create_pool(options['workers'])
+        try:
+            batches = pool.imap(generate_hero_batch, tasks) if pool else map(generate_hero_batch, tasks)
+            for index, rows in enumerate(batches, start=completed):
+                run = {'seed': seed, 'heroes': hero_count, 'batch_size': batch_size}
+                with transaction.atomic():
+                    self._ensure_unique_nicknames(rows, index * batch_size, seen_nicknames)
+                    # Lot en cours de validation : à la reprise, la présence en base
+                    # de son dernier pseudonyme (unique) indique qu'il a été validé
+                    self._save_progress(progress_file, {
+                        **run, 'completed_batches': index, 'pending_nickname': rows[-1]['nickname'],
+                    })
+                    created_count += self._insert_hero_batch(rows)
+                self._save_progress(progress_file, {**run, 'completed_batches': index + 1})
+                self.stdout.write(f'  ... {created_count}/{hero_count} héros créés')
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+
+        # bulk_create n'émet pas post_save : agrégats recalculés en une passe,
+        # versions des requêtes conditionnelles incrémentées
+        rollup.rebuild()
+        conditional.bump(*conditional.DATA_VERSIONS)
+
+        if progress_file and os.path.exists(progress_file):
+            os.remove(progress_file)
+
+        return regions, skills, created_count
+
+    def _create_pool(self, workers: int):
+        """Crée le pool de génération (fork : les workers n'accèdent pas à la base)."""
+        if workers <= 1:
+            return None
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+        return context.Pool(workers)
+
+    def _insert_hero_batch(self, rows: List[Dict]) -> int:
+        """Insère un lot de héros et leurs compétences ; retourne le nombre créé."""
+        heroes = [
+            Hero(**{key: value for key, value in row.items() if key != 'skill_ids'})
+            for row in rows
+        ]
+        Hero.objects.bulk_create(heroes, batch_size=1000)
+
+        # Oracle ne renvoie pas les clés primaires insérées par bulk_create
+        if any(hero.pk is None for hero in heroes):
+            pks = dict(
+                Hero.objects
+                .filter(nickname__in=[hero.nickname for hero in heroes])
+                .values_list('nickname', 'pk')
+            )
+            for hero in heroes:
+                hero.pk = pks[hero.nickname]
+
+        Through = Hero.skills.through
+        Through.objects.bulk_create(
+            [
+                Through(hero_id=hero.pk, skill_id=skill_id)
+                for hero, row in zip(heroes, rows)
+                for skill_id in row['skill_ids']
+            ],
+            batch_size=1000,
+        )
+        return len(heroes)
+
+    def _ensure_unique_nicknames(self, rows: List[Dict], offset: int, seen: set):
+        """
+        Rend les pseudonymes uniques, dans le lancement et en base, en
+        suffixant les doublons par leur index global (voir
+        nickname_candidates). Chaque passe vérifie en une requête les
+        pseudonymes encore en conflit ; une seule suffit le plus souvent.
+        """
+        pending = []
+        for position, row in enumerate(rows):
+            candidates = nickname_candidates(row['nickname'], offset + position)
+            row['nickname'] = next(candidates)
+            pending.append((row, candidates))
+
+        while pending:
+            taken = set(
+                Hero.objects
+                .filter(nickname__in={row['nickname'] for row, _ in pending})
+                .values_list('nickname', flat=True)
+            )
+            conflicts = []
+            for row, candidates in pending:
+                if row['nickname'] in seen or row['nickname'] in taken:
+                    row['nickname'] = next(candidates)
+                    conflicts.append((row, candidates))
+                else:
+                    seen.add(row['nickname'])
+            pending = conflicts
+
+    def _pending_batch_committed(self, progress: Dict) -> int:
+        """1 si le lot en cours lors de l'interruption a été validé, sinon 0."""
+        nickname = progress.pop('pending_nickname', None)
+        return int(nickname is not None and Hero.objects.filter(nickname=nickname).exists())
+
+    def _load_progress(self, path: Optional[str]) -> Optional[Dict]:
+        """Charge la progression d'un lancement précédent, si présente."""
+        if not path or not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as handle:
+            return json.load(handle)
+
+    def _save_progress(self, path: Optional[str], progress: Dict):
+        """Enregistre la progression avant et après la validation de chaque lot."""
+        if not path:
+            return
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as handle:
+            json.dump(progress, handle)
+        os.replace(tmp_path, path)
+
     def _clear_all_data(self):
         """Efface toutes les données."""
-        Hero.objects.all().delete()
-        Skill.objects.all().delete()
-        Region.objects.all().delete()
+        with rollup.suspended():
+            Hero.objects.all().delete()
+            Skill.objects.all().delete()
+            Region.objects.all().delete()
+        rollup.rebuild()
+        conditional.bump(*conditional.DATA_VERSIONS)
         self.stdout.write(self.style.WARNING('Toutes les données ont été effacées'))
 
     def _clear_heroes(self):
         """Efface uniquement les héros."""
         deleted_count = Hero.objects.count()
-        Hero.objects.all().delete()
+        with rollup.suspended():
+            Hero.objects.all().delete()
+        rollup.rebuild()
+        conditional.bump(*conditional.DATA_VERSIONS)
         self.stdout.write(self.style.WARNING(f'{deleted_count} héros effacés'))
 
     def _create_regions(self) -> List[Region]:
@@ -264,36 +568,12 @@ class Command(BaseCommand):
 
     def _generate_nickname(self) -> str:
         """Génère un pseudonyme unique."""
-        patterns = [
-            lambda: f"{fake.first_name()}{random.choice(['_', ''])}{random.randint(1, 999)}",
-            lambda: f"{fake.last_name()}{random.choice(['X', 'Z', 'V', ''])}{random.randint(1, 99)}",
-            lambda: f"{fake.user_name()}{random.randint(1, 999)}",
-            lambda: f"{random.choice(['Dark', 'Shadow', 'Light', 'Fire', 'Ice', 'Storm'])}{fake.first_name()}",
-            lambda: f"{fake.first_name()}The{random.choice(['Great', 'Brave', 'Wise', 'Swift'])}",
-        ]
-        return random.choice(patterns)()
+        return generate_nickname()
 
     def _generate_level(self) -> int:
         """Génère un niveau avec distribution réaliste (plus de bas niveaux)."""
-        roll = random.random()
-        if roll < 0.5:
-            return random.randint(1, 20)
-        elif roll < 0.8:
-            return random.randint(21, 50)
-        elif roll < 0.95:
-            return random.randint(51, 70)
-        else:
-            return random.randint(71, 99)
+        return generate_level()
 
     def _generate_biography(self, nickname: str, region_names: List[str]) -> str:
         """Génère une biographie aléatoire."""
-        origin = random.choice(region_names) if region_names else "terres lointaines"
-        template = random.choice(BIO_TEMPLATES)
-        biography = template.format(nickname=nickname, origin=origin)
-        
-        # Ajout d'un exploit héroïque
-        hook = random.choice(BIO_HOOKS)
-        deed = random.choice(BIO_DEEDS)
-        biography += f" {hook} {deed}."
-        
-        return biography
+        return generate_biography(nickname, region_names)
@@ -0,0 +1,175 @@
+"""
+PAFFMMO - Profil du démarrage
+=============================
+Mesure, dans un processus Python neuf, le coût du démarrage d'un worker
+(django.setup() puis chargement des URLs) : temps d'import (python -X
+importtime) et mémoire conservée à l'import (tracemalloc) par module,
+regroupés par paquet, ainsi que la durée totale et le RSS maximal.
+
+--module importe en plus des modules chargés à la demande (backends
+d'export...) pour mesurer leur coût au premier usage.
+"""
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+# Script du processus mesuré : argv = [mode ('time' ou 'memory'), modules...].
+# En mode 'memory', l'exécution de chaque module (compilation ou chargement
+# du bytecode comprise) est encadrée pour mesurer la mémoire qu'il conserve,
+# hors imports imbriqués (comme le temps « self » de -X importtime).
+CHILD_SCRIPT = '''
+import importlib._bootstrap_external as external
+import json, sys, time, tracemalloc
+
+memory = {}
+stack = []
+
+def profiled(exec_module):
+    def wrapper(loader, module):
+        stack.append(0)
+        before = tracemalloc.get_traced_memory()[0]
+        try:
+            return exec_module(loader, module)
+        finally:
+            retained = tracemalloc.get_traced_memory()[0] - before
+            nested = stack.pop()
+            memory[module.__name__] = memory.get(module.__name__, 0) + retained - nested
+            if stack:
+                stack[-1] += retained
+    return wrapper
+
+if sys.argv[1] == 'memory':
+    for loader in (external._LoaderBasics, external.ExtensionFileLoader):
+        loader.exec_module = profiled(loader.exec_module)
+    tracemalloc.start()
+
+start = time.perf_counter()
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+for name in sys.argv[2:]:
+    __import__(name)
+elapsed = time.perf_counter() - start
+
+try:
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+except ImportError:
+    rss = None
+print(json.dumps({'elapsed': elapsed, 'rss': rss, 'modules': len(sys.modules), 'memory': memory}))
+'''
+
+
+def parse_importtime(output):
+    """Temps d'import propre (µs) de chaque module, d'après la sortie de -X importtime."""
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        if own.strip().isdigit():
+            times[name.strip()] = times.get(name.strip(), 0) + int(own)
+    return times
+
+
+def group_name(module, depth):
+    """Nom du module tronqué à `depth` composants (paquet)."""
+    return '.'.join(module.split('.')[:depth])
+
+
+class Command(BaseCommand):
+    """Commande Django de profilage du démarrage des workers."""
+
+    help = "Mesure le temps d'import et la mémoire par module au démarrage d'un worker"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--depth',
+            type=int,
+            default=1,
+            help='Regroupement des modules par paquet, en composants du nom (défaut: 1)'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=25,
+            help='Nombre de lignes affichées (défaut: 25)'
+        )
+        parser.add_argument(
+            '--sort',
+            choices=['time', 'memory'],
+            default='time',
+            help='Tri par temps d\'import ou par mémoire (défaut: time)'
+        )
+        parser.add_argument(
+            '--module',
+            action='append',
+            default=[],
+            help='Module supplémentaire à importer après le démarrage (répétable)'
+        )
+        parser.add_argument(
+            '--json',
+            dest='json_path',
+            help='Écrit aussi le profil complet dans ce fichier JSON'
+        )
+
+    def handle(self, *args, **options):
+        if options['depth'] < 1:
+            raise CommandError('--depth doit être supérieur ou égal à 1.')
+
+        timing, stderr = self.run_child('time', options['module'])
+        memory_run, _ = self.run_child('memory', options['module'])
+        import_times = parse_importtime(stderr)
+
+        groups = defaultdict(lambda: {'import_us': 0, 'memory': 0, 'modules': 0})
+        for module, own in import_times.items():
+            group = groups[group_name(module, options['depth'])]
+            group['import_us'] += own
+            group['modules'] += 1
+        for module, size in memory_run['memory'].items():
+            groups[group_name(module, options['depth'])]['memory'] += size
+
+        key = 'import_us' if options['sort'] == 'time' else 'memory'
+        ordered = sorted(groups.items(), key=lambda item: item[1][key], reverse=True)
+
+        rss = f", RSS {timing['rss'] / 1024:.1f} Mo" if timing['rss'] else ''
+        self.stdout.write(
+            f"Démarrage : {timing['elapsed']:.2f} s{rss}, {timing['modules']} modules "
+            f"(import : {sum(import_times.values()) / 1000:.0f} ms, "
+            f"mémoire des imports : {sum(memory_run['memory'].values()) / 1024 / 1024:.1f} Mo)\n"
+        )
+        self.stdout.write(f"{'Module':<40} {'Import (ms)':>12} {'Mémoire (Ko)':>13} {'Modules':>8}")
+        for name, group in ordered[:options['limit']]:
+            self.stdout.write(
+                f"{name:<40} {group['import_us'] / 1000:>12.1f} "
+                f"{group['memory'] / 1024:>13.0f} {group['modules']:>8}"
+            )
+
+        if options['json_path']:
+            with open(options['json_path'], 'w', encoding='utf-8') as output:
+                json.dump({
+                    'elapsed': timing['elapsed'],
+                    'rss_kb': timing['rss'],
+                    'modules': import_times,
+                    'memory': memory_run['memory'],
+                    'groups': dict(ordered),
+                }, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Profil écrit dans {options['json_path']}"))
+
+    def run_child(self, mode, modules):
+        """Démarre un processus neuf avec les réglages courants ; retourne (mesures, stderr)."""
+        env = {**os.environ, 'PYTHONPATH': os.pathsep.join(path for path in sys.path if path)}
+        command = [sys.executable]
+        if mode == 'time':
+            command += ['-X', 'importtime']
+        command += ['-c', CHILD_SCRIPT, mode, *modules]
+        result = subprocess.run(command, capture_output=True, text=True, env=env)
+        if result.returncode != 0:
+            raise CommandError(f'Échec du démarrage mesuré :\n{result.stderr[-2000:]}')
+        return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
@@ -0,0 +1,22 @@
+"""
+PAFFMMO - Reconstruction des agrégats de statistiques
+=====================================================
+Recalcule HeroStatsRollup depuis la table des héros (réparation de dérive
+après des QuerySet.update() ou des imports SQL directs).
+"""
+from django.core.management.base import BaseCommand
+
+from rpgAtlas import rollup
+from rpgAtlas.models import HeroStatsRollup
+
+
+class Command(BaseCommand):
+    """Commande Django pour reconstruire les agrégats de statistiques."""
+
+    help = 'Reconstruit la table des agrégats de statistiques des héros'
+
+    def handle(self, *args, **options):
+        rollup.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Agrégats reconstruits: {HeroStatsRollup.objects.count()} lignes'
+        ))
@@ -0,0 +1,75 @@
+"""
+PAFFMMO - Instantané analytique des héros
+=========================================
+Reconstruit l'instantané colonnaire des héros (rpgAtlas.snapshot) servi
+par /api/analytics/, si les héros ont changé depuis la génération
+publiée. La table est lue sur un réplica sain s'il y en a (les analyses
+ne chargent pas la base principale), sinon sur la base principale.
+
+--every N répète la vérification toutes les N secondes (service dédié) ;
+--force reconstruit même sans changement.
+"""
+import logging
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, close_old_connections, connections
+
+from rpgAtlas import routers, snapshot
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """Commande Django de reconstruction de l'instantané des héros."""
+
+    help = "Reconstruit l'instantané colonnaire des héros lu par les endpoints d'analyse"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--every',
+            type=float,
+            default=None,
+            help='Répète la reconstruction toutes les N secondes (défaut: une seule fois)'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Reconstruit même si les héros n\'ont pas changé'
+        )
+        parser.add_argument(
+            '--database',
+            default=None,
+            help='Base lue (défaut: un réplica sain, sinon la base principale)'
+        )
+
+    def handle(self, *args, **options):
+        if options['every'] is not None and options['every'] <= 0:
+            raise CommandError('--every doit être supérieur à 0')
+        if options['database'] and options['database'] not in connections:
+            raise CommandError(f"Base inconnue : {options['database']}")
+
+        while True:
+            try:
+                self.refresh(options['database'], options['force'])
+            except DatabaseError:
+                if options['every'] is None:
+                    raise
+                logger.exception("Échec de la reconstruction de l'instantané")
+            if options['every'] is None:
+                return
+            close_old_connections()
+            time.sleep(options['every'])
+
+    def refresh(self, database, force):
+        using = database or routers.choose_replica() or DEFAULT_DB_ALIAS
+        if not force and not snapshot.is_stale(using):
+            self.stdout.write(f'Instantané à jour ({using})')
+            return
+        start = time.perf_counter()
+        meta = snapshot.build(using)
+        self.stdout.write(self.style.SUCCESS(
+            f"Instantané {meta['generation']} : {meta['heroes']} héros lus sur {using} "
+            f"en {time.perf_counter() - start:.2f} s"
+        ))
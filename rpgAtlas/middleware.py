@@ -0,0 +1,149 @@
+"""
+PAFFMMO - Middlewares
+=====================
+QueryBudgetMiddleware : compte les requêtes SQL de chaque requête HTTP,
+signale les N+1 et applique les budgets déclarés (voir querybudget).
+ReplicaRoutingMiddleware : suit les écritures de chaque requête et épingle
+le client sur la base principale après une écriture (voir routers).
+StaticFilesMiddleware : WhiteNoise, utilisable sous ASGI.
+
+Les trois fonctionnent en synchrone (WSGI) comme en asynchrone (ASGI) :
+sous ASGI, Django n'a pas à repasser la chaîne en synchrone (un thread
+par requête) avant d'atteindre les vues asynchrones.
+"""
+import logging
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from . import routers
+from .querybudget import QueryBudgetExceeded, QueryRecorder, get_query_budget
+
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetMiddleware:
+    """
+    Modes (réglage QUERY_BUDGET_MODE) :
+    - 'off' : middleware désactivé
+    - 'warn' : journalise les dépassements et les requêtes dupliquées
+    - 'raise' : lève QueryBudgetExceeded en cas de dépassement (tests)
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.mode = getattr(settings, 'QUERY_BUDGET_MODE', 'off')
+        self.duplicate_threshold = getattr(settings, 'QUERY_DUPLICATE_THRESHOLD', 3)
+        if self.mode not in ('warn', 'raise'):
+            raise MiddlewareNotUsed
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+        return self.finish(request, response, recorder)
+
+    async def __acall__(self, request):
+        # Connexions propres à chaque thread : l'enregistrement est posé
+        # dans le thread où sync_to_async exécute les requêtes SQL
+        recorder = QueryRecorder()
+        await sync_to_async(recorder.__enter__)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(recorder.__exit__)(None, None, None)
+        return self.finish(request, response, recorder)
+
+    def finish(self, request, response, recorder):
+        response['X-Query-Count'] = str(recorder.count)
+        response['X-Query-Time-Ms'] = f'{recorder.duration * 1000:.1f}'
+        self.check(request, recorder)
+        return response
+
+    def check(self, request, recorder):
+        for shape, count in recorder.duplicates(self.duplicate_threshold).items():
+            logger.warning('N+1 probable sur %s (%d fois) : %s', request.path, count, shape)
+
+        # Vue résolue pendant la requête (pas de process_view : en
+        # asynchrone, Django l'exécuterait dans un thread)
+        match = getattr(request, 'resolver_match', None)
+        budget = get_query_budget(request, match.func) if match is not None else None
+        if budget is None or recorder.count <= budget:
+            return
+        message = f'{request.method} {request.path} : {recorder.count} requêtes pour un budget de {budget}'
+        if self.mode == 'raise':
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Lecture de ses écritures : une requête qui écrit lit ensuite sur la
+    base principale, et le client y reste épinglé REPLICA_PIN_SECONDS
+    secondes. Désactivé sans réplica configuré.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if not routers.get_replicas():
+            raise MiddlewareNotUsed
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with routers.track_writes() as state:
+            response = self.get_response(request)
+        if state.wrote:
+            routers.pin_response(response)
+        return response
+
+    async def __acall__(self, request):
+        # L'état est un objet partagé : les écritures faites dans les
+        # threads de sync_to_async y sont visibles
+        with routers.track_writes() as state:
+            response = await self.get_response(request)
+        if state.wrote:
+            routers.pin_response(response)
+        return response
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise (synchrone seulement) complété d'un chemin asynchrone :
+    les requêtes hors fichiers statiques passent directement à la suite
+    de la chaîne, les fichiers sont ouverts dans un thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings=settings)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            # Recherche sur disque (développement)
+            static_file = await sync_to_async(self.find_file, thread_sensitive=False)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve, thread_sensitive=False)(static_file, request)
+        return await self.get_response(request)
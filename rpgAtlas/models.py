@@ -4,6 +4,9 @@ PAFFMMO - Modèles de données
 Compatibilité Django 6.0
 """
 from django.db import models
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Cast, Round
+from django.utils import timezone
 
 
 class Region(models.Model):
@@ -137,6 +140,26 @@ class Hero(models.Model):
         related_name='heroes',
         verbose_name='Compétences'
     )
+    # Colonnes calculées par la base pour pouvoir trier et filtrer dessus.
+    # Virtuelles sur tous les moteurs : Oracle n'accepte pas les colonnes
+    # stockées, et un schéma fixe ne dépend pas de la base ouverte à
+    # l'import du module. Les index sur max_hp et hp_percentage gardent
+    # les valeurs calculées, tris et filtres n'ont donc pas à les recalculer.
+    max_hp = models.GeneratedField(
+        expression=F('level') * 100,
+        output_field=models.IntegerField(),
+        db_persist=False,
+        verbose_name='HP maximum'
+    )
+    hp_percentage = models.GeneratedField(
+        expression=Case(
+            When(level=0, then=Value(0.0)),
+            default=Round(Cast('hp_current', models.FloatField()) * 100 / (F('level') * 100), 1),
+        ),
+        output_field=models.FloatField(),
+        db_persist=False,
+        verbose_name='Pourcentage de HP'
+    )
 
     class Meta:
         verbose_name = 'Héros'
@@ -147,28 +170,30 @@ class Hero(models.Model):
             models.Index(fields=['job_class']),
             models.Index(fields=['level']),
             models.Index(fields=['-created_at']),
+            models.Index(fields=['max_hp']),
+            models.Index(fields=['hp_percentage']),
+            models.Index(fields=['updated_at']),
+            # Classements (voir leaderboard) : global, par classe, par région
+            models.Index(fields=['-level', '-xp', 'id']),
+            models.Index(fields=['job_class', '-level', '-xp', 'id']),
+            models.Index(fields=['region', '-level', '-xp', 'id']),
         ]
 
     def __str__(self):
         return self.nickname
 
-    @property
-    def max_hp(self):
-        """Calcule les HP maximum basés sur le niveau."""
-        return self.level * 100
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Mémorise les valeurs chargées pour calculer les deltas au save."""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
 
-    @property
-    def hp_percentage(self):
-        """Retourne le pourcentage de HP restants."""
-        max_hp = self.max_hp
-        if max_hp == 0:
-            return 0
-        return round((self.hp_current / max_hp) * 100, 1)
-    
     def heal(self, amount: int) -> int:
         """Soigne le héros du montant spécifié, sans dépasser max_hp."""
         old_hp = self.hp_current
-        self.hp_current = min(self.hp_current + amount, self.max_hp)
+        # Calculé depuis level : max_hp n'est rafraîchi qu'après sauvegarde
+        self.hp_current = min(self.hp_current + amount, self.level * 100)
         return self.hp_current - old_hp
     
     def take_damage(self, amount: int) -> int:
@@ -176,3 +201,185 @@ class Hero(models.Model):
         old_hp = self.hp_current
         self.hp_current = max(self.hp_current - amount, 0)
         return old_hp - self.hp_current
+
+
+class HeroStatsRollup(models.Model):
+    """
+    Agrégats des héros par (classe, région, statut actif, niveau).
+
+    Maintenu incrémentalement par les signaux de Hero ; la commande
+    rebuild_stats_rollup le recalcule entièrement en cas de dérive.
+    """
+
+    job_class = models.CharField(
+        max_length=20,
+        choices=Hero.JobClass.choices,
+        verbose_name='Classe'
+    )
+    region = models.ForeignKey(
+        Region,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='stats_rollups',
+        verbose_name='Région'
+    )
+    is_active = models.BooleanField(
+        verbose_name='Actif'
+    )
+    level = models.PositiveIntegerField(
+        verbose_name='Niveau'
+    )
+    hero_count = models.IntegerField(
+        default=0,
+        verbose_name='Nombre de héros'
+    )
+    level_sum = models.BigIntegerField(
+        default=0,
+        verbose_name='Somme des niveaux'
+    )
+    gold_sum = models.BigIntegerField(
+        default=0,
+        verbose_name='Somme de l\'or'
+    )
+    xp_sum = models.BigIntegerField(
+        default=0,
+        verbose_name='Somme de l\'expérience'
+    )
+
+    class Meta:
+        verbose_name = 'Agrégat de statistiques'
+        verbose_name_plural = 'Agrégats de statistiques'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['job_class', 'region', 'is_active', 'level'],
+                name='unique_hero_stats_rollup_bucket',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.job_class} / {self.region_id} / {self.level}'
+
+
+class DataVersion(models.Model):
+    """
+    Compteur de version d'un jeu de données exposé par l'API, incrémenté
+    à chaque modification ; sert de validateur aux requêtes conditionnelles.
+    """
+
+    name = models.CharField(
+        max_length=50,
+        unique=True,
+        verbose_name='Nom'
+    )
+    version = models.BigIntegerField(
+        default=0,
+        verbose_name='Version'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Modifié le'
+    )
+
+    class Meta:
+        verbose_name = 'Version de données'
+        verbose_name_plural = 'Versions de données'
+
+    def __str__(self):
+        return f'{self.name} v{self.version}'
+
+
+class QueryShape(models.Model):
+    """
+    Forme d'une requête de liste de héros (filtres et tri, sans les
+    valeurs) avec sa fréquence et sa durée cumulée ; alimentée par
+    rpgAtlas.queryshapes, lue par la commande advise_indexes.
+    """
+
+    key = models.CharField(
+        max_length=255,
+        unique=True,
+        verbose_name='Forme'
+    )
+    action = models.CharField(
+        max_length=50,
+        verbose_name='Action'
+    )
+    shape = models.JSONField(
+        default=dict,
+        verbose_name='Définition'
+    )
+    sample = models.JSONField(
+        default=dict,
+        verbose_name="Paramètres d'exemple"
+    )
+    count = models.BigIntegerField(
+        default=0,
+        verbose_name='Requêtes'
+    )
+    total_time = models.FloatField(
+        default=0,
+        verbose_name='Durée cumulée (s)'
+    )
+    max_time = models.FloatField(
+        default=0,
+        verbose_name='Durée max (s)'
+    )
+    last_seen = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Vue le'
+    )
+
+    class Meta:
+        verbose_name = 'Forme de requête'
+        verbose_name_plural = 'Formes de requêtes'
+        ordering = ['-count']
+
+    def __str__(self):
+        return f'{self.key} ({self.count})'
+
+    @property
+    def avg_time(self):
+        """Durée moyenne (secondes) d'une requête de cette forme."""
+        return self.total_time / self.count if self.count else 0.0
+
+
+class FullTextMatch(models.Lookup):
+    """Lookup `match` : colonne MATCH requête (tables virtuelles FTS5)."""
+
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', [*lhs_params, *rhs_params]
+
+
+class SearchDocumentField(models.TextField):
+    """Colonne cachée d'une table FTS5 (du nom de la table), cible de MATCH."""
+
+
+SearchDocumentField.register_lookup(FullTextMatch)
+
+
+class HeroSearchEntry(models.Model):
+    """
+    Ligne de la table virtuelle FTS5 des héros (rpgAtlas.search), créée et
+    tenue à jour hors de l'ORM ; sert uniquement à la joindre aux héros
+    (rowid = id du héros) pour filtrer par MATCH et classer par bm25()
+    en une seule évaluation de la recherche.
+    """
+
+    hero = models.OneToOneField(
+        Hero,
+        primary_key=True,
+        db_column='rowid',
+        db_constraint=False,
+        on_delete=models.DO_NOTHING,
+        related_name='search_entry',
+    )
+    document = SearchDocumentField(db_column='rpgAtlas_hero_fts')
+
+    class Meta:
+        managed = False
+        db_table = 'rpgAtlas_hero_fts'
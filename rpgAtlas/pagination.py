@@ -0,0 +1,243 @@
+"""
+PAFFMMO - Pagination
+====================
+Pagination par curseur (keyset) pour les grandes listes de héros, et
+variantes asynchrones (apaginate_queryset) pour les vues ASGI.
+Compatibilité DRF 3.15+
+"""
+import base64
+import datetime
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import InvalidPage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework import pagination
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class CursorJSONEncoder(DjangoJSONEncoder):
+    """Conserve les microsecondes, tronquées par DjangoJSONEncoder."""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def seek_filter(ordering, values):
+    """
+    Construit la condition lexicographique
+    (a, b, id) > (va, vb, vid) en respectant le sens de chaque champ.
+
+    La borne redondante a >= va permet à la base de parcourir l'index de
+    a depuis la clé et de s'arrêter à la limite, plutôt que d'unir les
+    branches du OR puis de trier.
+    """
+    condition = Q()
+    for index, field in enumerate(ordering):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        clause = Q(**{f'{name}__{lookup}': values[index]})
+        for previous, value in zip(ordering[:index], values[:index]):
+            clause &= Q(**{previous.lstrip('-'): value})
+        condition |= clause
+    leading = ordering[0]
+    bound = 'lte' if leading.startswith('-') else 'gte'
+    return Q(**{f'{leading.lstrip("-")}__{bound}': values[0]}) & condition
+
+
+class KeysetPagination(BasePagination):
+    """
+    Pagination par recherche de clé sur (champ de tri, id).
+
+    Contrairement à PageNumberPagination, aucune requête COUNT(*) n'est
+    exécutée et aucun OFFSET n'est utilisé : chaque page filtre à partir
+    de la dernière clé vue, ce qui permet d'exploiter l'index du champ de
+    tri et garantit un temps constant quelle que soit la profondeur.
+    """
+    cursor_query_param = 'cursor'
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    invalid_cursor_message = 'Curseur invalide'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self._page_queryset(queryset, request)
+        return self._set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Variante asynchrone de paginate_queryset (ORM asynchrone)."""
+        queryset = self._page_queryset(queryset, request)
+        return self._set_page([obj async for obj in queryset])
+
+    def _page_queryset(self, queryset, request):
+        """Queryset de la page demandée, avec une ligne de plus pour détecter la suite."""
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.model = queryset.model
+        self.ordering = self.get_ordering(queryset)
+
+        cursor = self.decode_cursor(request)
+        self.cursor = cursor
+        self.reverse = bool(cursor and cursor['r'])
+
+        ordering = self.ordering
+        if self.reverse:
+            ordering = [self._invert(field) for field in ordering]
+        queryset = queryset.order_by(*ordering)
+
+        if cursor:
+            queryset = queryset.filter(self._seek_filter(ordering, cursor['v']))
+        return queryset[:self.page_size + 1]
+
+    def _set_page(self, results):
+        """Retient la page à partir des lignes lues (page_size + 1 au plus)."""
+        self.has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if self.reverse:
+            self.page.reverse()
+
+        # Sens de navigation : un curseur "précédent" existe dès qu'on
+        # a avancé, un curseur "suivant" dès qu'on a reculé.
+        self.has_next = self.has_more if not self.reverse else True
+        self.has_previous = self.cursor is not None and (not self.reverse or self.has_more)
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        page_size = request.query_params.get(self.page_size_query_param)
+        if page_size:
+            try:
+                page_size = int(page_size)
+            except ValueError:
+                return self.page_size
+            if page_size > 0:
+                return min(page_size, self.max_page_size)
+        return self.page_size
+
+    def get_ordering(self, queryset):
+        """
+        Retourne le tri actif (OrderingFilter ou Meta.ordering),
+        complété par l'id pour obtenir une clé strictement unique.
+        """
+        ordering = list(queryset.query.order_by) or list(queryset.model._meta.ordering)
+        ordering = [field for field in ordering if isinstance(field, str)]
+        if not ordering:
+            ordering = ['-pk']
+        if not any(field.lstrip('-') in ('id', 'pk') for field in ordering):
+            descending = ordering[-1].startswith('-')
+            ordering.append('-id' if descending else 'id')
+        return ordering
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def encode_cursor(self, obj, reverse):
+        values = [self._get_value(obj, field) for field in self.ordering]
+        payload = json.dumps({'v': values, 'r': int(reverse)}, cls=CursorJSONEncoder)
+        token = base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+        url = replace_query_param(self.base_url, self.cursor_query_param, token)
+        return remove_query_param(url, 'page')
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(token.encode('ascii')).decode('utf-8'))
+            values = payload['v']
+            if len(values) != len(self.ordering):
+                raise ValueError
+            cursor_values = [
+                self._to_python(field, value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return {'v': cursor_values, 'r': bool(payload.get('r'))}
+
+    def _to_python(self, field, value):
+        """Convertit une valeur de curseur ; les annotations restent brutes."""
+        name = field.lstrip('-')
+        meta = self.model._meta
+        if name == 'pk':
+            return meta.pk.to_python(value)
+        try:
+            return meta.get_field(name).to_python(value)
+        except FieldDoesNotExist:
+            return value
+
+    def _seek_filter(self, ordering, values):
+        return seek_filter(ordering, values)
+
+    @staticmethod
+    def _invert(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def _get_value(obj, field):
+        """Lit la clé sur une instance ou une ligne values()."""
+        name = field.lstrip('-')
+        if isinstance(obj, dict):
+            return obj['id' if name == 'pk' else name]
+        return obj.pk if name == 'pk' else getattr(obj, name)
+
+
+class PageNumberPagination(pagination.PageNumberPagination):
+    """PageNumberPagination de DRF, avec une variante asynchrone."""
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        Variante asynchrone de paginate_queryset : le COUNT(*) et la page
+        sont lus par l'ORM asynchrone, le reste reprend la logique de DRF.
+        """
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        # Paginator.count est une cached_property : on la renseigne d'avance
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            msg = self.invalid_page_message.format(page_number=page_number, message=str(exc))
+            raise NotFound(msg)
+
+        self.page.object_list = [obj async for obj in self.page.object_list]
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        return list(self.page)
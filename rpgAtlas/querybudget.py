@@ -0,0 +1,93 @@
+"""
+PAFFMMO - Budgets de requêtes SQL
+=================================
+Enregistrement des requêtes exécutées pendant une requête HTTP (nombre,
+durée, formes dupliquées) et budgets déclaratifs par vue :
+
+- ViewSet DRF : query_budget = {'list': 2, 'retrieve': 2, ...}
+- ModelAdmin : query_budget = {'changelist': 8, 'change': 6, ...}
+- Autres vues : réglage QUERY_BUDGETS = {'nom-de-route': 3}
+"""
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+
+class QueryBudgetExceeded(Exception):
+    """Levée lorsqu'une vue dépasse son budget de requêtes (mode 'raise')."""
+
+
+IN_LIST_RE = re.compile(r'IN \((?:%s, )*%s\)')
+NUMBER_RE = re.compile(r'\b\d+\b')
+SPACES_RE = re.compile(r'\s+')
+
+
+def normalize_sql(sql):
+    """Réduit une requête à sa forme (listes IN et nombres littéraux masqués)."""
+    sql = IN_LIST_RE.sub('IN (...)', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    return SPACES_RE.sub(' ', sql).strip()
+
+
+class QueryRecorder:
+    """
+    Context manager enregistrant les requêtes de toutes les connexions.
+
+        with QueryRecorder() as recorder:
+            ...
+        recorder.count, recorder.duration, recorder.duplicates
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+        self._stack = None
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.shapes[normalize_sql(sql)] += 1
+
+    def duplicates(self, threshold=2):
+        """Formes de requêtes exécutées au moins `threshold` fois (N+1)."""
+        return {shape: n for shape, n in self.shapes.items() if n >= threshold}
+
+
+def get_query_budget(request, view_func):
+    """Retourne le budget de requêtes déclaré pour la vue, ou None."""
+    match = getattr(request, 'resolver_match', None)
+
+    # ViewSet DRF : as_view() expose la classe et le mapping méthode -> action
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is not None and isinstance(getattr(view_class, 'query_budget', None), dict):
+        actions = getattr(view_func, 'actions', None) or {}
+        action = actions.get(request.method.lower(), request.method.lower())
+        return view_class.query_budget.get(action)
+
+    # ModelAdmin : get_urls() attache l'instance à chaque vue
+    model_admin = getattr(view_func, 'model_admin', None)
+    if model_admin is not None and match is not None and match.url_name:
+        budget = getattr(model_admin, 'query_budget', None) or {}
+        return budget.get(match.url_name.rsplit('_', 1)[-1])
+
+    if match is not None:
+        return getattr(settings, 'QUERY_BUDGETS', {}).get(match.view_name)
+    return None
@@ -0,0 +1,186 @@
+"""
+PAFFMMO - Formes des requêtes de héros
+======================================
+Relevé léger des formes de filtres et de tris des listes de héros (list,
+by_class, top) : colonnes filtrées par égalité ou par plage, recherche et
+tri, indépendamment des valeurs. Chaque processus cumule en mémoire le
+nombre de requêtes servies par la base et leur durée par forme, puis les
+reporte dans QueryShape au plus toutes les QUERY_SHAPES_FLUSH_INTERVAL
+secondes, après l'envoi de la réponse.
+
+La commande advise_indexes rejoue les formes les plus fréquentes
+(EXPLAIN) et propose les index composites ou partiels manquants.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework.response import Response
+
+
+logger = logging.getLogger(__name__)
+
+# Paramètres filtrant par égalité -> colonne (by_class lit ?class=)
+EQUALITY_PARAMS = {
+    'job_class': 'job_class',
+    'class': 'job_class',
+    'region': 'region',
+    'is_active': 'is_active',
+}
+# Paramètres filtrant par plage -> colonne
+RANGE_PARAMS = {
+    'min_level': 'level',
+    'max_level': 'level',
+    'min_hp_pct': 'hp_percentage',
+    'max_hp_pct': 'hp_percentage',
+}
+# Tri imposé par une action, quel que soit ?ordering
+ACTION_ORDERING = {
+    'top': ['-level', '-xp'],
+}
+SHAPE_ACTIONS = ('list', 'by_class', 'top')
+# Actions appliquant filter_queryset (recherche et ?ordering)
+FILTERED_ACTIONS = ('list',)
+
+_pending = {}
+_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def is_enabled():
+    return getattr(settings, 'QUERY_SHAPES_ENABLED', False)
+
+
+def get_shape(view):
+    """
+    Forme de la requête de la vue : dict JSON (action, égalités, plages,
+    recherche, tri). La valeur de is_active en fait partie : elle désigne
+    les candidats aux index partiels.
+    """
+    params = view.request.query_params
+    equality = sorted({column for name, column in EQUALITY_PARAMS.items() if params.get(name)})
+    if 'is_active' in equality:
+        equality[equality.index('is_active')] = f"is_active={params['is_active'].lower() == 'true'}"
+    search = view.action in FILTERED_ACTIONS and bool(params.get('search', '').strip())
+    return {
+        'action': view.action,
+        'equality': equality,
+        'range': sorted({column for name, column in RANGE_PARAMS.items() if params.get(name)}),
+        'search': search,
+        'ordering': get_ordering(view, search),
+    }
+
+
+def get_ordering(view, search):
+    """Tri appliqué par l'action (voir RankedOrderingFilter)."""
+    if view.action in ACTION_ORDERING:
+        return ACTION_ORDERING[view.action]
+    if view.action not in FILTERED_ACTIONS:
+        return list(view.queryset.model._meta.ordering)
+    terms = [term.strip() for term in view.request.query_params.get('ordering', '').split(',')]
+    valid = [term for term in terms if term.lstrip('-') in view.ordering_fields]
+    if valid:
+        return valid
+    return ['-search_rank', '-id'] if search else list(view.ordering)
+
+
+def shape_key(shape):
+    """Représentation compacte et stable d'une forme (clé de QueryShape)."""
+    return ' '.join([
+        shape['action'],
+        f"eq[{','.join(shape['equality'])}]",
+        f"range[{','.join(shape['range'])}]",
+        f"search[{int(shape['search'])}]",
+        f"order[{','.join(shape['ordering'])}]",
+    ])
+
+
+def get_sample(view):
+    """Paramètres de la requête utiles pour la rejouer (EXPLAIN)."""
+    params = view.request.query_params
+    names = [*EQUALITY_PARAMS, *RANGE_PARAMS, 'search', 'ordering']
+    return {name: params[name] for name in names if params.get(name)}
+
+
+def record(view, response, duration):
+    """Cumule la requête si sa liste a été lue en base (ni cache, ni 304)."""
+    if view.action not in SHAPE_ACTIONS or response.status_code != 200 or not isinstance(response, Response):
+        return
+    try:
+        shape = get_shape(view)
+    except (AttributeError, TypeError):
+        return
+    key = shape_key(shape)
+    with _lock:
+        entry = _pending.get(key)
+        if entry is None:
+            entry = _pending[key] = {'shape': shape, 'count': 0, 'total_time': 0.0, 'max_time': 0.0}
+        entry['count'] += 1
+        entry['total_time'] += duration
+        entry['max_time'] = max(entry['max_time'], duration)
+        entry['sample'] = get_sample(view)
+
+
+def flush():
+    """Reporte les compteurs du processus dans QueryShape (base principale)."""
+    global _pending, _last_flush
+    from .models import QueryShape
+
+    with _lock:
+        pending, _pending = _pending, {}
+        _last_flush = time.monotonic()
+    now = timezone.now()
+    # Base principale explicite : ces écritures n'épinglent pas le client
+    shapes = QueryShape.objects.using(DEFAULT_DB_ALIAS)
+    try:
+        for key, entry in pending.items():
+            changes = {
+                'count': F('count') + entry['count'],
+                'total_time': F('total_time') + entry['total_time'],
+                'max_time': Greatest('max_time', entry['max_time']),
+                'sample': entry['sample'],
+                'last_seen': now,
+            }
+            if shapes.filter(key=key).update(**changes):
+                continue
+            try:
+                with transaction.atomic(using=DEFAULT_DB_ALIAS):
+                    shapes.create(
+                        key=key, action=entry['shape']['action'], shape=entry['shape'],
+                        sample=entry['sample'], count=entry['count'], total_time=entry['total_time'],
+                        max_time=entry['max_time'], last_seen=now,
+                    )
+            except IntegrityError:
+                # Créée entre-temps par un autre processus
+                shapes.filter(key=key).update(**changes)
+    except DatabaseError:
+        logger.warning('Formes de requêtes non enregistrées (table QueryShape absente ?)', exc_info=True)
+
+
+@receiver(request_finished)
+def flush_if_due(sender, **kwargs):
+    """Après la réponse : reporte les compteurs si l'intervalle est écoulé."""
+    if _pending and time.monotonic() - _last_flush >= getattr(settings, 'QUERY_SHAPES_FLUSH_INTERVAL', 60):
+        flush()
+
+
+class QueryShapeMixin:
+    """Relève la forme et la durée des requêtes des listes du ViewSet."""
+
+    def initial(self, request, *args, **kwargs):
+        self._shape_started = time.perf_counter()
+        super().initial(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        started = getattr(self, '_shape_started', None)
+        if started is not None and is_enabled():
+            record(self, response, time.perf_counter() - started)
+        return response
@@ -0,0 +1,40 @@
+"""
+PAFFMMO - Renderers
+===================
+Rendu JSON accéléré par orjson, octet pour octet identique au
+JSONRenderer de DRF (compact, UTF-8, U+2028/U+2029 échappés).
+Compatibilité DRF 3.15+
+"""
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer utilisant orjson lorsque c'est équivalent : sortie
+    compacte, non ASCII, sans indentation. Les types non natifs
+    (datetime, Decimal, chaînes paresseuses...) passent par l'encodeur
+    de DRF pour conserver exactement le même format.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or not self.compact or self.ensure_ascii:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(
+                data,
+                default=self.encoder_class().default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS,
+            )
+        except TypeError:
+            # Entiers hors 64 bits, clés non textuelles, NaN strict...
+            return super().render(data, accepted_media_type, renderer_context)
+
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
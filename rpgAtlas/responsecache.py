@@ -0,0 +1,134 @@
+"""
+PAFFMMO - Cache des réponses de l'API
+=====================================
+Cache des réponses JSON rendues, dans un cache Django partagé entre
+processus (fichier par défaut, réglage API_RESPONSE_CACHE). La clé inclut
+les versions DataVersion dont dépend la vue : toute écriture les incrémente
+(signaux), une entrée trouvée n'est donc jamais périmée et une réponse
+calculée par un worker sert aux autres.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.template.response import SimpleTemplateResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from .conditional import aget_request_versions
+
+
+# En-têtes de la réponse rejoués depuis le cache
+CACHED_HEADERS = ('Content-Type', 'Vary', 'Allow', 'ETag', 'Last-Modified', 'Cache-Control')
+
+
+def get_response_cache():
+    """Retourne le cache des réponses, ou None s'il est désactivé."""
+    alias = getattr(settings, 'API_RESPONSE_CACHE', None)
+    return caches[alias] if alias else None
+
+
+def cached_response(method):
+    """
+    Décore une action asynchrone de ViewSet : sert la réponse depuis le
+    cache si les versions get_cache_versions() n'ont pas changé, sinon
+    exécute l'action et met la réponse rendue en cache (JSON, statut 200).
+    """
+    @wraps(method)
+    async def wrapper(self, request, *args, **kwargs):
+        cache = get_response_cache()
+        if not _is_cacheable(self, request, cache):
+            return await method(self, request, *args, **kwargs)
+        versions, last_modified = await aget_request_versions(self, *self.get_cache_versions())
+        self._response_cache_key = key = make_cache_key(request, versions, last_modified)
+        entry = await cache.aget(key)
+        if entry is None:
+            return await method(self, request, *args, **kwargs)
+        return _replay(request, entry)
+    return wrapper
+
+
+def _is_cacheable(view, request, cache):
+    # Clé déjà calculée par une action englobante (super().list(), ...)
+    return cache is not None and not hasattr(view, '_response_cache_key') \
+        and request.accepted_renderer.format == 'json'
+
+
+def _replay(request, entry):
+    """Reconstruit la réponse mise en cache, ou un 304 si le client l'a déjà."""
+    response = HttpResponse(entry['content'], status=200)
+    for header, value in entry['headers'].items():
+        response.headers[header] = value
+    # Requête conditionnelle : les validateurs mis en cache sont à jour
+    return get_conditional_response(
+        request,
+        etag=response.headers.get('ETag'),
+        last_modified=parse_http_date_safe(response.headers.get('Last-Modified', '')),
+        response=response,
+    )
+
+
+def make_cache_key(request, versions, last_modified=None):
+    """
+    Clé : versions et date de dernière incrémentation (distingue deux
+    bases recréées aux mêmes versions), puis URL complète et type de
+    média négocié.
+    """
+    source = f'{request.build_absolute_uri()}|{request.accepted_media_type}'
+    digest = hashlib.sha1(source.encode('utf-8')).hexdigest()
+    generation = '.'.join(f'{name}{version}' for name, version in sorted(versions.items()))
+    stamp = int(last_modified.timestamp() * 1000000) if last_modified else 0
+    return f'api:{generation}:{stamp}:{digest}'
+
+
+class ResponseCacheMixin:
+    """
+    Met en cache les réponses de alist et aretrieve (et des actions
+    décorées par cached_response) ; la vue déclare cache_versions.
+    """
+
+    cache_versions = ()
+
+    def get_cache_versions(self):
+        """Versions DataVersion dont dépendent les réponses de la vue."""
+        return self.cache_versions
+
+    @cached_response
+    async def alist(self, request, *args, **kwargs):
+        return await super().alist(request, *args, **kwargs)
+
+    @cached_response
+    async def aretrieve(self, request, *args, **kwargs):
+        return await super().aretrieve(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        # Les vues asynchrones stockent la réponse via astore_response(),
+        # les vues synchrones une fois la réponse rendue
+        if self._should_store(response) and not getattr(self, 'response_deferred', False):
+            key = self._response_cache_key
+            response.add_post_render_callback(lambda rendered: self._store(key, rendered))
+        return response
+
+    async def astore_response(self, response):
+        """Met en cache la réponse rendue d'une vue asynchrone."""
+        if self._should_store(response):
+            await get_response_cache().aset(self._response_cache_key, self._entry(response))
+
+    def _should_store(self, response):
+        return getattr(self, '_response_cache_key', None) is not None \
+            and response.status_code == 200 and isinstance(response, SimpleTemplateResponse)
+
+    def _store(self, key, response):
+        get_response_cache().set(key, self._entry(response))
+
+    def _entry(self, response):
+        return {
+            'content': response.content,
+            'headers': {
+                header: response.headers[header]
+                for header in CACHED_HEADERS if header in response.headers
+            },
+        }
@@ -0,0 +1,217 @@
+"""
+PAFFMMO - Agrégats de statistiques
+==================================
+Maintien incrémental de HeroStatsRollup et calcul des statistiques
+globales à partir de ses lignes (une par classe × région × statut × niveau)
+plutôt que par balayage de la table des héros.
+"""
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+
+from .models import Hero, HeroStatsRollup
+
+
+# Champs de Hero composant la clé d'un agrégat
+KEY_FIELDS = ('job_class', 'region_id', 'is_active', 'level')
+
+# Champs de Hero nécessaires pour calculer un delta
+STATE_FIELDS = KEY_FIELDS + ('gold', 'xp')
+
+_local = threading.local()
+
+
+def is_suspended():
+    """Indique si la maintenance incrémentale est suspendue (thread courant)."""
+    return getattr(_local, 'suspended', False)
+
+
+@contextmanager
+def suspended():
+    """
+    Suspend la maintenance incrémentale, par exemple pendant une
+    suppression massive ; appeler rebuild() ensuite.
+    """
+    previous = is_suspended()
+    _local.suspended = True
+    try:
+        yield
+    finally:
+        _local.suspended = previous
+
+
+def hero_state(hero):
+    """Retourne l'état agrégé d'un héros sous forme de dict."""
+    return {field: getattr(hero, field) for field in STATE_FIELDS}
+
+
+def stored_state(hero):
+    """
+    Retourne l'état du héros tel qu'en base avant sauvegarde, depuis
+    les valeurs chargées ou, si elles sont incomplètes, par requête.
+    """
+    loaded = getattr(hero, '_loaded_values', None)
+    if loaded and all(field in loaded for field in STATE_FIELDS):
+        return {field: loaded[field] for field in STATE_FIELDS}
+    return Hero.objects.filter(pk=hero.pk).values(*STATE_FIELDS).first()
+
+
+def apply_states(added=(), removed=()):
+    """
+    Applique en base les deltas correspondant aux états ajoutés et
+    retirés, avec une seule mise à jour par agrégat touché.
+    """
+    deltas = defaultdict(lambda: [0, 0, 0, 0])
+    for states, sign in ((added, 1), (removed, -1)):
+        for state in states:
+            delta = deltas[tuple(state[field] for field in KEY_FIELDS)]
+            delta[0] += sign
+            delta[1] += sign * state['level']
+            delta[2] += sign * state['gold']
+            delta[3] += sign * state['xp']
+
+    for key, (count, level, gold, xp) in deltas.items():
+        if not any((count, level, gold, xp)):
+            continue
+        _apply_delta(dict(zip(KEY_FIELDS, key)), count, level, gold, xp)
+
+
+def _apply_delta(key, count, level, gold, xp):
+    """Ajoute le delta à l'agrégat de la clé, en le créant au besoin."""
+    changes = {
+        'hero_count': F('hero_count') + count,
+        'level_sum': F('level_sum') + level,
+        'gold_sum': F('gold_sum') + gold,
+        'xp_sum': F('xp_sum') + xp,
+    }
+    if HeroStatsRollup.objects.filter(**key).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            HeroStatsRollup.objects.create(
+                hero_count=count, level_sum=level, gold_sum=gold, xp_sum=xp, **key
+            )
+    except IntegrityError:
+        # Créé entre-temps par une autre transaction
+        HeroStatsRollup.objects.filter(**key).update(**changes)
+
+
+@transaction.atomic
+def rebuild():
+    """Recalcule entièrement les agrégats depuis la table des héros."""
+    HeroStatsRollup.objects.all().delete()
+    rows = (
+        Hero.objects
+        .order_by()
+        .values(*KEY_FIELDS)
+        .annotate(
+            hero_count=Count('id'),
+            level_sum=Sum('level'),
+            gold_sum=Sum('gold'),
+            xp_sum=Sum('xp'),
+        )
+    )
+    HeroStatsRollup.objects.bulk_create(
+        [HeroStatsRollup(**row) for row in rows],
+        batch_size=1000,
+    )
+
+
+def merge_region_into_null(region):
+    """Reporte les agrégats d'une région supprimée sur 'sans région'."""
+    states = (
+        HeroStatsRollup.objects
+        .filter(region=region)
+        .values('job_class', 'is_active', 'level', 'hero_count', 'level_sum', 'gold_sum', 'xp_sum')
+    )
+    for row in states:
+        _apply_delta(
+            {'job_class': row['job_class'], 'region_id': None,
+             'is_active': row['is_active'], 'level': row['level']},
+            row['hero_count'], row['level_sum'], row['gold_sum'], row['xp_sum'],
+        )
+    HeroStatsRollup.objects.filter(region=region).delete()
+
+
+def filter_rollups(job_class=None, region_id=None, is_active=None, min_level=None, max_level=None):
+    """Agrégats non vides correspondant aux filtres de /api/heroes/stats/."""
+    rollups = HeroStatsRollup.objects.filter(hero_count__gt=0)
+    if job_class:
+        rollups = rollups.filter(job_class=job_class)
+    if region_id:
+        rollups = rollups.filter(region_id=region_id)
+    if is_active is not None:
+        rollups = rollups.filter(is_active=is_active)
+    if min_level is not None:
+        rollups = rollups.filter(level__gte=min_level)
+    if max_level is not None:
+        rollups = rollups.filter(level__lte=max_level)
+    return rollups
+
+
+# Totaux calculés sur les agrégats filtrés
+STATS_TOTALS = {
+    'total_heroes': Sum('hero_count'),
+    'level_sum': Sum('level_sum'),
+    'total_gold': Sum('gold_sum'),
+    'total_xp': Sum('xp_sum'),
+}
+
+
+def class_distribution(rollups):
+    """Nombre de héros par classe."""
+    return (
+        rollups
+        .values('job_class')
+        .annotate(count=Sum('hero_count'))
+        .order_by('-count')
+    )
+
+
+def region_distribution(rollups):
+    """Nombre de héros et somme des niveaux par région."""
+    return (
+        rollups
+        .exclude(region__isnull=True)
+        .values('region__name')
+        .annotate(count=Sum('hero_count'), level_total=Sum('level_sum'))
+        .order_by('-count')
+    )
+
+
+def format_stats(totals, classes, regions):
+    """Met en forme les statistiques comme la version calculée sur les héros."""
+    total_heroes = totals['total_heroes'] or 0
+    return {
+        'total_heroes': total_heroes,
+        'average_level': round((totals['level_sum'] or 0) / total_heroes, 2) if total_heroes else 0,
+        'total_gold': totals['total_gold'] or 0,
+        'total_xp': totals['total_xp'] or 0,
+        'average_gold': round((totals['total_gold'] or 0) / total_heroes, 2) if total_heroes else 0,
+        'class_distribution': list(classes),
+        'region_distribution': [
+            {
+                'region__name': row['region__name'],
+                'count': row['count'],
+                'avg_level': row['level_total'] / row['count'],
+            }
+            for row in regions
+        ],
+    }
+
+
+async def aget_stats(**filters):
+    """
+    Calcule les statistiques de /api/heroes/stats/ depuis les agrégats
+    (ORM asynchrone), au même format que la version calculée sur la table
+    des héros. Filtres : ceux de filter_rollups().
+    """
+    rollups = filter_rollups(**filters)
+    return format_stats(
+        await rollups.aaggregate(**STATS_TOTALS),
+        [row async for row in class_distribution(rollups)],
+        [row async for row in region_distribution(rollups)],
+    )
@@ -0,0 +1,223 @@
+"""
+PAFFMMO - Routage des réplicas en lecture
+=========================================
+Les lectures des ViewSets de l'API et du dashboard sont servies par un
+réplica (réglage DATABASE_REPLICAS) ; les écritures, l'admin, les
+commandes et les lectures hors de ces vues restent sur la base principale.
+
+- Lecture de ses écritures : une requête qui écrit lit ensuite sur la base
+  principale, et le client y est épinglé pendant REPLICA_PIN_SECONDS
+  (cookie posé par ReplicaRoutingMiddleware).
+- Retard de réplication : chaque processus compare périodiquement les
+  versions DataVersion du réplica à celles vues sur la base principale il
+  y a plus de REPLICA_MAX_LAG secondes ; un réplica qui ne les a pas
+  encore reçues (ou injoignable) est écarté jusqu'à la vérification
+  suivante, la base principale servant de repli.
+
+Seuls les modèles de rpgAtlas sont routés : sessions et utilisateurs
+sont toujours lus sur la base principale, et leurs écritures n'épinglent
+pas le client.
+"""
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError
+from rest_framework.permissions import SAFE_METHODS
+
+
+# Cookie d'épinglage sur la base principale (valeur : date d'expiration)
+PIN_COOKIE = 'rpgatlas_db_pin'
+
+_state = ContextVar('rpgatlas_db_routing', default=None)
+
+# Santé des réplicas, par processus : date de vérification, {alias: sain}
+_health = {}
+
+# Versions vues sur la base principale, par processus :
+# {nom: [(date de modification, version), ...]} par version croissante
+_seen_versions = {}
+
+
+class RoutingState:
+    """Routage de la requête en cours : réplica des lectures, écriture effectuée."""
+
+    def __init__(self):
+        self.replica = None
+        self.wrote = False
+
+
+def get_replicas():
+    """Alias des réplicas configurés."""
+    return list(getattr(settings, 'DATABASE_REPLICAS', ()))
+
+
+@contextmanager
+def track_writes():
+    """Suit les écritures d'une requête (voir ReplicaRoutingMiddleware)."""
+    state = RoutingState()
+    token = _state.set(state)
+    try:
+        yield state
+    finally:
+        _state.reset(token)
+
+
+def select_replica(request=None):
+    """Réplica des lectures de la requête, None si le client est épinglé ou sans réplica sain."""
+    return None if is_pinned(request) else choose_replica()
+
+
+def replica_reads(request=None):
+    """
+    Sert les lectures du bloc par un réplica sain, sauf si le client est
+    épinglé sur la base principale ou si la requête a déjà écrit.
+    """
+    return use_replica(select_replica(request))
+
+
+@contextmanager
+def use_replica(alias):
+    """Lectures du bloc sur le réplica `alias` (None : base principale)."""
+    state = _state.get()
+    token = None
+    if state is None:
+        state = RoutingState()
+        token = _state.set(state)
+    previous = state.replica
+    state.replica = alias
+    try:
+        yield state
+    finally:
+        state.replica = previous
+        if token is not None:
+            _state.reset(token)
+
+
+def is_pinned(request):
+    """Le client a-t-il écrit récemment (cookie d'épinglage valide) ?"""
+    if request is None:
+        return False
+    try:
+        return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def pin_response(response):
+    """Épingle le client sur la base principale après une écriture."""
+    seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+    response.set_cookie(
+        PIN_COOKIE, f'{time.time() + seconds:.3f}', max_age=seconds, httponly=True, samesite='Lax'
+    )
+
+
+def choose_replica():
+    """Un réplica sain au hasard, None pour la base principale."""
+    healthy = [alias for alias, ok in get_health().items() if ok]
+    return random.choice(healthy) if healthy else None
+
+
+def get_health():
+    """État des réplicas ({alias: sain}), revérifié toutes les REPLICA_CHECK_INTERVAL secondes."""
+    now = time.monotonic()
+    checked_at = _health.get('checked_at')
+    if checked_at is None or now - checked_at >= getattr(settings, 'REPLICA_CHECK_INTERVAL', 5):
+        _health['replicas'] = check_replicas(get_replicas())
+        _health['checked_at'] = now
+    return _health['replicas']
+
+
+def check_replicas(aliases):
+    """
+    Un réplica est sain s'il a reçu, pour chaque compteur DataVersion, la
+    dernière version vue sur la base principale il y a plus de
+    REPLICA_MAX_LAG secondes (voir required_versions). Une requête sur la
+    base principale, puis une par réplica.
+    """
+    from django.utils import timezone
+
+    from .models import DataVersion
+
+    if not aliases:
+        return {}
+    deadline = timezone.now() - timezone.timedelta(seconds=getattr(settings, 'REPLICA_MAX_LAG', 2))
+    try:
+        required = required_versions(
+            DataVersion.objects.using(DEFAULT_DB_ALIAS).values_list('name', 'version', 'updated_at'), deadline
+        )
+    except DatabaseError:
+        return {alias: False for alias in aliases}
+
+    health = {}
+    for alias in aliases:
+        try:
+            replica = dict(DataVersion.objects.using(alias).values_list('name', 'version'))
+        except DatabaseError:
+            health[alias] = False
+            continue
+        health[alias] = all(replica.get(name, 0) >= version for name, version in required.items())
+    return health
+
+
+def required_versions(rows, deadline):
+    """
+    Versions que les réplicas doivent avoir reçues : pour chaque compteur
+    (nom, version, date de modification de la base principale), la plus
+    récente version modifiée avant `deadline`, lue maintenant ou lors
+    d'une vérification précédente. Un compteur incrémenté en continu
+    ('hero_rows' à chaque sauvegarde) reste ainsi vérifié.
+    """
+    required = {}
+    for name, version, updated_at in rows:
+        history = _seen_versions.setdefault(name, [])
+        if history and history[-1][1] > version:
+            # Base principale restaurée : versions antérieures caduques
+            history.clear()
+        if not history or history[-1][1] != version:
+            history.append((updated_at, version))
+        elapsed = [entry for entry in history if entry[0] <= deadline]
+        if elapsed:
+            required[name] = elapsed[-1][1]
+            # Les versions antérieures à celle exigée ne servent plus
+            del history[:len(elapsed) - 1]
+    return required
+
+
+class ReadReplicaRouter:
+    """Routeur Django : lectures vers le réplica de la requête, écritures vers la base principale."""
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or state.wrote or model._meta.app_label != 'rpgAtlas':
+            return None
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        # Seules les écritures de données de l'application épinglent le
+        # client (pas la session ni la dernière connexion de l'utilisateur)
+        if state is not None and model._meta.app_label == 'rpgAtlas':
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Mêmes données sur toutes les bases
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Les réplicas reçoivent le schéma par réplication
+        return False if db in get_replicas() else None
+
+
+class ReplicaReadMixin:
+    """ViewSet dont les lectures (GET, HEAD, OPTIONS) sont servies par un réplica."""
+
+    def select_replica(self, request):
+        return select_replica(request) if request.method in SAFE_METHODS else None
+
+    def dispatch(self, request, *args, **kwargs):
+        with use_replica(self.select_replica(request)):
+            return super().dispatch(request, *args, **kwargs)
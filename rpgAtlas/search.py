@@ -0,0 +1,392 @@
+"""
+PAFFMMO - Recherche plein texte
+===============================
+Backends de recherche indexée sur les héros (surnom, classe, biographie) :
+
+- FTS5 : table virtuelle SQLite synchronisée par triggers, jointe aux
+  héros (HeroSearchEntry)
+- Oracle Text : index CONTEXT multi-colonnes synchronisé au commit
+- Index inversé Python : repli pour les autres moteurs (développement,
+  processus unique)
+
+Le backend est choisi via le réglage HERO_SEARCH_BACKEND ('auto' par défaut).
+"""
+import bisect
+import logging
+import math
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.db.models import Case, FloatField, Func, Value, When
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework import filters
+
+from .models import Hero, HeroSearchEntry
+
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Colonnes indexées, dans l'ordre de la table FTS
+SEARCH_COLUMNS = ['nickname', 'job_class', 'biography']
+
+
+def tokenize(text):
+    """Découpe un texte en jetons minuscules sans accents."""
+    normalized = unicodedata.normalize('NFKD', text or '')
+    stripped = ''.join(c for c in normalized if not unicodedata.combining(c))
+    return TOKEN_RE.findall(stripped.lower())
+
+
+class Bm25(Func):
+    """
+    Pertinence FTS5 d'une ligne jointe de la table virtuelle : bm25() est
+    négatif, on l'inverse pour un tri décroissant naturel.
+    """
+
+    template = '-bm25(%(expressions)s)'
+    output_field = FloatField()
+
+
+class BaseSearchBackend:
+    """Interface commune des backends de recherche."""
+
+    def setup(self, using=DEFAULT_DB_ALIAS):
+        """Crée les structures d'index sur la base using (appelé après migrate)."""
+
+    def rebuild(self, using=DEFAULT_DB_ALIAS):
+        """Reconstruit entièrement l'index."""
+
+    def update(self, hero):
+        """Indexe ou réindexe un héros."""
+
+    def remove(self, hero_id):
+        """Retire un héros de l'index."""
+
+    def search(self, queryset, terms):
+        """
+        Filtre le queryset sur les termes (ET logique) et l'annote avec
+        search_rank (plus grand = plus pertinent).
+        """
+        raise NotImplementedError
+
+
+class SQLiteFTS5Backend(BaseSearchBackend):
+    """Table virtuelle FTS5 à contenu externe, maintenue par triggers."""
+
+    def __init__(self):
+        self.table = Hero._meta.db_table
+        self.fts_table = HeroSearchEntry._meta.db_table
+
+    def setup(self, using=DEFAULT_DB_ALIAS):
+        columns = ', '.join(SEARCH_COLUMNS)
+        new_values = ', '.join(f'new.{c}' for c in SEARCH_COLUMNS)
+        old_values = ', '.join(f'old.{c}' for c in SEARCH_COLUMNS)
+        statements = [
+            f"""CREATE VIRTUAL TABLE IF NOT EXISTS "{self.fts_table}" USING fts5(
+                {columns}, content='{self.table}', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            )""",
+            f"""CREATE TRIGGER IF NOT EXISTS "{self.fts_table}_ai"
+                AFTER INSERT ON "{self.table}" BEGIN
+                INSERT INTO "{self.fts_table}"(rowid, {columns})
+                VALUES (new.id, {new_values});
+            END""",
+            f"""CREATE TRIGGER IF NOT EXISTS "{self.fts_table}_ad"
+                AFTER DELETE ON "{self.table}" BEGIN
+                INSERT INTO "{self.fts_table}"("{self.fts_table}", rowid, {columns})
+                VALUES ('delete', old.id, {old_values});
+            END""",
+            f"""CREATE TRIGGER IF NOT EXISTS "{self.fts_table}_au"
+                AFTER UPDATE OF {columns} ON "{self.table}" BEGIN
+                INSERT INTO "{self.fts_table}"("{self.fts_table}", rowid, {columns})
+                VALUES ('delete', old.id, {old_values});
+                INSERT INTO "{self.fts_table}"(rowid, {columns})
+                VALUES (new.id, {new_values});
+            END""",
+        ]
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+                [self.fts_table],
+            )
+            exists = cursor.fetchone() is not None
+            for statement in statements:
+                cursor.execute(statement)
+        if not exists:
+            self.rebuild(using)
+
+    def rebuild(self, using=DEFAULT_DB_ALIAS):
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO "{self.fts_table}"("{self.fts_table}") VALUES (%s)',
+                ['rebuild'],
+            )
+
+    def build_query(self, terms):
+        tokens = [token for term in terms for token in tokenize(term)]
+        return ' '.join(f'"{token}"*' for token in tokens)
+
+    def search(self, queryset, terms):
+        query = self.build_query(terms)
+        if not query:
+            return queryset
+        # Jointure sur la table FTS : MATCH évalué une seule fois pour la
+        # requête, bm25() lu sur la ligne jointe (pas de sous-requête par héros)
+        return queryset.filter(search_entry__document__match=query).annotate(
+            search_rank=Bm25('search_entry__document')
+        )
+
+
+class OracleTextBackend(BaseSearchBackend):
+    """Index Oracle Text CONTEXT sur surnom, classe et biographie."""
+
+    preference = 'PAFFMMO_HERO_DS'
+    index_name = 'RPGATLAS_HERO_CTX'
+
+    def setup(self, using=DEFAULT_DB_ALIAS):
+        quote = connections[using].ops.quote_name
+        columns = ', '.join(SEARCH_COLUMNS)
+        statements = [
+            f"""BEGIN
+                ctx_ddl.create_preference('{self.preference}', 'MULTI_COLUMN_DATASTORE');
+                ctx_ddl.set_attribute('{self.preference}', 'COLUMNS', '{columns}');
+            END;""",
+            f"""CREATE INDEX {self.index_name}
+                ON {quote(Hero._meta.db_table)} ({quote('biography')})
+                INDEXTYPE IS CTXSYS.CONTEXT
+                PARAMETERS ('DATASTORE {self.preference} SYNC (ON COMMIT)')""",
+        ]
+        with connections[using].cursor() as cursor:
+            for statement in statements:
+                try:
+                    cursor.execute(statement)
+                except DatabaseError:
+                    # Préférence ou index déjà présents
+                    pass
+
+    def rebuild(self, using=DEFAULT_DB_ALIAS):
+        with connections[using].cursor() as cursor:
+            cursor.execute(f"ALTER INDEX {self.index_name} REBUILD")
+
+    def build_query(self, terms):
+        tokens = [token for term in terms for token in tokenize(term)]
+        return ' AND '.join(f'{{{token}}}' for token in tokens)
+
+    def search(self, queryset, terms):
+        query = self.build_query(terms)
+        if not query:
+            return queryset
+        quote = connections[queryset.db].ops.quote_name
+        column = f'{quote(Hero._meta.db_table)}.{quote("biography")}'
+        return queryset.annotate(
+            search_match=RawSQL(f'CONTAINS({column}, %s, 1)', [query]),
+            search_rank=RawSQL('SCORE(1)', [], output_field=FloatField()),
+        ).filter(search_match__gt=0)
+
+
+class InvertedIndexBackend(BaseSearchBackend):
+    """
+    Index inversé TF-IDF en mémoire, propre à chaque processus : réservé
+    au développement et aux déploiements à un seul processus (préférer
+    FTS5 ou Oracle Text en production).
+
+    Le processus qui sauvegarde un héros le réindexe aussitôt (signaux).
+    Avant chaque recherche, les versions 'heroes' et 'hero_rows' de la base
+    principale sont comparées à celles de l'index : si elles ont changé
+    (écritures d'un autre processus, bulk_create de generate_data), les
+    héros modifiés depuis la dernière synchronisation sont réindexés et
+    les héros supprimés retirés. Un QuerySet.update() des colonnes
+    indexées qui n'incrémente pas ces versions impose un rebuild().
+    """
+
+    # Versions surveillées et marge de relecture des updated_at
+    # (transactions validées après la synchronisation précédente)
+    sync_versions = ('heroes', 'hero_rows')
+    sync_margin = timezone.timedelta(seconds=5)
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = defaultdict(dict)
+        self._documents = {}
+        self._vocabulary = []
+        self._versions = None
+        self._synced_at = None
+        if not settings.DEBUG:
+            logger.warning(
+                "Recherche des héros par index inversé en mémoire : un index par processus, "
+                "resynchronisé à chaque recherche. Réservé au développement ; utiliser FTS5 "
+                "(SQLite) ou Oracle Text en production."
+            )
+
+    def rebuild(self, using=DEFAULT_DB_ALIAS):
+        # L'index suit toujours la base principale (versions et lignes)
+        with self._lock:
+            self._synced_at = timezone.now()
+            self._versions = self._read_versions()
+            self._postings.clear()
+            self._documents.clear()
+            rows = self._heroes().values_list('pk', *SEARCH_COLUMNS).iterator(chunk_size=2000)
+            for pk, *values in rows:
+                self._add(pk, values, index_vocabulary=False)
+            self._vocabulary = sorted(self._postings)
+
+    def sync(self):
+        """Rattrape les écritures faites hors du processus depuis la dernière synchronisation."""
+        if self._versions is None:
+            self.rebuild()
+            return
+        versions = self._read_versions()
+        if versions == self._versions:
+            return
+        with self._lock:
+            synced_at = timezone.now()
+            if versions.get('heroes') != self._versions.get('heroes'):
+                # Héros supprimés
+                existing = set(self._heroes().values_list('pk', flat=True))
+                for pk in set(self._documents) - existing:
+                    self._discard(pk)
+            changed = self._heroes().filter(updated_at__gte=self._synced_at - self.sync_margin)
+            for pk, *values in changed.values_list('pk', *SEARCH_COLUMNS).iterator(chunk_size=2000):
+                self._discard(pk)
+                self._add(pk, values)
+            self._versions = versions
+            self._synced_at = synced_at
+
+    def update(self, hero):
+        if self._versions is None:
+            return
+        with self._lock:
+            self._discard(hero.pk)
+            self._add(hero.pk, [getattr(hero, column) for column in SEARCH_COLUMNS])
+
+    def remove(self, hero_id):
+        if self._versions is None:
+            return
+        with self._lock:
+            self._discard(hero_id)
+
+    def search(self, queryset, terms):
+        tokens = [token for term in terms for token in tokenize(term)]
+        if not tokens:
+            return queryset
+        self.sync()
+
+        with self._lock:
+            total = len(self._documents) or 1
+            scores = None
+            for token in tokens:
+                token_scores = defaultdict(float)
+                for word in self._expand(token):
+                    postings = self._postings[word]
+                    idf = math.log(1 + total / len(postings))
+                    for pk, frequency in postings.items():
+                        token_scores[pk] += frequency * idf
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {pk: scores[pk] + s for pk, s in token_scores.items() if pk in scores}
+                if not scores:
+                    return queryset.none()
+
+        # Tous les résultats (count et pages exacts) ; un When par score distinct
+        by_score = defaultdict(list)
+        for pk, score in scores.items():
+            by_score[round(score, 6)].append(pk)
+        rank = Case(
+            *[When(pk__in=pks, then=Value(score)) for score, pks in by_score.items()],
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+        return queryset.filter(pk__in=list(scores)).annotate(search_rank=rank)
+
+    def _heroes(self):
+        return Hero.objects.using(DEFAULT_DB_ALIAS)
+
+    def _read_versions(self):
+        from .models import DataVersion
+
+        return dict(
+            DataVersion.objects.using(DEFAULT_DB_ALIAS)
+            .filter(name__in=self.sync_versions).values_list('name', 'version')
+        )
+
+    def _expand(self, prefix):
+        """Retourne les mots du vocabulaire commençant par le préfixe."""
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        words = []
+        for word in self._vocabulary[start:]:
+            if not word.startswith(prefix):
+                break
+            words.append(word)
+        return words
+
+    def _add(self, pk, values, index_vocabulary=True):
+        frequencies = defaultdict(int)
+        for value in values:
+            for token in tokenize(value):
+                frequencies[token] += 1
+        for token, frequency in frequencies.items():
+            if index_vocabulary and token not in self._postings:
+                bisect.insort(self._vocabulary, token)
+            self._postings[token][pk] = frequency
+        self._documents[pk] = tuple(frequencies)
+
+    def _discard(self, pk):
+        for token in self._documents.pop(pk, ()):
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.pop(pk, None)
+                if not postings:
+                    del self._postings[token]
+                    index = bisect.bisect_left(self._vocabulary, token)
+                    if index < len(self._vocabulary) and self._vocabulary[index] == token:
+                        del self._vocabulary[index]
+
+
+BACKENDS_BY_VENDOR = {
+    'sqlite': SQLiteFTS5Backend,
+    'oracle': OracleTextBackend,
+}
+
+_backend = None
+
+
+def get_search_backend():
+    """Retourne l'instance (unique par processus) du backend configuré."""
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'HERO_SEARCH_BACKEND', 'auto')
+        if path == 'auto':
+            backend_class = BACKENDS_BY_VENDOR.get(connections[DEFAULT_DB_ALIAS].vendor, InvertedIndexBackend)
+        else:
+            backend_class = import_string(path)
+        _backend = backend_class()
+    return _backend
+
+
+class HeroSearchFilter(filters.SearchFilter):
+    """SearchFilter DRF délégant au backend plein texte configuré."""
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        return get_search_backend().search(queryset, terms)
+
+
+class RankedOrderingFilter(filters.OrderingFilter):
+    """Trie par pertinence lors d'une recherche sans ?ordering explicite."""
+
+    def get_ordering(self, request, queryset, view):
+        if not request.query_params.get(self.ordering_param) \
+                and 'search_rank' in queryset.query.annotations:
+            return ['-search_rank', '-id']
+        return super().get_ordering(request, queryset, view)
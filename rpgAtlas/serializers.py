@@ -7,6 +7,53 @@ from rest_framework import serializers
 from .models import Hero, Region, Skill
 
 
+# Champs des serializers de héros -> champs du modèle à charger (par
+# défaut le champ lui-même) ; les relations sont jointes ou préchargées
+# seulement si un champ qui les utilise est demandé.
+HERO_FIELD_SOURCES = {
+    'job_class_display': ('job_class',),
+    'region_name': ('region', 'region__name'),
+    'region_data': ('region', 'region__name', 'region__environment_type'),
+    'skills': (),
+    'skills_count': (),
+}
+HERO_FIELD_PREFETCHES = {
+    'skills': 'skills',
+    'skills_count': 'skills',
+}
+
+
+def get_sparse_fields(request, available):
+    """
+    Champs demandés par ?fields=a,b et / ou ?exclude=c parmi `available`,
+    dans l'ordre de `available` ; None si la requête n'en demande pas.
+    Un champ inconnu donne une erreur 400.
+    """
+    params = getattr(request, 'query_params', None)
+    if params is None:
+        return None
+    fields = {name.strip() for name in params.get('fields', '').split(',') if name.strip()}
+    exclude = {name.strip() for name in params.get('exclude', '').split(',') if name.strip()}
+    if not fields and not exclude:
+        return None
+
+    unknown = (fields | exclude) - set(available)
+    if unknown:
+        raise serializers.ValidationError({'fields': f'Champs inconnus : {", ".join(sorted(unknown))}'})
+    return [name for name in available if (not fields or name in fields) and name not in exclude]
+
+
+class SparseFieldsMixin:
+    """Restreint les champs du serializer à ceux demandés par ?fields= / ?exclude=."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        names = get_sparse_fields(self.context.get('request'), list(self.fields))
+        if names is not None:
+            for name in set(self.fields) - set(names):
+                self.fields.pop(name)
+
+
 class SkillSerializer(serializers.ModelSerializer):
     """Serializer pour les compétences."""
     
@@ -43,7 +90,7 @@ class RegionSerializer(serializers.ModelSerializer):
         ]
 
 
-class HeroListSerializer(serializers.ModelSerializer):
+class HeroListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer léger pour la liste des héros."""
     
     region_name = serializers.CharField(
@@ -79,7 +126,7 @@ class HeroListSerializer(serializers.ModelSerializer):
         ]
 
 
-class HeroSerializer(serializers.ModelSerializer):
+class HeroSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer complet pour le détail d'un héros."""
     
     region_name = serializers.CharField(
@@ -124,5 +171,211 @@ class HeroSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at', 'updated_at']
 
     def get_skills_count(self, obj):
-        """Retourne le nombre de compétences du héros."""
-        return obj.skills.count()
+        """Retourne le nombre de compétences du héros (via le préchargement)."""
+        return len(obj.skills.all())
+
+
+class HeroListFastSerializer:
+    """
+    Rendu rapide de HeroListSerializer à partir de lignes values().
+
+    Lit uniquement les colonnes nécessaires (région jointe, sans
+    préchargement des compétences) et produit exactement les mêmes
+    données que HeroListSerializer, sans la mécanique des champs DRF.
+    Avec `fields` (voir get_sparse_fields), seules les colonnes de ces
+    champs sont lues : la région n'est jointe que si region_name est demandé.
+    """
+
+    columns = (
+        'id',
+        'nickname',
+        'job_class',
+        'level',
+        'hp_current',
+        'max_hp',
+        'hp_percentage',
+        'xp',
+        'gold',
+        'is_active',
+        'region_id',
+        'region__name',
+        'created_at',
+    )
+
+    # Champ de sortie -> colonnes values() (par défaut le champ lui-même)
+    field_columns = {
+        'job_class_display': ('job_class',),
+        'region': ('region_id',),
+        'region_name': ('region__name',),
+    }
+
+    job_class_labels = {value: str(label) for value, label in Hero.JobClass.choices}
+
+    def __init__(self, fields=None):
+        self.created_at_field = serializers.DateTimeField()
+        self.fields = fields
+        if fields is not None:
+            self.columns = tuple(dict.fromkeys(
+                column for name in fields for column in self.field_columns.get(name, (name,))
+            ))
+
+    def get_rows(self, queryset):
+        """Restreint le queryset aux colonnes utiles (annotations conservées)."""
+        annotations = tuple(queryset.query.annotations)
+        columns = self.columns
+        if self.fields is not None:
+            # Clés de tri (pagination par curseur) : id et tri du queryset
+            ordering = queryset.query.order_by or queryset.model._meta.ordering
+            ordering = [field.lstrip('-') for field in ordering if isinstance(field, str)]
+            ordering = ['id' if field == 'pk' else field for field in ordering]
+            columns = tuple(dict.fromkeys(
+                (*columns, 'id', *(field for field in ordering if field not in annotations))
+            ))
+        return queryset.select_related(None).prefetch_related(None).values(*columns, *annotations)
+
+    def to_representation(self, row):
+        if self.fields is not None:
+            return {name: self.get_value(name, row) for name in self.fields}
+        job_class = row['job_class']
+        return {
+            'id': row['id'],
+            'nickname': row['nickname'],
+            'job_class': job_class,
+            'job_class_display': self.job_class_labels.get(job_class, job_class),
+            'level': row['level'],
+            'hp_current': row['hp_current'],
+            'max_hp': row['max_hp'],
+            'hp_percentage': float(row['hp_percentage']),
+            'xp': row['xp'],
+            'gold': row['gold'],
+            'is_active': bool(row['is_active']),
+            'region': row['region_id'],
+            'region_name': row['region__name'],
+            'created_at': self.created_at_field.to_representation(row['created_at']),
+        }
+
+    def get_value(self, name, row):
+        """Valeur d'un seul champ, comme dans to_representation."""
+        if name == 'job_class_display':
+            return self.job_class_labels.get(row['job_class'], row['job_class'])
+        if name == 'hp_percentage':
+            return float(row['hp_percentage'])
+        if name == 'is_active':
+            return bool(row['is_active'])
+        if name == 'created_at':
+            return self.created_at_field.to_representation(row['created_at'])
+        return row[self.field_columns.get(name, (name,))[0]]
+
+    def serialize(self, rows):
+        to_representation = self.to_representation
+        return [to_representation(row) for row in rows]
+
+
+class HeroDeltasField(serializers.Field):
+    """
+    Liste de {"hero_id": int, "delta": int} convertie en {hero_id: delta}.
+
+    Validée sans un serializer par entrée : un tick de combat porte sur
+    des milliers de héros. Les deltas d'un même héros sont cumulés.
+    """
+
+    default_error_messages = {
+        'not_a_list': 'Une liste de {"hero_id", "delta"} est attendue.',
+        'invalid_entry': 'Entrée {index} invalide : hero_id et delta entiers attendus.',
+        'empty': 'La liste ne peut pas être vide.',
+        'max_length': 'Au plus {max_length} héros par tick.',
+    }
+
+    def __init__(self, max_length, max_delta, **kwargs):
+        self.max_length = max_length
+        self.max_delta = max_delta
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if not isinstance(data, list):
+            self.fail('not_a_list')
+        if not data:
+            self.fail('empty')
+        if len(data) > self.max_length:
+            self.fail('max_length', max_length=self.max_length)
+
+        deltas = {}
+        for index, entry in enumerate(data):
+            try:
+                hero_id, delta = entry['hero_id'], entry['delta']
+            except (TypeError, KeyError):
+                self.fail('invalid_entry', index=index)
+            if type(hero_id) is not int or type(delta) is not int \
+                    or hero_id < 1 or abs(delta) > self.max_delta:
+                self.fail('invalid_entry', index=index)
+            deltas[hero_id] = deltas.get(hero_id, 0) + delta
+        return deltas
+
+    def to_representation(self, value):
+        return [{'hero_id': hero_id, 'delta': delta} for hero_id, delta in value.items()]
+
+
+class CombatTickFilterSerializer(serializers.Serializer):
+    """
+    Filtres des héros d'un tick de combat (mêmes que la liste des héros) :
+    au moins un, et aucun filtre inconnu (une faute de frappe ne doit pas
+    appliquer le tick à tous les héros).
+    """
+
+    job_class = serializers.ChoiceField(choices=Hero.JobClass.choices, required=False)
+    is_active = serializers.BooleanField(required=False)
+    region = serializers.IntegerField(required=False)
+    min_level = serializers.IntegerField(min_value=0, required=False)
+    max_level = serializers.IntegerField(min_value=0, required=False)
+    min_hp_pct = serializers.FloatField(required=False)
+    max_hp_pct = serializers.FloatField(required=False)
+
+    # Paramètre -> lookup sur Hero
+    lookups = {
+        'job_class': 'job_class',
+        'is_active': 'is_active',
+        'region': 'region_id',
+        'min_level': 'level__gte',
+        'max_level': 'level__lte',
+        'min_hp_pct': 'hp_percentage__gte',
+        'max_hp_pct': 'hp_percentage__lte',
+    }
+
+    def to_internal_value(self, data):
+        if isinstance(data, dict):
+            unknown = sorted(set(data) - set(self.fields))
+            if unknown:
+                raise serializers.ValidationError({name: 'Filtre inconnu.' for name in unknown})
+        return super().to_internal_value(data)
+
+    def validate(self, attrs):
+        if not attrs:
+            raise serializers.ValidationError('Au moins un filtre est requis.')
+        return attrs
+
+    @classmethod
+    def get_lookups(cls, filters):
+        """Filtres validés, sous forme de kwargs pour Hero.objects.filter."""
+        return {cls.lookups[name]: value for name, value in filters.items()}
+
+
+class CombatTickSerializer(serializers.Serializer):
+    """
+    Tick de combat : soit une liste de {"hero_id", "delta"}, soit des
+    filtres et un delta commun (positif pour un soin, négatif pour des dégâts).
+    """
+
+    MAX_HEROES = 10000
+    MAX_DELTA = 1000000
+
+    heroes = HeroDeltasField(max_length=MAX_HEROES, max_delta=MAX_DELTA, required=False)
+    filter = CombatTickFilterSerializer(required=False)
+    delta = serializers.IntegerField(min_value=-MAX_DELTA, max_value=MAX_DELTA, required=False)
+
+    def validate(self, attrs):
+        if 'heroes' in attrs:
+            if 'filter' in attrs or 'delta' in attrs:
+                raise serializers.ValidationError('"heroes" exclut "filter" et "delta".')
+        elif 'delta' not in attrs or 'filter' not in attrs:
+            raise serializers.ValidationError('"heroes", ou "filter" et "delta", est requis.')
+        return attrs
@@ -0,0 +1,158 @@
+"""
+PAFFMMO - Signaux
+=================
+Maintien des structures dérivées (index de recherche, agrégats de
+statistiques, versions des requêtes conditionnelles, cache des fiches)
+à jour.
+"""
+from django.db import DEFAULT_DB_ALIAS, connections, router
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import conditional, herocache, rollup
+from .models import Hero, HeroStatsRollup, Region, Skill
+from .search import get_search_backend
+
+
+def _hero_tables_exist(using=DEFAULT_DB_ALIAS):
+    """Les tables sont absentes après un migrate sans --run-syncdb."""
+    tables = connections[using].introspection.table_names()
+    return Hero._meta.db_table in tables and HeroStatsRollup._meta.db_table in tables
+
+
+def setup_search_index(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """Crée l'index plein texte sur la base migrée (post_migrate)."""
+    if router.allow_migrate_model(using, Hero) and _hero_tables_exist(using):
+        get_search_backend().setup(using)
+
+
+def setup_stats_rollup(sender, using=None, **kwargs):
+    """Initialise les agrégats après migrate s'ils sont vides (post_migrate)."""
+    if _hero_tables_exist() and not HeroStatsRollup.objects.exists() and Hero.objects.exists():
+        rollup.rebuild()
+
+
+@receiver(post_save, sender=Hero)
+def index_hero(sender, instance, **kwargs):
+    """Réindexe le héros sauvegardé."""
+    get_search_backend().update(instance)
+
+
+@receiver(post_delete, sender=Hero)
+def unindex_hero(sender, instance, **kwargs):
+    """Retire le héros supprimé de l'index."""
+    get_search_backend().remove(instance.pk)
+
+
+@receiver(pre_save, sender=Hero)
+def capture_rollup_state(sender, instance, **kwargs):
+    """Mémorise l'état en base du héros avant modification."""
+    if rollup.is_suspended() or instance._state.adding:
+        instance._rollup_previous = None
+        return
+    instance._rollup_previous = rollup.stored_state(instance)
+
+
+@receiver(post_save, sender=Hero)
+def update_rollup_on_save(sender, instance, raw=False, **kwargs):
+    """Reporte le delta du héros sauvegardé sur les agrégats."""
+    if raw or rollup.is_suspended():
+        return
+    state = rollup.hero_state(instance)
+    previous = getattr(instance, '_rollup_previous', None)
+    rollup.apply_states(added=[state], removed=[previous] if previous else [])
+    instance._loaded_values = {**getattr(instance, '_loaded_values', {}), **state}
+
+
+@receiver(post_delete, sender=Hero)
+def update_rollup_on_delete(sender, instance, **kwargs):
+    """Retire le héros supprimé des agrégats."""
+    if rollup.is_suspended():
+        return
+    loaded = getattr(instance, '_loaded_values', {})
+    state = {**rollup.hero_state(instance), **{
+        field: loaded[field] for field in rollup.STATE_FIELDS if field in loaded
+    }}
+    rollup.apply_states(removed=[state])
+
+
+@receiver(pre_delete, sender=Region)
+def merge_region_rollup(sender, instance, **kwargs):
+    """Les héros de la région passent 'sans région' (SET_NULL sans signal)."""
+    if not rollup.is_suspended():
+        rollup.merge_region_into_null(instance)
+
+
+@receiver(post_save, sender=Hero)
+def bump_versions_on_hero_save(sender, instance, created=False, raw=False, **kwargs):
+    """
+    Incrémente hero_rows, et regions si le héros est créé ou change de
+    région (nombre de héros par région).
+    """
+    if raw or rollup.is_suspended():
+        return
+    previous = getattr(instance, '_rollup_previous', None)
+    if created or previous is None or previous['region_id'] != instance.region_id:
+        conditional.bump('hero_rows', 'regions')
+    else:
+        conditional.bump('hero_rows')
+
+
+@receiver(post_delete, sender=Hero)
+def bump_versions_on_hero_delete(sender, instance, **kwargs):
+    """Un héros supprimé disparaît des listes et des compteurs."""
+    if not rollup.is_suspended():
+        conditional.bump('heroes', 'regions', 'skills')
+
+
+@receiver(m2m_changed, sender=Hero.skills.through)
+def bump_versions_on_hero_skills(sender, action, **kwargs):
+    """Les compétences d'un héros ne modifient pas son updated_at."""
+    if action in ('post_add', 'post_remove', 'post_clear') and not rollup.is_suspended():
+        conditional.bump('heroes', 'skills')
+
+
+@receiver(post_save, sender=Region)
+@receiver(post_delete, sender=Region)
+def bump_versions_on_region(sender, raw=False, **kwargs):
+    """Les régions sont affichées dans les fiches des héros."""
+    if not raw and not rollup.is_suspended():
+        conditional.bump('heroes', 'regions')
+
+
+@receiver(post_save, sender=Skill)
+@receiver(post_delete, sender=Skill)
+def bump_versions_on_skill(sender, raw=False, **kwargs):
+    """Les compétences sont affichées dans les fiches des héros."""
+    if not raw and not rollup.is_suspended():
+        conditional.bump('heroes', 'skills')
+
+
+@receiver(post_save, sender=Hero)
+@receiver(post_delete, sender=Hero)
+def invalidate_hero_detail(sender, instance, **kwargs):
+    """Retire la fiche en cache du héros modifié ou supprimé."""
+    herocache.invalidate(instance.pk)
+
+
+@receiver(m2m_changed, sender=Hero.skills.through)
+def invalidate_hero_detail_skills(sender, instance, action, reverse, pk_set, **kwargs):
+    """Fiches des héros dont les compétences changent (depuis le héros ou la compétence)."""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        herocache.invalidate(instance.pk)
+    elif pk_set:
+        herocache.invalidate(*pk_set)
+    else:
+        # post_clear depuis une compétence : héros concernés inconnus
+        herocache.clear()
+
+
+@receiver(post_save, sender=Region)
+@receiver(post_delete, sender=Region)
+@receiver(post_save, sender=Skill)
+@receiver(post_delete, sender=Skill)
+def clear_hero_details(sender, **kwargs):
+    """Régions et compétences figurent dans toutes les fiches."""
+    herocache.clear()
@@ -0,0 +1,237 @@
+"""
+PAFFMMO - Instantané colonnaire des héros
+=========================================
+Copie des colonnes numériques de la table des héros en tableaux NumPy,
+pour les analyses de l'API (rpgAtlas.analytics) : histogrammes, groupes
+et percentiles sont calculés sur ces tableaux, sans requête sur la base.
+
+La commande refresh_hero_snapshot reconstruit l'instantané (une requête
+parcourue en flux, sur un réplica si possible) lorsque les héros ont
+changé. Chaque génération est un répertoire de fichiers .npy (un par
+colonne) et un meta.json dans HERO_SNAPSHOT_DIR ; le fichier CURRENT
+désigne la génération publiée et est remplacé atomiquement. Les workers
+projettent les fichiers en mémoire en lecture seule (mmap, pages
+partagées entre processus) et détectent une nouvelle génération au plus
+toutes les HERO_SNAPSHOT_CHECK_INTERVAL secondes.
+"""
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from .models import DataVersion, Hero, Region
+
+
+logger = logging.getLogger(__name__)
+
+# Colonnes de l'instantané : nom -> (champ lu dans values_list(), type NumPy)
+SNAPSHOT_COLUMNS = {
+    'id': ('id', np.int64),
+    'job_class': ('job_class', np.int8),
+    'region': ('region_id', np.int32),
+    'level': ('level', np.int32),
+    'xp': ('xp', np.int64),
+    'gold': ('gold', np.int64),
+    'hp_current': ('hp_current', np.int32),
+    'max_hp': ('max_hp', np.int32),
+    'hp_percentage': ('hp_percentage', np.float64),
+    'is_active': ('is_active', np.bool_),
+    'created_at': ('created_at', np.int64),
+}
+
+# Versions dont dépend l'instantané (héros, suppressions, régions)
+SNAPSHOT_VERSIONS = ('heroes', 'hero_rows', 'regions')
+
+# Héros lus par lot depuis le curseur
+SNAPSHOT_CHUNK_SIZE = 20000
+
+# Générations conservées sur disque (la précédente reste lisible par les
+# workers qui ne sont pas encore passés à la nouvelle)
+SNAPSHOT_KEEP = 2
+
+CURRENT_FILE = 'CURRENT'
+
+_loaded = {'snapshot': None, 'checked_at': None}
+
+
+class HeroSnapshot:
+    """Génération publiée : colonnes projetées en lecture seule et métadonnées."""
+
+    def __init__(self, path, meta):
+        self.path = path
+        self.meta = meta
+        # Un fichier vide ne peut pas être projeté en mémoire
+        mmap_mode = 'r' if meta['heroes'] else None
+        self.columns = {
+            name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode)
+            for name in meta['columns']
+        }
+
+    def __len__(self):
+        return self.meta['heroes']
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    @property
+    def generation(self):
+        return self.meta['generation']
+
+    @property
+    def generated_at(self):
+        return timezone.datetime.fromisoformat(self.meta['generated_at'])
+
+    def describe(self):
+        """Informations publiques de l'instantané (réponses de l'API)."""
+        return {
+            'generated_at': self.meta['generated_at'],
+            'age_seconds': round((timezone.now() - self.generated_at).total_seconds(), 1),
+            'heroes': self.meta['heroes'],
+        }
+
+
+def get_directory():
+    return getattr(settings, 'HERO_SNAPSHOT_DIR', os.path.join(tempfile.gettempdir(), 'paffmmo-snapshot'))
+
+
+def read_current(directory=None):
+    """Nom de la génération publiée, None s'il n'y en a pas."""
+    try:
+        with open(os.path.join(directory or get_directory(), CURRENT_FILE), encoding='utf-8') as handle:
+            return handle.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def load(generation, directory=None):
+    """Ouvre une génération publiée."""
+    path = os.path.join(directory or get_directory(), generation)
+    with open(os.path.join(path, 'meta.json'), encoding='utf-8') as handle:
+        return HeroSnapshot(path, json.load(handle))
+
+
+def get_snapshot():
+    """
+    Instantané courant du processus, None s'il n'a jamais été construit ;
+    une nouvelle génération est chargée au plus toutes les
+    HERO_SNAPSHOT_CHECK_INTERVAL secondes.
+    """
+    now = time.monotonic()
+    checked_at = _loaded['checked_at']
+    if checked_at is None or now - checked_at >= getattr(settings, 'HERO_SNAPSHOT_CHECK_INTERVAL', 10):
+        _loaded['checked_at'] = now
+        generation = read_current()
+        current = _loaded['snapshot']
+        if generation is None:
+            _loaded['snapshot'] = None
+        elif current is None or current.generation != generation:
+            try:
+                _loaded['snapshot'] = load(generation)
+            except (OSError, ValueError, KeyError):
+                logger.warning("Instantané %s illisible, génération précédente conservée", generation, exc_info=True)
+    return _loaded['snapshot']
+
+
+def get_versions(using=DEFAULT_DB_ALIAS):
+    """Versions SNAPSHOT_VERSIONS de la base `using`."""
+    versions = dict.fromkeys(SNAPSHOT_VERSIONS, 0)
+    versions.update(DataVersion.objects.using(using).filter(name__in=SNAPSHOT_VERSIONS).values_list('name', 'version'))
+    return versions
+
+
+def is_stale(using=DEFAULT_DB_ALIAS, directory=None):
+    """Les héros ont-ils changé depuis la génération publiée ?"""
+    generation = read_current(directory)
+    if generation is None:
+        return True
+    try:
+        meta = load(generation, directory).meta
+    except (OSError, ValueError, KeyError):
+        return True
+    return meta['versions'] != get_versions(using)
+
+
+def build(using=DEFAULT_DB_ALIAS, directory=None, chunk_size=SNAPSHOT_CHUNK_SIZE):
+    """
+    Construit et publie une génération depuis la base `using` ; retourne
+    ses métadonnées. Une seule requête, lue par lots : les colonnes sont
+    cohérentes entre elles (même instant de lecture).
+    """
+    directory = directory or get_directory()
+    os.makedirs(directory, exist_ok=True)
+    versions = get_versions(using)
+    job_classes = list(Hero.JobClass.choices)
+    job_codes = {value: code for code, (value, _) in enumerate(job_classes)}
+    regions = {str(pk): name for pk, name in Region.objects.using(using).values_list('pk', 'name')}
+
+    names = list(SNAPSHOT_COLUMNS)
+    sources = [source for source, _ in SNAPSHOT_COLUMNS.values()]
+    chunks = {name: [] for name in names}
+    rows = Hero.objects.using(using).order_by().values_list(*sources).iterator(chunk_size=chunk_size)
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= chunk_size:
+            _append_chunk(chunks, batch, job_codes)
+            batch = []
+    if batch:
+        _append_chunk(chunks, batch, job_codes)
+
+    generation = timezone.now().strftime('%Y%m%dT%H%M%S%f')
+    staging = tempfile.mkdtemp(prefix='.building-', dir=directory)
+    count = 0
+    for name, (_, dtype) in SNAPSHOT_COLUMNS.items():
+        column = np.concatenate(chunks[name]) if chunks[name] else np.empty(0, dtype=dtype)
+        count = len(column)
+        np.save(os.path.join(staging, f'{name}.npy'), column)
+    meta = {
+        'generation': generation,
+        'generated_at': timezone.now().isoformat(),
+        'heroes': count,
+        'database': using,
+        'versions': versions,
+        'columns': names,
+        'job_classes': job_classes,
+        'regions': regions,
+    }
+    with open(os.path.join(staging, 'meta.json'), 'w', encoding='utf-8') as handle:
+        json.dump(meta, handle, ensure_ascii=False)
+    os.rename(staging, os.path.join(directory, generation))
+    _publish(directory, generation)
+    _cleanup(directory)
+    return meta
+
+
+def _append_chunk(chunks, batch, job_codes):
+    """Convertit un lot de lignes en un tableau par colonne."""
+    columns = dict(zip(SNAPSHOT_COLUMNS, zip(*batch)))
+    columns['job_class'] = [job_codes.get(value, -1) for value in columns['job_class']]
+    columns['region'] = [-1 if value is None else value for value in columns['region']]
+    columns['created_at'] = [int(value.timestamp()) for value in columns['created_at']]
+    for name, (_, dtype) in SNAPSHOT_COLUMNS.items():
+        chunks[name].append(np.asarray(columns[name], dtype=dtype))
+
+
+def _publish(directory, generation):
+    """Remplace atomiquement le pointeur CURRENT."""
+    descriptor, path = tempfile.mkstemp(prefix='.current-', dir=directory)
+    with os.fdopen(descriptor, 'w', encoding='utf-8') as handle:
+        handle.write(generation)
+    os.replace(path, os.path.join(directory, CURRENT_FILE))
+
+
+def _cleanup(directory):
+    """Supprime les générations au-delà des SNAPSHOT_KEEP plus récentes."""
+    generations = sorted(
+        name for name in os.listdir(directory)
+        if not name.startswith('.') and os.path.isdir(os.path.join(directory, name))
+    )
+    for name in generations[:-SNAPSHOT_KEEP]:
+        shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
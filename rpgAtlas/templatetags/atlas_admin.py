@@ -0,0 +1,130 @@
+"""
+PAFFMMO - Balises de l'admin
+============================
+Variantes des balises date_hierarchy et pagination de l'admin pour les
+ChangeList à grande échelle (voir rpgAtlas.adminlist).
+"""
+import datetime
+
+from django import template
+from django.contrib.admin.templatetags.admin_list import pagination
+from django.contrib.admin.templatetags.base import InclusionAdminNode
+from django.contrib.admin.views.main import PAGE_VAR
+from django.db import models
+from django.utils import formats, timezone
+from django.utils.text import capfirst
+from django.utils.translation import gettext as _
+
+from ..adminlist import CURSOR_VAR, date_bounds, date_periods
+
+
+register = template.Library()
+
+
+def indexed_date_hierarchy(cl):
+    """
+    date_hierarchy de l'admin dont les années, mois et jours proposés sont
+    lus dans l'index de la date (date_bounds, date_periods).
+    """
+    field_name = cl.date_hierarchy
+    field = cl.model._meta.get_field(field_name)
+    year_field = f'{field_name}__year'
+    month_field = f'{field_name}__month'
+    day_field = f'{field_name}__day'
+    year_lookup = cl.params.get(year_field)
+    month_lookup = cl.params.get(month_field)
+    day_lookup = cl.params.get(day_field)
+
+    def link(filters):
+        return cl.get_query_string(filters, [f'{field_name}__'])
+
+    first = last = None
+    if not (year_lookup or month_lookup or day_lookup):
+        # Niveau de départ : l'année, voire le mois, si toutes les dates y tombent
+        first, last = date_bounds(cl.queryset, field_name)
+        if first is None:
+            return {'show': True, 'back': None, 'choices': []}
+        if isinstance(field, models.DateTimeField) and timezone.is_aware(first):
+            first, last = timezone.localtime(first), timezone.localtime(last)
+        if first.year == last.year:
+            year_lookup = first.year
+            if first.month == last.month:
+                month_lookup = first.month
+
+    if year_lookup and month_lookup and day_lookup:
+        day = datetime.date(int(year_lookup), int(month_lookup), int(day_lookup))
+        return {
+            'show': True,
+            'back': {
+                'link': link({year_field: year_lookup, month_field: month_lookup}),
+                'title': capfirst(formats.date_format(day, 'YEAR_MONTH_FORMAT')),
+            },
+            'choices': [{'title': capfirst(formats.date_format(day, 'MONTH_DAY_FORMAT'))}],
+        }
+    if year_lookup and month_lookup:
+        days = date_periods(cl.queryset, field_name, 'day', year=int(year_lookup), month=int(month_lookup))
+        return {
+            'show': True,
+            'back': {'link': link({year_field: year_lookup}), 'title': str(year_lookup)},
+            'choices': [
+                {
+                    'link': link({year_field: year_lookup, month_field: month_lookup, day_field: day.day}),
+                    'title': capfirst(formats.date_format(day, 'MONTH_DAY_FORMAT')),
+                }
+                for day in days
+            ],
+        }
+    if year_lookup:
+        months = date_periods(cl.queryset, field_name, 'month', year=int(year_lookup))
+        return {
+            'show': True,
+            'back': {'link': link({}), 'title': _('All dates')},
+            'choices': [
+                {
+                    'link': link({year_field: year_lookup, month_field: month.month}),
+                    'title': capfirst(formats.date_format(month, 'YEAR_MONTH_FORMAT')),
+                }
+                for month in months
+            ],
+        }
+    years = date_periods(cl.queryset, field_name, 'year', first=first, last=last)
+    return {
+        'show': True,
+        'back': None,
+        'choices': [
+            {'link': link({year_field: str(year.year)}), 'title': str(year.year)}
+            for year in years
+        ],
+    }
+
+
+def keyset_pagination(cl):
+    """
+    Pagination de l'admin : numéros de page tant que la liste est parcourue
+    par OFFSET, puis liens « précédent / suivant » par clé.
+    """
+    context = pagination(cl)
+    if cl.cursor is not None:
+        context['page_range'] = []
+        context['first_url'] = cl.get_query_string(remove=[CURSOR_VAR, PAGE_VAR])
+    if context['pagination_required'] and cl.keyset_ordering:
+        rows = list(cl.result_list)
+        if rows and cl.has_next and len(rows) >= cl.list_per_page:
+            context['next_url'] = cl.keyset_url(rows[-1])
+        if rows and cl.has_previous:
+            context['previous_url'] = cl.keyset_url(rows[0], reverse=True)
+    return context
+
+
+@register.tag(name='indexed_date_hierarchy')
+def indexed_date_hierarchy_tag(parser, token):
+    return InclusionAdminNode(
+        parser, token, func=indexed_date_hierarchy, template_name='date_hierarchy.html', takes_context=False
+    )
+
+
+@register.tag(name='keyset_pagination')
+def keyset_pagination_tag(parser, token):
+    return InclusionAdminNode(
+        parser, token, func=keyset_pagination, template_name='keyset_pagination.html', takes_context=False
+    )
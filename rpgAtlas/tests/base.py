@@ -0,0 +1,85 @@
+"""
+PAFFMMO - Outils des tests
+==========================
+Réglages communs aux tests de l'API (caches partagés entre processus
+désactivés, instantané analytique isolé) et petit jeu de données.
+"""
+import importlib
+import os
+import tempfile
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+from django.urls import clear_url_caches
+
+from rpgAtlas.models import Hero, Region, Skill
+
+
+TEST_SETTINGS = {
+    # Le cache fichier survivrait d'un test à l'autre
+    'API_RESPONSE_CACHE': None,
+    'HERO_DETAIL_CACHE_SIZE': 0,
+    'QUERY_SHAPES_ENABLED': False,
+    'HERO_SNAPSHOT_DIR': os.path.join(tempfile.gettempdir(), 'paffmmo-test-snapshot'),
+    # Pas de manifeste des fichiers statiques hors collectstatic
+    'STORAGES': {
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    },
+}
+
+api_test_settings = override_settings(**TEST_SETTINGS)
+
+
+def create_world(heroes=6):
+    """Deux régions, trois compétences et `heroes` héros répartis entre elles."""
+    regions = [
+        Region.objects.create(name='Forêt', environment_type='forest'),
+        Region.objects.create(name='Désert', environment_type='desert'),
+    ]
+    skills = [
+        Skill.objects.create(name='Boule de feu', damage_type='magical', mana_cost=10),
+        Skill.objects.create(name='Coup d\'épée', damage_type='physical'),
+        Skill.objects.create(name='Soin', damage_type='healing', mana_cost=5),
+    ]
+    job_classes = [value for value, _ in Hero.JobClass.choices]
+    created = []
+    for index in range(heroes):
+        hero = Hero.objects.create(
+            nickname=f'Héros {index}',
+            job_class=job_classes[index % len(job_classes)],
+            level=index + 1,
+            hp_current=50,
+            xp=index * 100,
+            gold=index * 10,
+            is_active=index % 3 != 0,
+            biography=f'Un dragon a croisé la route du héros numéro {index}.',
+            region=regions[index % 2],
+        )
+        hero.skills.set(skills[:index % 3 + 1])
+        created.append(hero)
+    return {'regions': regions, 'skills': skills, 'heroes': created}
+
+
+def create_staff_user():
+    return get_user_model().objects.create_user('staff', password='staff', is_staff=True, is_superuser=True)
+
+
+@contextmanager
+def async_api_urls():
+    """Routes de l'API construites avec API_ASYNC_VIEWS actif (comme sous ASGI)."""
+    from rpgAtlas import urls
+    from paffmmo_project import urls as project_urls
+
+    def reload():
+        importlib.reload(urls)
+        importlib.reload(project_urls)
+        clear_url_caches()
+
+    try:
+        with override_settings(API_ASYNC_VIEWS=True):
+            reload()
+            yield urls
+    finally:
+        reload()
@@ -0,0 +1,82 @@
+"""
+PAFFMMO - Conseil d'index
+=========================
+Plans retenus sur un index ne couvrant qu'une partie des colonnes
+d'égalité et de tri de la forme.
+"""
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+
+from rpgAtlas.management.commands.advise_indexes import propose_index
+from rpgAtlas.models import Hero, QueryShape
+
+from .base import api_test_settings, create_world
+
+
+def record_shape(action='list', equality=(), ordering=('-created_at',), sample=None):
+    shape = {
+        'action': action, 'equality': list(equality), 'range': [],
+        'search': False, 'ordering': list(ordering),
+    }
+    return QueryShape.objects.create(key=repr(shape), action=action, shape=shape, sample=sample or {}, count=1)
+
+
+def advise(*args):
+    output = StringIO()
+    call_command('advise_indexes', *args, stdout=output)
+    return output.getvalue()
+
+
+def record_filtered_shape(region):
+    """Forme de ?job_class=mage&is_active=true&region=<id>&ordering=-level."""
+    return record_shape(
+        equality=['is_active=True', 'job_class', 'region'], ordering=['-level'],
+        sample={'job_class': 'mage', 'is_active': 'true', 'region': str(region.pk), 'ordering': '-level'},
+    )
+
+
+@api_test_settings
+class AdviseIndexesTests(TestCase):
+
+    def setUp(self):
+        self.world = create_world()
+
+    def test_partially_covering_index_gets_composite_proposal(self):
+        record_filtered_shape(self.world['regions'][0])
+        output = advise()
+        self.assertNotIn('Plan correct', output)
+        self.assertIn('sans is_active, job_class', output)
+        self.assertIn("fields=['job_class', 'region', '-level']", output)
+        self.assertIn('condition=Q(is_active=True)', output)
+
+    def test_covering_index_is_correct(self):
+        record_shape(
+            equality=['job_class'], ordering=['-level', '-xp'],
+            sample={'job_class': 'mage', 'ordering': '-level,-xp'},
+        )
+        output = advise()
+        self.assertIn('Plan correct', output)
+        self.assertIn('Aucun index à ajouter.', output)
+
+
+@api_test_settings
+class ApplyIndexesTests(TransactionTestCase):
+    """--apply crée les index : hors transaction (éditeur de schéma SQLite)."""
+
+    def test_applied_proposal_covers_the_shape(self):
+        world = create_world()
+        stat = record_filtered_shape(world['regions'][0])
+        index = propose_index(stat.shape, connection.features.supports_partial_indexes)
+        self.addCleanup(self.drop_index, index)
+        output = advise('--apply')
+        self.assertIn('1 index créés', output)
+        after = output.split('(après création)')[1]
+        self.assertIn(index.name, after)
+        self.assertNotIn(' sans ', after)
+
+    def drop_index(self, index):
+        with connection.schema_editor() as editor:
+            editor.remove_index(Hero, index)
@@ -0,0 +1,131 @@
+"""
+PAFFMMO - Déploiement ASGI
+==========================
+Chaîne de middlewares entièrement asynchrone sous ASGI (aucune
+adaptation en synchrone), budgets et épinglage des écritures en mode
+asynchrone, et débit sous de nombreuses requêtes lentes simultanées.
+"""
+import asyncio
+import json
+import threading
+import time
+from unittest import mock
+
+from asgiref.testing import ApplicationCommunicator
+from django.core.handlers.asgi import ASGIHandler
+from django.db.backends.signals import connection_created
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from rpgAtlas import routers
+from rpgAtlas.tests.base import api_test_settings, async_api_urls, create_staff_user, create_world
+from rpgAtlas.views import HeroViewSet
+
+
+# Middlewares du projet actifs (budgets et routage des réplicas)
+MIDDLEWARE_SETTINGS = {'QUERY_BUDGET_MODE': 'raise', 'DATABASE_REPLICAS': ['default']}
+
+
+@api_test_settings
+@override_settings(**MIDDLEWARE_SETTINGS)
+class AsyncMiddlewareTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.world = create_world()
+        cls.user = create_staff_user()
+
+    def test_middleware_chain_is_not_adapted(self):
+        # En DEBUG, Django journalise chaque passage d'un mode à l'autre
+        with override_settings(DEBUG=True), self.assertNoLogs('django.request', 'DEBUG'):
+            ASGIHandler().load_middleware(is_async=True)
+
+    async def test_query_budget_counts_async_queries(self):
+        with mock.patch.object(routers, 'choose_replica', return_value=None), async_api_urls():
+            response = await self.async_client.get('/api/heroes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(int(response['X-Query-Count']), 0)
+        self.assertLessEqual(int(response['X-Query-Count']), HeroViewSet.query_budget['list'])
+
+    async def test_write_pins_client_to_primary(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.post(
+            '/api/heroes/combat-tick/',
+            {'heroes': [{'hero_id': self.world['heroes'][0].pk, 'delta': 5}]},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(routers.PIN_COOKIE, response.cookies)
+        self.assertGreater(int(response['X-Query-Count']), 0)
+
+
+@api_test_settings
+@override_settings(QUERY_BUDGET_MODE='warn')
+class ConcurrencyTests(TransactionTestCase):
+    """
+    Requêtes lentes (attente de la base) servies simultanément par un seul
+    processus : vraie vue des statistiques, latence ajoutée à chaque
+    requête SQL des connexions ouvertes pendant le test.
+    """
+
+    requests = 50
+    delay = 0.1
+
+    def setUp(self):
+        create_world()
+        self.lock = threading.Lock()
+        self.in_flight = self.peak = self.queries = 0
+        connection_created.connect(self.add_latency)
+        self.addCleanup(connection_created.disconnect, self.add_latency)
+
+    def add_latency(self, sender, connection, **kwargs):
+        connection.execute_wrappers.append(self.slow_query)
+
+    def slow_query(self, execute, sql, params, many, context):
+        with self.lock:
+            self.in_flight += 1
+            self.queries += 1
+            self.peak = max(self.peak, self.in_flight)
+        try:
+            time.sleep(self.delay)
+            return execute(sql, params, many, context)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    async def request(self, application, path, query_string=b''):
+        communicator = ApplicationCommunicator(application, {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': query_string,
+            'root_path': '',
+            'headers': [(b'host', b'testserver'), (b'accept', b'application/json')],
+            'client': ('127.0.0.1', 1234),
+            'server': ('testserver', 80),
+        })
+        await communicator.send_input({'type': 'http.request', 'body': b'', 'more_body': False})
+        start = await communicator.receive_output(timeout=30)
+        body = await communicator.receive_output(timeout=30)
+        await communicator.wait(timeout=30)
+        return start['status'], json.loads(body['body'])
+
+    async def test_slow_requests_run_concurrently(self):
+        # Filtre sur les HP : statistiques calculées sur la table des héros
+        with async_api_urls():
+            application = ASGIHandler()
+            start = time.perf_counter()
+            results = await asyncio.gather(*[
+                self.request(application, '/api/heroes/stats/', b'min_hp_pct=0')
+                for _ in range(self.requests)
+            ])
+            elapsed = time.perf_counter() - start
+
+        self.assertEqual({status for status, _ in results}, {200})
+        self.assertEqual({body['total_heroes'] for _, body in results}, {6})
+        # Les requêtes SQL des différentes requêtes HTTP se chevauchent
+        self.assertGreaterEqual(self.peak, self.requests // 2)
+        self.assertLess(elapsed, self.delay * self.queries / 5)
@@ -0,0 +1,119 @@
+"""
+PAFFMMO - Routes asynchrones
+============================
+Sous ASGI (API_ASYNC_VIEWS), chaque route du routeur doit servir la même
+action que sous WSGI : la route de détail asynchrone ne doit pas capturer
+les actions de liste (leaderboard, export, combat-tick). Sous WSGI, les
+actions en lecture exécutent leur implémentation asynchrone.
+"""
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.test import TestCase
+from django.urls import resolve, reverse
+from rest_framework.response import Response
+
+from rpgAtlas import urls
+from rpgAtlas.tests.base import api_test_settings, async_api_urls, create_staff_user, create_world
+
+
+@api_test_settings
+class AsyncRoutesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.world = create_world()
+        cls.user = create_staff_user()
+
+    def router_routes(self):
+        """
+        (nom, kwargs, {méthode: action}, classe) de chaque route du routeur
+        (les variantes à suffixe de format reprennent les mêmes routes).
+        """
+        hero = self.world['heroes'][0]
+        routes = []
+        for pattern in urls.router.urls:
+            groups = pattern.pattern.regex.groupindex
+            if 'format' in groups:
+                continue
+            kwargs = {'pk': hero.pk} if 'pk' in groups else {}
+            callback = pattern.callback
+            # as_view() ajoute HEAD au mapping à la première requête
+            actions = {
+                method: action for method, action in (getattr(callback, 'actions', None) or {}).items()
+                if method != 'head'
+            }
+            routes.append((pattern.name, kwargs, actions, callback.cls))
+        return routes
+
+    def request(self, client, method, url):
+        if method == 'post':
+            return client.post(url, {}, content_type='application/json')
+        return getattr(client, method)(url)
+
+    def test_every_route_resolves_to_the_same_action(self):
+        routes = self.router_routes()
+        with async_api_urls():
+            for name, kwargs, actions, view_class in routes:
+                url = reverse(name, kwargs=kwargs)
+                match = resolve(url)
+                with self.subTest(url=url):
+                    self.assertIs(match.func.cls, view_class)
+                    for method, action in actions.items():
+                        self.assertEqual(match.func.actions[method], action)
+
+    async def test_every_route_answers_like_wsgi(self):
+        routes = self.router_routes()
+        await sync_to_async(self.client.force_login)(self.user)
+        expected = {}
+        for name, kwargs, actions, _ in routes:
+            url = reverse(name, kwargs=kwargs)
+            for method in actions or {'get': None}:
+                response = await self.async_client_request(method, url, sync=True)
+                expected[method, url] = response.status_code
+
+        await self.async_client.aforce_login(self.user)
+        with async_api_urls():
+            for (method, url), status_code in expected.items():
+                response = await self.async_client_request(method, url)
+                with self.subTest(method=method, url=url):
+                    self.assertNotIn(response.status_code, (404, 405))
+                    self.assertEqual(response.status_code, status_code)
+
+    async def async_client_request(self, method, url, sync=False):
+        if sync:
+            return await sync_to_async(self.request)(self.client, method, url)
+        if method == 'post':
+            return await self.async_client.post(url, {}, content_type='application/json')
+        return await getattr(self.async_client, method)(url)
+
+    async def test_list_actions_are_not_captured_by_detail_route(self):
+        await self.async_client.aforce_login(self.user)
+        with async_api_urls():
+            response = await self.async_client.get('/api/heroes/leaderboard/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['count'], len(self.world['heroes']))
+            response = await self.async_client.post(
+                '/api/heroes/combat-tick/',
+                {'heroes': [{'hero_id': self.world['heroes'][0].pk, 'delta': 10}]},
+                content_type='application/json',
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['total_applied'], 10)
+            response = await self.async_client.get(f"/api/heroes/{self.world['heroes'][0].pk}/")
+            self.assertEqual(response.status_code, 200)
+
+    def test_sync_actions_run_the_async_implementation(self):
+        self.client.force_login(self.user)
+        for name, kwargs, actions, view_class in self.router_routes():
+            action = actions.get('get')
+            if not hasattr(view_class, f'a{action}'):
+                continue
+            url = reverse(name, kwargs=kwargs)
+
+            async def implementation(view, request, *args, **kwargs):
+                return Response({'action': view.action})
+
+            with self.subTest(url=url), mock.patch.object(view_class, f'a{action}', implementation):
+                response = self.client.get(url)
+                self.assertEqual(response.json(), {'action': action})
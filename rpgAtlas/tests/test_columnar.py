@@ -0,0 +1,44 @@
+"""
+PAFFMMO - Export colonnaire
+===========================
+Lecture des compétences d'un lot : plage d'identifiants pour un lot
+dense, listes IN bornées pour un lot clairsemé.
+"""
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from rpgAtlas.columnar import _skill_names
+
+from .base import create_world
+
+
+class SkillNamesTests(TestCase):
+
+    def setUp(self):
+        self.heroes = create_world(heroes=12)['heroes']
+
+    def expected(self, heroes):
+        return [sorted(skill.name for skill in hero.skills.all()) for hero in heroes]
+
+    def skill_names(self, heroes):
+        with CaptureQueriesContext(connection) as queries:
+            names = _skill_names([hero.pk for hero in heroes])
+        return names, [query['sql'] for query in queries.captured_queries]
+
+    def test_dense_batch_reads_a_range(self):
+        names, queries = self.skill_names(self.heroes)
+        self.assertEqual(names, self.expected(self.heroes))
+        self.assertEqual(len(queries), 1)
+        self.assertIn('"hero_id" >=', queries[0])
+        self.assertNotIn(' IN (', queries[0])
+
+    def test_sparse_batch_reads_chunked_in_lists(self):
+        heroes = [self.heroes[0], self.heroes[11]]
+        with mock.patch.object(connection.features, 'max_query_params', 1):
+            names, queries = self.skill_names(heroes)
+        self.assertEqual(names, self.expected(heroes))
+        self.assertEqual(len(queries), 2)
+        self.assertTrue(all(' IN (' in sql and '"hero_id" >=' not in sql for sql in queries))
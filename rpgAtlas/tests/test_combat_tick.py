@@ -0,0 +1,64 @@
+"""
+PAFFMMO - Ticks de combat
+=========================
+Validation des filtres et limite du nombre de héros d'un tick en mode filtre.
+"""
+from unittest import mock
+
+from django.test import TestCase
+
+from rpgAtlas.models import Hero
+from rpgAtlas.serializers import CombatTickSerializer
+from rpgAtlas.tests.base import api_test_settings, create_staff_user, create_world
+
+
+@api_test_settings
+class CombatTickTests(TestCase):
+    url = '/api/heroes/combat-tick/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.world = create_world()
+        cls.user = create_staff_user()
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def tick(self, payload):
+        return self.client.post(self.url, payload, content_type='application/json')
+
+    def assertUnchanged(self):
+        self.assertEqual(set(Hero.objects.values_list('hp_current', flat=True)), {50})
+
+    def test_unknown_filter_is_rejected(self):
+        response = self.tick({'filter': {'bogus': 1}, 'delta': 1})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('bogus', response.json()['filter'])
+        self.assertUnchanged()
+
+    def test_unknown_filter_next_to_a_valid_one_is_rejected(self):
+        response = self.tick({'filter': {'job_class': 'mage', 'regoin': 1}, 'delta': 1})
+        self.assertEqual(response.status_code, 400)
+        self.assertUnchanged()
+
+    def test_filter_mode_requires_a_filter(self):
+        for payload in ({'filter': {}, 'delta': 1}, {'delta': 1}):
+            with self.subTest(payload=payload):
+                self.assertEqual(self.tick(payload).status_code, 400)
+        self.assertUnchanged()
+
+    def test_filter_mode_applies_clamped_delta(self):
+        region = self.world['regions'][0]
+        response = self.tick({'filter': {'region': region.pk}, 'delta': -80})
+        self.assertEqual(response.status_code, 200)
+        heroes = Hero.objects.filter(region=region)
+        self.assertEqual(response.json()['updated'], heroes.count())
+        self.assertEqual(set(heroes.values_list('hp_current', flat=True)), {0})
+        self.assertEqual(set(Hero.objects.exclude(region=region).values_list('hp_current', flat=True)), {50})
+
+    def test_filter_mode_is_bounded(self):
+        with mock.patch.object(CombatTickSerializer, 'MAX_HEROES', 2):
+            response = self.tick({'filter': {'min_level': 1}, 'delta': 10})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('au plus 2', response.json()['filter'])
+        self.assertUnchanged()
@@ -0,0 +1,82 @@
+"""
+PAFFMMO - Requêtes conditionnelles
+==================================
+Validateurs des listes de héros tirés des seules versions DataVersion et
+des paramètres de la requête : ni agrégat ni comptage des héros, une
+seule lecture des versions par requête.
+"""
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from rpgAtlas.models import DataVersion, Hero
+
+from .base import api_test_settings, create_staff_user, create_world
+
+
+@api_test_settings
+class HeroConditionalTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.world = create_world()
+        cls.user = create_staff_user()
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def get(self, url, **headers):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, **headers)
+        return response, [query['sql'] for query in queries.captured_queries]
+
+    def test_lists_do_not_aggregate_the_heroes(self):
+        hero = Hero.objects.first()
+        urls = [
+            '/api/heroes/?pagination=cursor',
+            '/api/heroes/by_class/?class=mage',
+            '/api/heroes/top/',
+            '/api/heroes/leaderboard/',
+            f'/api/heroes/{hero.pk}/rank/',
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response, queries = self.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('ETag', response)
+                for sql in queries:
+                    self.assertNotIn('MAX("rpgAtlas_hero"."updated_at")', sql)
+                    self.assertFalse(
+                        sql.startswith('SELECT COUNT(') and 'FROM "rpgAtlas_hero"' in sql
+                        and 'WHERE' not in sql, sql
+                    )
+
+    def test_not_modified_until_a_hero_changes(self):
+        response, _ = self.get('/api/heroes/?job_class=mage&ordering=-level')
+        etag = response['ETag']
+        # Même requête, paramètres dans un autre ordre
+        response, queries = self.get('/api/heroes/?ordering=-level&job_class=mage', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(queries), 3)  # session, utilisateur, versions
+
+        hero = Hero.objects.first()
+        hero.gold += 1
+        hero.save()
+        response, _ = self.get('/api/heroes/?job_class=mage&ordering=-level', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_deletion_changes_the_etag(self):
+        response, _ = self.get('/api/heroes/')
+        Hero.objects.last().delete()
+        response, _ = self.get('/api/heroes/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(API_RESPONSE_CACHE='default')
+    def test_versions_are_read_once(self):
+        table = DataVersion._meta.db_table
+        for url in ('/api/heroes/', f'/api/heroes/{Hero.objects.first().pk}/', '/api/regions/'):
+            with self.subTest(url=url):
+                response, queries = self.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(sum(f'FROM "{table}"' in sql for sql in queries), 1)
@@ -0,0 +1,41 @@
+"""
+PAFFMMO - Exports de l'admin
+============================
+Disposition des colonnes de l'export CSV et flux asynchrone sous ASGI.
+"""
+import csv
+import io
+
+from asgiref.sync import sync_to_async
+from django.contrib.admin.sites import site
+from django.test import AsyncRequestFactory, RequestFactory, TestCase
+
+from rpgAtlas.exports.csvfile import export_to_csv
+from rpgAtlas.models import Hero
+
+from .base import create_world
+
+
+class CsvExportTests(TestCase):
+
+    def test_columns_are_stable(self):
+        hero = create_world(heroes=1)['heroes'][0]
+        response = export_to_csv(site._registry[Hero], RequestFactory().get('/'), Hero.objects.all())
+        content = b''.join(response.streaming_content).decode('utf-8')
+        header, row = csv.reader(io.StringIO(content))
+        self.assertEqual(header, [
+            'nickname', 'job_class', 'level', 'hp_current', 'xp', 'gold', 'is_active',
+            'biography', 'created_at', 'updated_at', 'region', 'region', 'skills',
+        ])
+        self.assertEqual(row[0], hero.nickname)
+        self.assertEqual(row[10], str(hero.region))
+        self.assertEqual(row[12], 'Boule de feu')
+
+    async def test_streams_asynchronously_under_asgi(self):
+        await sync_to_async(create_world)()
+        response = export_to_csv(site._registry[Hero], AsyncRequestFactory().get('/'), Hero.objects.all())
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk in response.streaming_content]).decode('utf-8')
+        rows = list(csv.reader(io.StringIO(content)))
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(rows[0][0], 'nickname')
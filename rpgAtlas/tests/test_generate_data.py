@@ -0,0 +1,82 @@
+"""
+PAFFMMO - Génération de données
+===============================
+Reprise du mode --bulk après une interruption survenue entre la
+validation d'un lot et l'enregistrement de la progression, et
+pseudonymes départagés sans requête par conflit.
+"""
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from rpgAtlas.management.commands.generate_data import Command
+from rpgAtlas.models import Hero
+
+
+class Crash(Exception):
+    pass
+
+
+def generate(*args):
+    call_command('generate_data', '--bulk', '--heroes=20', '--batch-size=5', '--seed=7', *args, stdout=StringIO())
+
+
+class BulkGenerationTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.progress_file = os.path.join(directory.name, 'progress.json')
+
+    def test_resume_skips_batch_committed_before_the_crash(self):
+        save_progress = Command._save_progress
+
+        def crash_after_second_commit(command, path, progress):
+            if progress['completed_batches'] == 2 and 'pending_nickname' not in progress:
+                raise Crash
+            save_progress(command, path, progress)
+
+        with mock.patch.object(Command, '_save_progress', crash_after_second_commit), \
+                self.assertRaises(Crash):
+            generate(f'--progress-file={self.progress_file}')
+        self.assertEqual(Hero.objects.count(), 10)
+
+        generate(f'--progress-file={self.progress_file}')
+        self.assertEqual(Hero.objects.count(), 20)
+        self.assertFalse(os.path.exists(self.progress_file))
+
+    def test_resume_replays_batch_rolled_back(self):
+        insert_hero_batch = Command._insert_hero_batch
+        calls = []
+
+        def crash_in_third_batch(command, rows):
+            calls.append(rows)
+            if len(calls) == 3:
+                raise Crash
+            return insert_hero_batch(command, rows)
+
+        with mock.patch.object(Command, '_insert_hero_batch', crash_in_third_batch), \
+                self.assertRaises(Crash):
+            generate(f'--progress-file={self.progress_file}')
+        self.assertEqual(Hero.objects.count(), 10)
+
+        generate(f'--progress-file={self.progress_file}')
+        self.assertEqual(Hero.objects.count(), 20)
+
+    def test_nickname_conflicts_are_checked_per_batch(self):
+        generate()
+        generate()
+        with CaptureQueriesContext(connection) as queries:
+            # Même graine : pseudonymes et pseudonymes suffixés déjà pris
+            generate()
+        self.assertEqual(Hero.objects.count(), 60)
+        self.assertEqual(Hero.objects.values('nickname').distinct().count(), 60)
+        lookups = [query for query in queries.captured_queries if '"nickname" IN' in query['sql']]
+        self.assertLessEqual(len(lookups), 4 * 3)
+        self.assertFalse([query for query in queries.captured_queries if '"nickname" = ' in query['sql']])
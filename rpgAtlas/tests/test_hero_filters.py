@@ -0,0 +1,82 @@
+"""
+PAFFMMO - Filtres de la liste des héros
+=======================================
+Paramètres numériques invalides (texte, nan, inf) refusés par un 400,
+avant le cache des réponses et les requêtes conditionnelles.
+"""
+from django.test import TestCase
+
+from rpgAtlas.tests.base import api_test_settings, create_staff_user, create_world
+
+
+@api_test_settings
+class HeroFilterTests(TestCase):
+    url = '/api/heroes/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.world = create_world()
+        cls.user = create_staff_user()
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_invalid_numbers_are_rejected(self):
+        for name in ('min_hp_pct', 'max_hp_pct', 'min_level', 'max_level'):
+            for value in ('abc', 'nan', 'inf', '-Infinity'):
+                with self.subTest(name=name, value=value):
+                    response = self.client.get(self.url, {name: value})
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIn(name, response.json())
+
+    def test_export_rejects_invalid_numbers(self):
+        response = self.client.get(f'{self.url}export/', {'min_hp_pct': 'nan'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_valid_ranges_filter(self):
+        response = self.client.get(self.url, {'min_hp_pct': '0', 'max_hp_pct': '100.0', 'min_level': '3'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            sorted(hero['level'] for hero in response.json()['results']),
+            [3, 4, 5, 6],
+        )
+
+    def test_leaderboard_rejects_invalid_params(self):
+        for params in ({'region': 'abc'}, {'region': '0'}, {'start': 'x'}, {'page_size': '-1'}):
+            with self.subTest(params=params):
+                response = self.client.get(f'{self.url}leaderboard/', params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(next(iter(params)), response.json())
+
+    def test_invalid_params_never_get_a_304(self):
+        response = self.client.get(f'{self.url}leaderboard/', {'region': 'abc'}, HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, 400)
+
+    def test_stats_rejects_invalid_params(self):
+        for params in ({'min_level': 'abc'}, {'max_level': '-1'}, {'region': 'abc'}, {'region': '0'}):
+            with self.subTest(params=params):
+                response = self.client.get(f'{self.url}stats/', params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(next(iter(params)), response.json())
+
+    def test_stats_filters_rollups(self):
+        response = self.client.get(f'{self.url}stats/', {'min_level': '3', 'max_level': '5'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['total_heroes'], 3)
+
+    def test_invalid_region_is_rejected(self):
+        for url, params in ((self.url, {}), (f'{self.url}top/', {}), (f'{self.url}by_class/', {'class': 'mage'})):
+            for value in ('abc', '0'):
+                with self.subTest(url=url, value=value):
+                    response = self.client.get(url, {**params, 'region': value})
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIn('region', response.json())
+
+    def test_top_rejects_invalid_limit(self):
+        for value in ('abc', '-3', '0'):
+            with self.subTest(value=value):
+                response = self.client.get(f'{self.url}top/', {'limit': value})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('limit', response.json())
+        response = self.client.get(f'{self.url}top/', {'limit': '2'})
+        self.assertEqual([hero['level'] for hero in response.json()], [6, 5])
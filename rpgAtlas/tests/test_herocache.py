@@ -0,0 +1,33 @@
+"""
+PAFFMMO - Cache des fiches de héros
+===================================
+Compteurs du cache journalisés par chaque processus lors des
+revalidations.
+"""
+from django.test import TestCase
+
+from rpgAtlas.herocache import DetailEntry, HeroDetailCache
+
+
+class HeroDetailCacheStatsTests(TestCase):
+
+    def test_counters_are_logged_when_due(self):
+        cache = HeroDetailCache(maxsize=1, revalidate_interval=0, log_interval=60)
+        cache.set(1, DetailEntry(None, ({'heroes': 0}, None), {}))
+        cache.set(2, DetailEntry(None, ({'heroes': 0}, None), {}))
+        cache.get(2)
+        cache.get(1)
+        with self.assertNoLogs('rpgAtlas.herocache', 'INFO'):
+            cache.revalidate()
+
+        cache._logged -= 60
+        with self.assertLogs('rpgAtlas.herocache', 'INFO') as logs:
+            cache.revalidate()
+        message = logs.output[0]
+        self.assertIn('1 succès, 1 échecs (50 % de succès), 1 évictions', message)
+
+    def test_logging_can_be_disabled(self):
+        cache = HeroDetailCache(maxsize=1, revalidate_interval=0)
+        cache._logged -= 3600
+        with self.assertNoLogs('rpgAtlas.herocache', 'INFO'):
+            cache.revalidate()
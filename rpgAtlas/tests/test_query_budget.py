@@ -0,0 +1,159 @@
+"""
+PAFFMMO - Budgets de requêtes
+=============================
+Chaque action des ViewSets de héros, régions et compétences reste dans son
+budget (QUERY_BUDGET_MODE='raise' : un dépassement fait échouer le test),
+et le nombre de requêtes ne dépend pas du nombre de héros (pas de N+1).
+Les changelists de l'admin sont épinglées par assertNumQueries.
+"""
+from django.contrib import admin
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from rpgAtlas.models import Hero, Region, Skill
+from rpgAtlas.tests.base import api_test_settings, async_api_urls, create_staff_user, create_world
+from rpgAtlas.views import HeroViewSet, RegionViewSet, SkillViewSet
+
+
+class BudgetTestMixin:
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.world = create_world()
+        cls.user = create_staff_user()
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def add_heroes(self, count):
+        """Héros supplémentaires, chacun avec ses compétences."""
+        start = Hero.objects.count()
+        for index in range(start, start + count):
+            hero = Hero.objects.create(
+                nickname=f'Renfort {index}', job_class='mage', level=index % 50 + 1,
+                biography='Un dragon de plus.', region=self.world['regions'][index % 2],
+            )
+            hero.skills.set(self.world['skills'])
+
+
+@api_test_settings
+@override_settings(QUERY_BUDGET_MODE='raise')
+class ApiQueryBudgetTests(BudgetTestMixin, TestCase):
+
+    def cases(self):
+        """{ViewSet: {action: [(méthode, url, corps)]}} de toutes les actions budgétées."""
+        hero = self.world['heroes'][0].pk
+        region = self.world['regions'][0].pk
+        skill = self.world['skills'][0].pk
+        return {
+            HeroViewSet: {
+                'list': [
+                    ('get', '/api/heroes/', None),
+                    ('get', '/api/heroes/?search=dragon', None),
+                    ('get', '/api/heroes/?job_class=mage&is_active=true&ordering=-level', None),
+                    ('get', '/api/heroes/?pagination=cursor', None),
+                    ('get', '/api/heroes/?fields=id,nickname,region_name', None),
+                ],
+                'retrieve': [('get', f'/api/heroes/{hero}/', None)],
+                'by_class': [('get', '/api/heroes/by_class/?class=mage', None)],
+                'stats': [('get', '/api/heroes/stats/', None), ('get', '/api/stats/?min_hp_pct=10', None)],
+                'top': [('get', '/api/heroes/top/?limit=20', None)],
+                'leaderboard': [
+                    ('get', '/api/heroes/leaderboard/', None),
+                    ('get', f'/api/heroes/leaderboard/?region={region}&start=2', None),
+                ],
+                'rank': [('get', f'/api/heroes/{hero}/rank/', None)],
+                'combat_tick': [
+                    ('post', '/api/heroes/combat-tick/', {'filter': {'region': region}, 'delta': -5}),
+                    ('post', '/api/heroes/combat-tick/', {'heroes': [{'hero_id': hero, 'delta': 5}]}),
+                ],
+            },
+            RegionViewSet: {
+                'list': [('get', '/api/regions/', None), ('get', '/api/regions/?ordering=-heroes_count', None)],
+                'retrieve': [('get', f'/api/regions/{region}/', None)],
+            },
+            SkillViewSet: {
+                'list': [('get', '/api/skills/', None), ('get', '/api/skills/?damage_type=magical', None)],
+                'retrieve': [('get', f'/api/skills/{skill}/', None)],
+            },
+        }
+
+    def request(self, method, url, data):
+        if method == 'post':
+            return self.client.post(url, data, content_type='application/json')
+        return self.client.get(url)
+
+    def query_counts(self):
+        counts = {}
+        for viewset, actions in self.cases().items():
+            for action, requests in actions.items():
+                for method, url, data in requests:
+                    response = self.request(method, url, data)
+                    with self.subTest(url=url):
+                        self.assertEqual(response.status_code, 200)
+                        self.assertLessEqual(int(response['X-Query-Count']), viewset.query_budget[action])
+                    counts[url] = int(response['X-Query-Count'])
+        return counts
+
+    def test_every_action_has_a_pinned_budget(self):
+        for viewset, actions in self.cases().items():
+            with self.subTest(viewset=viewset.__name__):
+                self.assertEqual(set(actions), set(viewset.query_budget))
+
+    def test_actions_stay_within_budget(self):
+        self.query_counts()
+
+    def test_query_count_does_not_grow_with_heroes(self):
+        before = self.query_counts()
+        self.add_heroes(30)
+        self.assertEqual(self.query_counts(), before)
+
+    async def test_async_actions_stay_within_budget(self):
+        await self.async_client.aforce_login(self.user)
+        with async_api_urls():
+            for viewset, actions in self.cases().items():
+                for action, requests in actions.items():
+                    for method, url, _ in requests:
+                        if method != 'get':
+                            continue
+                        response = await self.async_client.get(url)
+                        with self.subTest(url=url):
+                            self.assertEqual(response.status_code, 200)
+                            self.assertLessEqual(int(response['X-Query-Count']), viewset.query_budget[action])
+
+    def test_index_runs_no_query(self):
+        self.client.logout()
+        response = self.client.get('/')
+        self.assertEqual(response['X-Query-Count'], '0')
+
+
+@api_test_settings
+class AdminQueryCountTests(BudgetTestMixin, TestCase):
+
+    def budget(self, model, view):
+        return admin.site._registry[model].query_budget[view]
+
+    def test_changelists(self):
+        for model in (Hero, Region, Skill):
+            url = f'/admin/rpgAtlas/{model._meta.model_name}/'
+            with self.subTest(url=url):
+                with self.assertNumQueries(self.budget(model, 'changelist')):
+                    self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_changelists_do_not_grow_with_heroes(self):
+        self.add_heroes(30)
+        self.test_changelists()
+        with self.assertNumQueries(self.budget(Hero, 'changelist')):
+            self.client.get('/admin/rpgAtlas/hero/?q=dragon&job_class__exact=mage')
+
+    def test_change_views(self):
+        for obj in (self.world['heroes'][0], self.world['regions'][0], self.world['skills'][0]):
+            url = f'/admin/rpgAtlas/{obj._meta.model_name}/{obj.pk}/change/'
+            with self.subTest(url=url), override_settings(QUERY_BUDGET_MODE='raise'):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_dashboard(self):
+        with override_settings(QUERY_BUDGET_MODE='raise'):
+            self.assertEqual(self.client.get('/admin/rpgAtlas/hero/dashboard/').status_code, 200)
+            self.assertEqual(self.client.get('/admin/rpgAtlas/hero/dashboard/data/').status_code, 200)
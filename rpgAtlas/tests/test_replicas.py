@@ -0,0 +1,90 @@
+"""
+PAFFMMO - Retard des réplicas
+=============================
+Versions exigées des réplicas, y compris pour un compteur incrémenté en
+continu sur la base principale, et épinglage limité aux écritures des
+modèles de l'application.
+"""
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.sessions.models import Session
+from django.test import SimpleTestCase
+from django.utils import timezone
+
+from rpgAtlas import routers
+from rpgAtlas.models import Hero
+
+
+class RequiredVersionsTests(SimpleTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(routers, '_seen_versions', {})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.start = timezone.now()
+
+    def at(self, seconds):
+        return self.start + timedelta(seconds=seconds)
+
+    def required(self, now, *rows):
+        return routers.required_versions(rows, self.at(now) - timedelta(seconds=2))
+
+    def test_idle_counter_is_required(self):
+        self.assertEqual(self.required(10, ('regions', 4, self.at(0))), {'regions': 4})
+
+    def test_recent_counter_is_not_required_yet(self):
+        self.assertEqual(self.required(1, ('regions', 4, self.at(0))), {})
+
+    def test_counter_bumped_continuously_is_still_checked(self):
+        # 'hero_rows' incrémenté avant chaque vérification (toutes les 5 s)
+        self.assertEqual(self.required(0, ('hero_rows', 10, self.at(0))), {})
+        self.assertEqual(self.required(5, ('hero_rows', 510, self.at(5))), {'hero_rows': 10})
+        self.assertEqual(self.required(10, ('hero_rows', 900, self.at(10))), {'hero_rows': 510})
+        # Historique borné : seule la version exigée et les plus récentes restent
+        self.assertEqual([version for _, version in routers._seen_versions['hero_rows']], [510, 900])
+
+    def test_restored_primary_resets_history(self):
+        self.required(0, ('hero_rows', 500, self.at(0)))
+        self.assertEqual(self.required(5, ('hero_rows', 3, self.at(5))), {})
+        self.assertEqual(self.required(10, ('hero_rows', 3, self.at(5))), {'hero_rows': 3})
+
+    def test_lagging_replica_is_unhealthy_under_steady_writes(self):
+        versions = {'default': [('hero_rows', 10, self.at(0))], 'replica1': [('hero_rows', 10, self.at(0))]}
+
+        def values_list(alias):
+            rows = versions[alias]
+            queryset = mock.Mock()
+            queryset.values_list.side_effect = lambda *fields: (
+                rows if len(fields) == 3 else [row[:2] for row in rows]
+            )
+            return queryset
+
+        with mock.patch('rpgAtlas.models.DataVersion.objects') as manager, \
+                mock.patch.object(timezone, 'now', return_value=self.at(0)):
+            manager.using.side_effect = values_list
+            self.assertEqual(routers.check_replicas(['replica1']), {'replica1': True})
+        # La base principale avance de 500 versions, le réplica ne suit plus
+        versions['default'] = [('hero_rows', 510, self.at(5))]
+        with mock.patch('rpgAtlas.models.DataVersion.objects') as manager, \
+                mock.patch.object(timezone, 'now', return_value=self.at(5)):
+            manager.using.side_effect = values_list
+            self.assertEqual(routers.check_replicas(['replica1']), {'replica1': True})
+        versions['default'] = [('hero_rows', 900, self.at(10))]
+        with mock.patch('rpgAtlas.models.DataVersion.objects') as manager, \
+                mock.patch.object(timezone, 'now', return_value=self.at(10)):
+            manager.using.side_effect = values_list
+            self.assertEqual(routers.check_replicas(['replica1']), {'replica1': False})
+
+
+class WritePinningTests(SimpleTestCase):
+
+    def test_only_application_writes_pin_the_client(self):
+        router = routers.ReadReplicaRouter()
+        with routers.use_replica('replica') as state:
+            router.db_for_write(Session)
+            self.assertFalse(state.wrote)
+            self.assertEqual(router.db_for_read(Hero), 'replica')
+            router.db_for_write(Hero)
+            self.assertTrue(state.wrote)
+            self.assertIsNone(router.db_for_read(Hero))
@@ -0,0 +1,158 @@
+"""
+PAFFMMO - Recherche plein texte
+===============================
+Synchronisation de l'index en mémoire avec les écritures faites hors du
+processus (autres workers, bulk_create, suppressions) et résultats non
+tronqués.
+
+
+Backend FTS5 : recherche jointe à la table virtuelle, MATCH évalué une
+seule fois par requête (liste de l'API et admin).
+"""
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from rpgAtlas import conditional, signals
+from rpgAtlas.models import Hero
+from rpgAtlas.search import InvertedIndexBackend, SQLiteFTS5Backend
+
+from .base import api_test_settings, create_staff_user, create_world
+
+
+@api_test_settings
+class InvertedIndexBackendTests(TestCase):
+
+    def setUp(self):
+        self.world = create_world()
+        # Instance absente des signaux : elle voit les écritures comme
+        # celles d'un autre worker
+        with self.assertLogs('rpgAtlas.search', 'WARNING'):
+            self.backend = InvertedIndexBackend()
+
+    def search(self, *terms):
+        return set(self.backend.search(Hero.objects.all(), terms).values_list('nickname', flat=True))
+
+    def test_sees_saves_from_other_processes(self):
+        self.assertEqual(self.search('sorcellerie'), set())
+        hero = self.world['heroes'][0]
+        hero.biography = 'Maître de la sorcellerie noire.'
+        hero.save()
+        self.assertEqual(self.search('sorcellerie'), {hero.nickname})
+
+    def test_sees_bulk_create(self):
+        self.assertEqual(self.search('nouveau'), set())
+        region = self.world['regions'][0]
+        Hero.objects.bulk_create([
+            Hero(nickname=f'Nouveau {index}', job_class='mage', region=region)
+            for index in range(3)
+        ])
+        conditional.bump('heroes', 'hero_rows')
+        self.assertEqual(self.search('nouveau'), {'Nouveau 0', 'Nouveau 1', 'Nouveau 2'})
+
+    def test_forgets_deleted_heroes(self):
+        self.assertEqual(len(self.search('dragon')), 6)
+        self.world['heroes'][0].delete()
+        self.assertEqual(len(self.search('dragon')), 5)
+
+    def test_vocabulary_stays_sorted(self):
+        self.search('dragon')
+        hero = self.world['heroes'][1]
+        hero.biography = 'Zéphyr apprivoise une abeille.'
+        hero.save()
+        self.search('dragon')
+        self.assertEqual(self.backend._vocabulary, sorted(self.backend._postings))
+        self.assertIn('abeille', self.backend._vocabulary)
+        self.assertNotIn(hero.pk, self.backend._postings['dragon'])
+
+    def test_results_are_not_truncated(self):
+        region = self.world['regions'][0]
+        Hero.objects.bulk_create([
+            Hero(nickname=f'Recrue {index}', job_class='warrior', region=region)
+            for index in range(1200)
+        ])
+        conditional.bump('heroes', 'hero_rows')
+        results = self.backend.search(Hero.objects.all(), ['recrue'])
+        self.assertEqual(results.count(), 1200)
+
+    def test_ranks_by_term_frequency(self):
+        hero = self.world['heroes'][2]
+        hero.biography = 'Dragon, dragon et encore dragon.'
+        hero.save()
+        ranked = self.backend.search(Hero.objects.all(), ['dragon']).order_by('-search_rank')
+        self.assertEqual(ranked.first().pk, hero.pk)
+
+
+class SetupSearchIndexTests(TestCase):
+
+    def test_uses_migrated_database(self):
+        backend = mock.Mock()
+        with mock.patch.object(signals, 'get_search_backend', return_value=backend), \
+                mock.patch.object(signals, '_hero_tables_exist', return_value=True) as tables_exist:
+            signals.setup_search_index(sender=None, using='default')
+        tables_exist.assert_called_once_with('default')
+        backend.setup.assert_called_once_with('default')
+
+
+@api_test_settings
+class SQLiteFTS5BackendTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.world = create_world()
+        cls.user = create_staff_user()
+
+    def setUp(self):
+        self.backend = SQLiteFTS5Backend()
+
+    def assertSingleMatch(self, sql):
+        self.assertEqual(sql.count(' MATCH '), 1, sql)
+        self.assertMatchNotCorrelated(sql)
+
+    def assertMatchNotCorrelated(self, sql):
+        """La recherche n'est pas réévaluée pour chaque héros candidat."""
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            plan = ' / '.join(row[-1] for row in cursor.fetchall())
+        self.assertNotIn('CORRELATED', plan)
+        # MATCH en boucle externe (M), pas de recherche par rowid (=M)
+        self.assertRegex(plan, r'VIRTUAL TABLE INDEX \d+:M')
+
+    def test_rank_is_read_from_the_join(self):
+        hero = self.world['heroes'][2]
+        hero.biography = 'Dragon, dragon et encore dragon.'
+        hero.save()
+        queryset = self.backend.search(Hero.objects.all(), ['dragon']).order_by('-search_rank', '-id')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(queryset[0].pk, hero.pk)
+            self.assertEqual(queryset.count(), 6)
+        self.assertEqual(len(queries.captured_queries), 2)
+        for query in queries.captured_queries:
+            self.assertSingleMatch(query['sql'])
+
+    def test_api_search_runs_the_match_once(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/heroes/', {'search': 'dragon'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 6)
+        searches = [query['sql'] for query in queries.captured_queries if ' MATCH ' in query['sql']]
+        self.assertTrue(searches)
+        for sql in searches:
+            self.assertSingleMatch(sql)
+
+    def test_admin_search_runs_the_match_once(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/admin/rpgAtlas/hero/', {'q': 'dragon'})
+        self.assertEqual(response.status_code, 200)
+        searches = [query['sql'] for query in queries.captured_queries if ' MATCH ' in query['sql']]
+        self.assertTrue(any('search_rank' in sql for sql in searches))
+        for sql in searches:
+            # Sondes de la hiérarchie par date : un EXISTS par jour
+            if 'EXISTS(' in sql:
+                self.assertMatchNotCorrelated(sql)
+            else:
+                self.assertSingleMatch(sql)
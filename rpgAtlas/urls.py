@@ -1,14 +1,25 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import HeroViewSet, RegionViewSet, SkillViewSet, index
+from .async_views import async_action_view, async_urlpatterns
+from .views import HeroAnalyticsViewSet, HeroViewSet, RegionViewSet, SkillViewSet, index
 
 router = DefaultRouter()
 router.register(r'heroes', HeroViewSet, basename='hero')
 router.register(r'regions', RegionViewSet, basename='region')
 router.register(r'skills', SkillViewSet, basename='skill')
+router.register(r'analytics', HeroAnalyticsViewSet, basename='hero-analytics')
+
+# Sous ASGI : variantes asynchrones des lectures (rpgAtlas.async_views)
+if settings.API_ASYNC_VIEWS:
+    router_urls = async_urlpatterns(router)
+    stats_view = async_action_view(HeroViewSet, 'stats')
+else:
+    router_urls = router.urls
+    stats_view = HeroViewSet.as_view({'get': 'stats'})
 
 urlpatterns = [
-    path('', include(router.urls)),
-    path('stats/', HeroViewSet.as_view({'get': 'stats'}), name='hero-stats'),
+    path('', include(router_urls)),
+    path('stats/', stats_view, name='hero-stats'),
     path('index/', index, name='index'),
 ]
@@ -3,19 +3,39 @@ PAFFMMO - API Views
 ===================
 Compatibilité Django 6.0 & DRF 3.15
 """
-from rest_framework import viewsets, filters, status
+import math
+
+from asgiref.sync import sync_to_async
+from rest_framework import viewsets, filters, permissions, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import APIException, ValidationError as APIValidationError
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from django.http import Http404
 from django.shortcuts import render
-from django.db.models import Avg, Sum, Count, Q
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
+from django.core.exceptions import ValidationError
+from django.db.models import Avg, Count, Sum
 
+from . import columnar, combat, herocache, leaderboard, rollup
+from .async_views import AsyncReadOnlyMixin, sync_action
+from .conditional import (
+    ConditionalGetMixin, DataVersionConditionalMixin, aget_request_versions, conditional_get,
+    make_etag,
+)
 from .models import Hero, Region, Skill
-from .serializers import HeroSerializer, HeroListSerializer, RegionSerializer, SkillSerializer
+from .pagination import KeysetPagination
+from .queryshapes import QueryShapeMixin
+from .responsecache import ResponseCacheMixin, cached_response
+from .routers import ReplicaReadMixin
+from .search import HeroSearchFilter, RankedOrderingFilter
+from .serializers import (
+    HERO_FIELD_PREFETCHES, HERO_FIELD_SOURCES, CombatTickFilterSerializer, CombatTickSerializer,
+    HeroSerializer, HeroListSerializer, HeroListFastSerializer, RegionSerializer, SkillSerializer,
+    get_sparse_fields,
+)
 
 
-class HeroViewSet(viewsets.ReadOnlyModelViewSet):
+class HeroViewSet(QueryShapeMixin, ReplicaReadMixin, ResponseCacheMixin, ConditionalGetMixin, AsyncReadOnlyMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet pour les héros.
     
@@ -25,12 +45,180 @@ class HeroViewSet(viewsets.ReadOnlyModelViewSet):
     - GET /api/heroes/by_class/ : Filtrer par classe
     - GET /api/heroes/stats/ : Statistiques globales
     - GET /api/heroes/top/ : Top héros par niveau
+    - GET /api/heroes/leaderboard/ : Classement (global, par classe ou région)
+    - GET /api/heroes/{id}/rank/ : Rangs d'un héros dans les classements
+    - GET /api/heroes/export/ : Export Parquet / Arrow IPC (authentifié)
+    - POST /api/heroes/combat-tick/ : Soins et dégâts groupés (staff)
+
+    Les actions list, by_class et top acceptent ?pagination=cursor
+    (ou ?cursor=...) pour une pagination par curseur sans COUNT(*).
+
+    list, retrieve, by_class et top gèrent les requêtes conditionnelles
+    (ETag / Last-Modified, 304 Not Modified) ; ces actions et stats sont
+    servies par le cache partagé des réponses tant que les héros, régions
+    et compétences n'ont pas été modifiés.
+
+    Les actions en lecture sont implémentées avec l'ORM asynchrone
+    (alist, aretrieve, ...), servies telles quelles sous ASGI ; les
+    actions synchrones du même nom en sont dérivées (voir async_views).
+
+    list, retrieve, by_class et top acceptent ?fields=id,nickname,level
+    ou ?exclude=biography : la réponse et les colonnes lues sont réduites
+    aux champs demandés (ni jointure de la région ni préchargement des
+    compétences s'ils ne sont pas utilisés).
+
+    retrieve sert en JSON les fiches gardées par le cache LRU du
+    processus (herocache), sans accès à la base pour un héros en cache.
+
+    Les formes de filtres et de tris de list, by_class et top sont
+    relevées pour la commande advise_indexes (voir queryshapes).
     """
     queryset = Hero.objects.select_related('region').prefetch_related('skills')
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [HeroSearchFilter, RankedOrderingFilter]
     search_fields = ['nickname', 'job_class', 'biography']
-    ordering_fields = ['level', 'created_at', 'gold', 'xp', 'hp_current']
+    ordering_fields = ['level', 'created_at', 'gold', 'xp', 'hp_current', 'max_hp', 'hp_percentage']
     ordering = ['-created_at']
+    keyset_pagination_class = KeysetPagination
+    sparse_fields_actions = ('list', 'retrieve', 'by_class', 'top')
+    cache_versions = ('heroes', 'hero_rows')
+    # Totaux de stats calculés sur les héros (filtres sur les HP)
+    live_stats_totals = {
+        'total_heroes': Count('id'),
+        'avg_level': Avg('level'),
+        'total_gold': Sum('gold'),
+        'total_xp': Sum('xp'),
+        'avg_gold': Avg('gold'),
+    }
+    # Budget de requêtes SQL par action (session et utilisateur compris)
+    query_budget = {
+        'list': 6,
+        'retrieve': 7,
+        'by_class': 7,
+        'stats': 6,
+        'top': 6,
+        'leaderboard': 7,
+        'rank': 7,
+        'combat_tick': 9,
+    }
+    leaderboard_page_size = 10
+    leaderboard_max_page_size = 100
+
+    @property
+    def paginator(self):
+        """Bascule sur la pagination par curseur si le client la demande."""
+        if not hasattr(self, '_paginator') and self.use_keyset_pagination():
+            self._paginator = self.keyset_pagination_class()
+        return super().paginator
+
+    def use_keyset_pagination(self):
+        """Indique si la requête demande la pagination par curseur."""
+        params = self.request.query_params
+        return params.get('pagination') == 'cursor' or 'cursor' in params
+
+    async def aget_conditional_validators(self):
+        """
+        Validateurs des requêtes conditionnelles : date de modification du
+        héros (retrieve) et version 'heroes' (suppressions, compétences,
+        régions et compétences modifiées) ; pour les autres actions, les
+        seules versions 'heroes' et 'hero_rows' (toute sauvegarde de héros)
+        avec les paramètres de la requête, sans lire les héros.
+        """
+        if self.action != 'retrieve':
+            return self._hero_validators(await aget_request_versions(self, *self.cache_versions))
+        entry = await self.aget_cached_detail()
+        if entry is not None:
+            return self._hero_validators(entry.versions, entry.updated_at)
+        versions = self._detail_versions = await aget_request_versions(self, 'heroes')
+        queryset = self._updated_at_queryset()
+        updated_at = await queryset.afirst() if queryset is not None else None
+        return self._hero_validators(versions, updated_at) if updated_at else None
+
+    def _updated_at_queryset(self):
+        """Date de modification du héros demandé, None si l'identifiant est invalide."""
+        lookup = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        try:
+            return Hero.objects.filter(pk=lookup).values_list('updated_at', flat=True)
+        except (TypeError, ValueError, ValidationError):
+            return None
+
+    def _hero_validators(self, versions, updated_at=None):
+        versions, versions_modified = versions
+        last_modified = max(filter(None, (updated_at, versions_modified)), default=None)
+        etag = make_etag(self.request, *sorted(versions.items()), updated_at and updated_at.isoformat())
+        return etag, last_modified
+
+    def use_detail_cache(self):
+        """Le détail JSON est servi par le cache des fiches s'il est actif."""
+        return herocache.get_detail_cache() is not None and self.request.accepted_renderer.format == 'json'
+
+    def _detail_pk(self):
+        try:
+            return int(self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+        except (TypeError, ValueError):
+            return None
+
+    async def aget_cached_detail(self):
+        """Fiche du héros demandé en cache (revalidé si l'intervalle est écoulé), ou None."""
+        pk = self._detail_pk()
+        if pk is None or not self.use_detail_cache():
+            return None
+        cache = herocache.get_detail_cache()
+        if cache.revalidation_due():
+            await sync_to_async(cache.revalidate)()
+        self._detail_entry = cache.get(pk)
+        return self._detail_entry
+
+    def cached_detail_response(self, instance=None):
+        """
+        Réponse du détail depuis la fiche en cache, ou rendue pour
+        `instance` puis mise en cache (fiche complète uniquement).
+        """
+        fields = self.get_sparse_fields()
+        entry = getattr(self, '_detail_entry', None)
+        if entry is None:
+            payload = self.get_serializer(instance).data
+            if fields is not None:
+                return Response(payload)
+            # dict : ReturnDict garderait le serializer (et la requête) en mémoire
+            payload = dict(payload)
+            entry = herocache.DetailEntry(instance.updated_at, self._detail_versions, payload)
+            herocache.get_detail_cache().set(instance.pk, entry)
+        if fields is None:
+            return Response(entry.payload)
+        return Response({name: entry.payload[name] for name in fields})
+
+    @conditional_get
+    async def aretrieve(self, request, *args, **kwargs):
+        """
+        Détail d'un héros ; en JSON, servi par le cache des fiches du
+        processus (herocache) sans accès à la base pour un héros en cache.
+        """
+        if not self.use_detail_cache():
+            return await super().aretrieve(request, *args, **kwargs)
+        if getattr(self, '_detail_entry', None) is not None:
+            return self.cached_detail_response()
+        return self.cached_detail_response(await self.aget_object())
+
+    retrieve = sync_action(aretrieve)
+
+    @cached_response
+    @conditional_get
+    async def alist(self, request, *args, **kwargs):
+        """
+        Liste des héros ; en JSON, rendu direct depuis values() via
+        HeroListFastSerializer (sortie identique à HeroListSerializer).
+        """
+        if request.accepted_renderer.format != 'json':
+            return await super().alist(request, *args, **kwargs)
+
+        fast_serializer = HeroListFastSerializer(self.get_sparse_fields())
+        rows = fast_serializer.get_rows(await self.afilter_queryset(self.get_queryset()))
+        page = await self.apaginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(fast_serializer.serialize(page))
+        return Response(fast_serializer.serialize([row async for row in rows]))
+
+    list = sync_action(alist)
 
     def get_serializer_class(self):
         """Utilise un serializer léger pour la liste."""
@@ -50,62 +238,129 @@ class HeroViewSet(viewsets.ReadOnlyModelViewSet):
         if is_active is not None:
             queryset = queryset.filter(is_active=is_active.lower() == 'true')
         
-        region_id = self.request.query_params.get('region')
-        if region_id:
+        region_id = self._int_param('region', None, minimum=1)
+        if region_id is not None:
             queryset = queryset.filter(region_id=region_id)
         
-        min_level = self.request.query_params.get('min_level')
-        if min_level:
-            queryset = queryset.filter(level__gte=int(min_level))
+        min_level = self._int_param('min_level', None, minimum=0)
+        if min_level is not None:
+            queryset = queryset.filter(level__gte=min_level)
+        
+        max_level = self._int_param('max_level', None, minimum=0)
+        if max_level is not None:
+            queryset = queryset.filter(level__lte=max_level)
         
-        max_level = self.request.query_params.get('max_level')
-        if max_level:
-            queryset = queryset.filter(level__lte=int(max_level))
+        min_hp_pct = self._float_param('min_hp_pct')
+        if min_hp_pct is not None:
+            queryset = queryset.filter(hp_percentage__gte=min_hp_pct)
         
+        max_hp_pct = self._float_param('max_hp_pct')
+        if max_hp_pct is not None:
+            queryset = queryset.filter(hp_percentage__lte=max_hp_pct)
+        
+        fields = self.get_sparse_fields()
+        if fields is not None:
+            queryset = self.project_queryset(queryset, fields)
         return queryset
 
-    @action(detail=False, methods=['get'])
-    def by_class(self, request):
+    def get_sparse_fields(self):
+        """Champs demandés par ?fields= / ?exclude= pour l'action, ou None."""
+        if self.action not in self.sparse_fields_actions:
+            return None
+        return get_sparse_fields(self.request, self.get_serializer_class().Meta.fields)
+
+    def project_queryset(self, queryset, fields):
+        """
+        Ne charge que les colonnes des champs demandés (et les clés de
+        tri) ; la région n'est jointe et les compétences préchargées que
+        si un champ demandé les utilise.
+        """
+        paths = dict.fromkeys(['id', *self.ordering_fields])
+        for name in fields:
+            paths.update(dict.fromkeys(HERO_FIELD_SOURCES.get(name, (name,))))
+        relations = {path.split('__')[0] for path in paths if '__' in path}
+        prefetches = {HERO_FIELD_PREFETCHES[name] for name in fields if name in HERO_FIELD_PREFETCHES}
+        queryset = queryset.select_related(None).prefetch_related(None)
+        if relations:
+            queryset = queryset.select_related(*relations)
+        if prefetches:
+            queryset = queryset.prefetch_related(*prefetches)
+        return queryset.only(*paths)
+
+    @cached_response
+    @conditional_get
+    async def aby_class(self, request):
         """Retourne les héros filtrés par classe."""
         job_class = request.query_params.get('class')
         if not job_class:
-            return Response(
-                {'error': 'Le paramètre "class" est requis'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
+            return self.missing_class_response()
+
         heroes = self.get_queryset().filter(job_class=job_class)
-        page = self.paginate_queryset(heroes)
+        page = await self.apaginate_queryset(heroes)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
             return self.get_paginated_response(serializer.data)
-        
-        serializer = self.get_serializer(heroes, many=True)
+
+        serializer = self.get_serializer([hero async for hero in heroes], many=True)
         return Response(serializer.data)
 
-    @action(detail=False, methods=['get'])
-    @method_decorator(cache_page(60))  # Cache 1 minute
-    def stats(self, request):
-        """Retourne les statistiques globales des héros."""
-        queryset = self.get_queryset()
-        
-        stats = queryset.aggregate(
-            total_heroes=Count('id'),
-            avg_level=Avg('level'),
-            total_gold=Sum('gold'),
-            total_xp=Sum('xp'),
-            avg_gold=Avg('gold'),
+    by_class = action(detail=False, methods=['get'])(sync_action(aby_class))
+
+    def missing_class_response(self):
+        return Response(
+            {'error': 'Le paramètre "class" est requis'},
+            status=status.HTTP_400_BAD_REQUEST
         )
-        
-        # Répartition par classe
+
+    @cached_response
+    async def astats(self, request):
+        """
+        Retourne les statistiques globales des héros.
+
+        Servies par les agrégats HeroStatsRollup, toujours à jour, en
+        appliquant les mêmes filtres que get_queryset ; les filtres sur
+        les HP, absents des agrégats, imposent un calcul sur les héros.
+        """
+        if self.needs_live_stats():
+            return Response(await self.acompute_stats(self.get_queryset()))
+        return Response(await rollup.aget_stats(**self.get_rollup_filters()))
+
+    stats = action(detail=False, methods=['get'])(sync_action(astats))
+
+    def needs_live_stats(self):
+        """Les filtres sur les HP ne sont pas couverts par les agrégats."""
+        params = self.request.query_params
+        return bool(params.get('min_hp_pct') or params.get('max_hp_pct'))
+
+    def get_rollup_filters(self):
+        """Filtres de get_queryset traduits pour rollup.aget_stats."""
+        params = self.request.query_params
+        is_active = params.get('is_active')
+        return {
+            'job_class': params.get('job_class') or None,
+            'region_id': self._int_param('region', None, minimum=1),
+            'is_active': is_active.lower() == 'true' if is_active is not None else None,
+            'min_level': self._int_param('min_level', None, minimum=0),
+            'max_level': self._int_param('max_level', None, minimum=0),
+        }
+
+    async def acompute_stats(self, queryset):
+        """Calcule les statistiques directement sur un queryset de héros."""
+        classes, regions = self.live_distributions(queryset)
+        return self.format_live_stats(
+            await queryset.aaggregate(**self.live_stats_totals),
+            [row async for row in classes],
+            [row async for row in regions],
+        )
+
+    def live_distributions(self, queryset):
+        """Répartitions par classe et par région d'un queryset de héros."""
         class_distribution = (
             queryset
             .values('job_class')
             .annotate(count=Count('id'))
             .order_by('-count')
         )
-        
-        # Répartition par région
         region_distribution = (
             queryset
             .exclude(region__isnull=True)
@@ -113,8 +368,10 @@ class HeroViewSet(viewsets.ReadOnlyModelViewSet):
             .annotate(count=Count('id'), avg_level=Avg('level'))
             .order_by('-count')
         )
-        
-        return Response({
+        return class_distribution, region_distribution
+
+    def format_live_stats(self, stats, class_distribution, region_distribution):
+        return {
             'total_heroes': stats['total_heroes'] or 0,
             'average_level': round(stats['avg_level'] or 0, 2),
             'total_gold': stats['total_gold'] or 0,
@@ -122,22 +379,197 @@ class HeroViewSet(viewsets.ReadOnlyModelViewSet):
             'average_gold': round(stats['avg_gold'] or 0, 2),
             'class_distribution': list(class_distribution),
             'region_distribution': list(region_distribution),
-        })
+        }
 
-    @action(detail=False, methods=['get'])
-    def top(self, request):
+    @cached_response
+    @conditional_get
+    async def atop(self, request):
         """Retourne le top des héros par niveau."""
-        limit = int(request.query_params.get('limit', 10))
-        limit = min(limit, 100)  # Max 100
-        
-        heroes = self.get_queryset().order_by('-level', '-xp')[:limit]
-        serializer = self.get_serializer(heroes, many=True)
+        limit = min(self._int_param('limit', 10, minimum=1), 100)
+
+        heroes = self.get_queryset().order_by('-level', '-xp')
+        if self.use_keyset_pagination():
+            self.paginator.page_size = limit
+            page = await self.apaginate_queryset(heroes)
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
+        serializer = self.get_serializer([hero async for hero in heroes[:limit]], many=True)
         return Response(serializer.data)
 
+    top = action(detail=False, methods=['get'])(sync_action(atop))
+
+    @cached_response
+    @conditional_get
+    async def aleaderboard(self, request):
+        """
+        Classement par niveau puis expérience, global ou restreint à une
+        classe (?class=mage) ou une région (?region=3). La page commence à
+        la position ?start= (à partir de 1) et compte ?page_size= héros ;
+        une position profonde ne coûte pas plus qu'une position de tête.
+        """
+        start, page_size, scope = self.leaderboard_params
+
+        fast_serializer = HeroListFastSerializer()
+        # Comptes par niveau puis page : lus en une fois dans le thread de la requête
+        total, page = await sync_to_async(leaderboard.get_page)(
+            fast_serializer.get_rows(Hero.objects.all()), start, page_size, **scope
+        )
+        url = request.build_absolute_uri()
+        return Response({
+            'count': total,
+            'next': replace_query_param(url, 'start', start + page_size)
+            if start + page_size <= total else None,
+            'previous': replace_query_param(
+                url, 'start', max(min(start - page_size, total - page_size + 1), 1)
+            ) if start > 1 and total else None,
+            'results': [
+                {'rank': rank, 'position': position, **fast_serializer.to_representation(row)}
+                for rank, position, row in page
+            ],
+        })
+
+    leaderboard = action(detail=False, methods=['get'])(sync_action(aleaderboard))
 
-class RegionViewSet(viewsets.ReadOnlyModelViewSet):
-    """ViewSet pour les régions."""
-    queryset = Region.objects.prefetch_related('heroes').annotate(
+    @cached_response
+    @conditional_get
+    async def arank(self, request, pk=None):
+        """Rangs du héros dans le classement global, de sa classe et de sa région."""
+        try:
+            hero = await Hero.objects.only(
+                'id', 'nickname', 'job_class', 'level', 'xp', 'region_id'
+            ).aget(pk=pk)
+        except (Hero.DoesNotExist, TypeError, ValueError, ValidationError):
+            raise Http404
+        scopes = {'global': {}, 'class': {'job_class': hero.job_class}}
+        if hero.region_id:
+            scopes['region'] = {'region_id': hero.region_id}
+        ranks = await sync_to_async(leaderboard.get_ranks)(hero, scopes)
+        ranks.setdefault('region', None)
+        return Response({
+            'id': hero.pk,
+            'nickname': hero.nickname,
+            'job_class': hero.job_class,
+            'region': hero.region_id,
+            'level': hero.level,
+            'xp': hero.xp,
+            'ranks': ranks,
+        })
+
+    rank = action(detail=True, methods=['get'])(sync_action(arank))
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # Avant le cache des réponses et les requêtes conditionnelles : un
+        # paramètre invalide donne toujours un 400 (jamais un 304 ni une
+        # réponse en cache)
+        self.validate_params()
+
+    def validate_params(self):
+        """Lit et valide les paramètres de l'action courante (400 s'ils sont invalides)."""
+        if self.action == 'leaderboard':
+            self.leaderboard_params = self.get_leaderboard_params()
+
+    def get_leaderboard_params(self):
+        """(position de départ, taille de page, filtres de portée) du classement."""
+        start = self._int_param('start', 1, minimum=1)
+        page_size = min(
+            self._int_param('page_size', self.leaderboard_page_size, minimum=1),
+            self.leaderboard_max_page_size,
+        )
+        scope = leaderboard.scope_filters(
+            job_class=self.request.query_params.get('class'),
+            region_id=self._int_param('region', None, minimum=1),
+        )
+        return start, page_size, scope
+
+    def _int_param(self, name, default, minimum):
+        """Paramètre entier de la requête ; 400 s'il est invalide."""
+        value = self.request.query_params.get(name)
+        if not value:
+            return default
+        try:
+            value = int(value)
+        except ValueError:
+            raise APIValidationError({name: 'Un entier est attendu.'})
+        if value < minimum:
+            raise APIValidationError({name: f'La valeur minimale est {minimum}.'})
+        return value
+
+    def _float_param(self, name, default=None):
+        """Paramètre décimal fini de la requête ; 400 s'il est invalide (nan, inf compris)."""
+        value = self.request.query_params.get(name)
+        if not value:
+            return default
+        try:
+            value = float(value)
+        except ValueError:
+            value = math.nan
+        if not math.isfinite(value):
+            raise APIValidationError({name: 'Un nombre est attendu.'})
+        return value
+
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
+    def export(self, request):
+        """
+        Export en flux des héros filtrés (mêmes filtres que la liste),
+        au format Parquet (?output=parquet, par défaut) ou Arrow IPC
+        (?output=arrow), avec le nom de la région et la liste des compétences.
+        """
+        export_format = request.query_params.get('output', 'parquet')
+        if export_format not in columnar.EXPORT_FORMATS:
+            return Response(
+                {'error': f'Format inconnu, attendu : {", ".join(columnar.EXPORT_FORMATS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not columnar.is_available():
+            return Response(
+                {'error': "L'export colonnaire nécessite pyarrow"},
+                status=status.HTTP_501_NOT_IMPLEMENTED
+            )
+        queryset = self.filter_queryset(self.get_queryset())
+        # Le flux est lu après dispatch : base de lecture fixée maintenant
+        queryset = queryset.using(queryset.db)
+        return columnar.export_response(request, queryset, export_format)
+
+    @action(detail=False, methods=['post'], url_path='combat-tick',
+            permission_classes=[permissions.IsAdminUser])
+    def combat_tick(self, request):
+        """
+        Applique un tick de combat : {"heroes": [{"hero_id", "delta"}, ...]}
+        ou {"filter": {...}, "delta": n}. Les HP restent dans
+        [0, level × 100] ; retourne les montants réellement appliqués.
+        """
+        serializer = CombatTickSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        if 'heroes' in data:
+            results = combat.apply_deltas(data['heroes'])
+            found = {result['hero_id'] for result in results}
+            not_found = sorted(set(data['heroes']) - found)
+        else:
+            lookups = CombatTickFilterSerializer.get_lookups(data['filter'])
+            try:
+                results = combat.apply_delta(
+                    Hero.objects.filter(**lookups), data['delta'], limit=CombatTickSerializer.MAX_HEROES
+                )
+            except combat.TooManyHeroes as exc:
+                raise APIValidationError({'filter': str(exc)})
+            not_found = []
+
+        return Response({
+            'updated': sum(1 for result in results if result['applied']),
+            'total_applied': sum(result['applied'] for result in results),
+            'results': results,
+            'not_found': not_found,
+        })
+
+
+class RegionViewSet(ReplicaReadMixin, ResponseCacheMixin, DataVersionConditionalMixin, AsyncReadOnlyMixin,
+                    viewsets.ReadOnlyModelViewSet):
+    """ViewSet pour les régions (requêtes conditionnelles sur la version 'regions')."""
+    queryset = Region.objects.annotate(
         heroes_count=Count('heroes')
     )
     serializer_class = RegionSerializer
@@ -145,11 +577,14 @@ class RegionViewSet(viewsets.ReadOnlyModelViewSet):
     search_fields = ['name', 'environment_type']
     ordering_fields = ['name', 'heroes_count']
     ordering = ['name']
+    data_versions = cache_versions = ('regions',)
+    query_budget = {'list': 6, 'retrieve': 5}
 
 
-class SkillViewSet(viewsets.ReadOnlyModelViewSet):
-    """ViewSet pour les compétences."""
-    queryset = Skill.objects.prefetch_related('heroes').annotate(
+class SkillViewSet(ReplicaReadMixin, ResponseCacheMixin, DataVersionConditionalMixin, AsyncReadOnlyMixin,
+                   viewsets.ReadOnlyModelViewSet):
+    """ViewSet pour les compétences (requêtes conditionnelles sur la version 'skills')."""
+    queryset = Skill.objects.annotate(
         heroes_count=Count('heroes')
     )
     serializer_class = SkillSerializer
@@ -157,6 +592,8 @@ class SkillViewSet(viewsets.ReadOnlyModelViewSet):
     search_fields = ['name', 'damage_type']
     ordering_fields = ['mana_cost', 'name', 'heroes_count']
     ordering = ['name']
+    data_versions = cache_versions = ('skills',)
+    query_budget = {'list': 6, 'retrieve': 5}
 
     def get_queryset(self):
         """Filtre optionnel par type de dégâts."""
@@ -169,6 +606,218 @@ class SkillViewSet(viewsets.ReadOnlyModelViewSet):
         return queryset
 
 
+class SnapshotUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Instantané des héros non construit (commande refresh_hero_snapshot)."
+    default_code = 'snapshot_unavailable'
+
+
+def _analytics():
+    """Calculs vectorisés, NumPy n'étant importé qu'au premier appel (démarrage des workers)."""
+    from . import analytics, snapshot
+    return analytics, snapshot
+
+
+class HeroAnalyticsViewSet(viewsets.ViewSet):
+    """
+    Analyses des héros sur l'instantané colonnaire (rpgAtlas.snapshot),
+    reconstruit périodiquement par refresh_hero_snapshot : aucune
+    requête sur la base, calculs vectorisés (rpgAtlas.analytics).
+
+    Endpoints:
+    - GET /api/analytics/ : état de l'instantané et colonnes disponibles
+    - GET /api/analytics/histogram/?column=level&bins=20&by=job_class
+    - GET /api/analytics/groupby/?column=gold&by=region
+    - GET /api/analytics/percentiles/?column=gold&p=50,90,99&by=job_class
+    - GET /api/analytics/correlation/?x=level&y=xp&by=job_class
+
+    Filtres identiques à /api/heroes/ : job_class, region, is_active,
+    min_level, max_level, min_hp_pct, max_hp_pct. by (optionnel) :
+    job_class, region ou is_active. Les réponses portent un ETag lié à
+    la génération de l'instantané (304 tant qu'il n'a pas changé).
+    """
+    # Session et utilisateur seulement
+    query_budget = {'list': 2, 'histogram': 2, 'groupby': 2, 'percentiles': 2, 'correlation': 2}
+    default_bins = 20
+    default_percentiles = '50,90,99'
+
+    def get_snapshot(self):
+        if not hasattr(self, '_snapshot'):
+            self._snapshot = _analytics()[1].get_snapshot()
+        if self._snapshot is None:
+            raise SnapshotUnavailable
+        return self._snapshot
+
+    def get_conditional_validators(self):
+        """ETag et Last-Modified : génération de l'instantané."""
+        try:
+            snapshot = self.get_snapshot()
+        except SnapshotUnavailable:
+            return None
+        return make_etag(self.request, snapshot.generation), snapshot.generated_at
+
+    def get_filters(self, snapshot):
+        """Filtres de la requête, convertis pour analytics.filter_mask."""
+        params = self.request.query_params
+        job_classes = [value for value, _ in snapshot.meta['job_classes']]
+        filters = {}
+        job_class = params.get('job_class')
+        if job_class:
+            # Classe inconnue : aucun héros, comme /api/heroes/
+            filters['job_class'] = job_classes.index(job_class) if job_class in job_classes else -2
+        is_active = params.get('is_active')
+        if is_active is not None:
+            filters['is_active'] = is_active.lower() == 'true'
+        for name, convert in (('region', int), ('min_level', int), ('max_level', int),
+                              ('min_hp_pct', float), ('max_hp_pct', float)):
+            value = params.get(name)
+            if value:
+                try:
+                    filters[name] = convert(value)
+                except ValueError:
+                    raise APIValidationError({name: f'Valeur invalide : {value}'})
+                if not math.isfinite(filters[name]):
+                    raise APIValidationError({name: f'Valeur invalide : {value}'})
+        return filters
+
+    def get_column(self, param, default=None):
+        analytics = _analytics()[0]
+        column = self.request.query_params.get(param, default)
+        if column not in analytics.NUMERIC_COLUMNS:
+            raise APIValidationError({param: f"Colonne parmi : {', '.join(analytics.NUMERIC_COLUMNS)}"})
+        return column
+
+    def get_group_by(self):
+        analytics = _analytics()[0]
+        by = self.request.query_params.get('by') or None
+        if by is not None and by not in analytics.GROUP_COLUMNS:
+            raise APIValidationError({'by': f"Regroupement parmi : {', '.join(analytics.GROUP_COLUMNS)}"})
+        return by
+
+    def get_int_param(self, name, default, minimum, maximum):
+        try:
+            value = int(self.request.query_params.get(name, default))
+        except ValueError:
+            value = minimum - 1
+        if not minimum <= value <= maximum:
+            raise APIValidationError({name: f'Entier entre {minimum} et {maximum}'})
+        return value
+
+    def prepare(self):
+        """(instantané, masque des filtres, regroupement, clés des groupes, indices de groupe)."""
+        analytics = _analytics()[0]
+        snapshot = self.get_snapshot()
+        mask = analytics.filter_mask(snapshot, self.get_filters(snapshot))
+        by = self.get_group_by()
+        keys, inverse = analytics.group_by(snapshot, by, mask)
+        return snapshot, mask, by, keys, inverse
+
+    def group_rows(self, snapshot, by, keys, columns):
+        """Une ligne par groupe : clé, libellé et valeurs des colonnes calculées."""
+        analytics = _analytics()[0]
+        rows = []
+        for index, key in enumerate(keys):
+            public, label = analytics.group_key(snapshot, by, key)
+            row = {'key': public, 'label': label}
+            for name, values in columns.items():
+                value = values[index]
+                row[name] = [analytics.to_json(item) for item in value] \
+                    if getattr(value, 'ndim', 0) else analytics.to_json(value)
+            rows.append(row)
+        return rows
+
+    @conditional_get
+    def list(self, request):
+        """État de l'instantané et paramètres disponibles."""
+        analytics = _analytics()[0]
+        snapshot = self.get_snapshot()
+        return Response({
+            'snapshot': snapshot.describe(),
+            'columns': analytics.NUMERIC_COLUMNS,
+            'group_by': analytics.GROUP_COLUMNS,
+        })
+
+    @action(detail=False, methods=['get'])
+    @conditional_get
+    def histogram(self, request):
+        """Histogramme d'une colonne (bornes communes à tous les groupes)."""
+        analytics = _analytics()[0]
+        column = self.get_column('column')
+        bins = self.get_int_param('bins', self.default_bins, 1, analytics.MAX_BINS)
+        snapshot, mask, by, keys, inverse = self.prepare()
+        values = analytics.select(snapshot, column, mask)
+        edges, counts = analytics.histogram(values, inverse, len(keys), bins)
+        return Response({
+            'snapshot': snapshot.describe(),
+            'column': column,
+            'by': by,
+            'edges': [analytics.to_json(edge) for edge in edges],
+            'groups': self.group_rows(snapshot, by, keys, {
+                'count': counts.sum(axis=1),
+                'counts': counts,
+            }),
+        })
+
+    @action(detail=False, methods=['get'])
+    @conditional_get
+    def groupby(self, request):
+        """Effectif, somme, moyenne, écart-type, minimum et maximum d'une colonne par groupe."""
+        analytics = _analytics()[0]
+        column = self.get_column('column')
+        snapshot, mask, by, keys, inverse = self.prepare()
+        stats = analytics.describe(analytics.select(snapshot, column, mask), inverse, len(keys))
+        return Response({
+            'snapshot': snapshot.describe(),
+            'column': column,
+            'by': by,
+            'groups': self.group_rows(snapshot, by, keys, stats),
+        })
+
+    @action(detail=False, methods=['get'])
+    @conditional_get
+    def percentiles(self, request):
+        """Percentiles d'une colonne par groupe (?p=50,90,99)."""
+        analytics = _analytics()[0]
+        column = self.get_column('column')
+        try:
+            points = [float(point) for point in request.query_params.get('p', self.default_percentiles).split(',')]
+        except ValueError:
+            points = []
+        if not points or len(points) > analytics.MAX_PERCENTILES or not all(0 <= point <= 100 for point in points):
+            raise APIValidationError({'p': f'1 à {analytics.MAX_PERCENTILES} valeurs entre 0 et 100'})
+        snapshot, mask, by, keys, inverse = self.prepare()
+        values = analytics.select(snapshot, column, mask)
+        return Response({
+            'snapshot': snapshot.describe(),
+            'column': column,
+            'by': by,
+            'p': points,
+            'groups': self.group_rows(snapshot, by, keys, {
+                'count': analytics.group_counts(inverse, len(keys)),
+                'values': analytics.percentiles(values, inverse, len(keys), points),
+            }),
+        })
+
+    @action(detail=False, methods=['get'])
+    @conditional_get
+    def correlation(self, request):
+        """Corrélation de Pearson et régression linéaire de y en x, par groupe."""
+        analytics = _analytics()[0]
+        x = self.get_column('x', 'level')
+        y = self.get_column('y', 'xp')
+        snapshot, mask, by, keys, inverse = self.prepare()
+        stats = analytics.correlation(
+            analytics.select(snapshot, x, mask), analytics.select(snapshot, y, mask), inverse, len(keys)
+        )
+        return Response({
+            'snapshot': snapshot.describe(),
+            'x': x,
+            'y': y,
+            'by': by,
+            'groups': self.group_rows(snapshot, by, keys, stats),
+        })
+
+
 def index(request):
     """Vue principale - Atlas interactif."""
     return render(request, 'index.html')